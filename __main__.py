@@ -0,0 +1,5 @@
+import sys
+from .cli import main
+
+# python -m tw_stock_analyzer <指令> (見 cli.py)
+sys.exit(main())
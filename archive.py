@@ -0,0 +1,191 @@
+import os
+import gzip
+import json
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import pandas as pd
+from .settings import ARCHIVE_DIR, REINGEST_WORKERS
+from . import store
+from . import metrics
+
+# 原始回應封存
+# 每個交易日的原始 JSON (證交所 MI_INDEX、櫃買中心上櫃股票行情) 以 gzip 壓縮保存，檔名包含內容的 SHA-256，
+# 解析程式修正或需要新欄位 (其他表格、漲跌符號、本益比...) 時可直接由封存重建資料庫，不需重新下載。
+#   ARCHIVE_DIR/YYYY/YYYYMMDD-<sha256 前 16 碼>.json.gz       (證交所)
+#   ARCHIVE_DIR/<市場>/YYYY/YYYYMMDD-<sha256 前 16 碼>.json.gz (其他市場，例如 TPEX)
+#   index.json (各市場目錄各一份): {"YYYYMMDD": {"sha256": ..., "size": 原始大小, "fetched": 抓取時間}}
+# 同一天重新抓取且內容相同時不重複寫入；內容不同時保留舊檔，index 指向最新的一份。
+#
+#   python -m tw_stock_analyzer.archive --reingest [--start 20200101] [--end 20241231] [--workers 4]
+
+_lock = threading.Lock()
+_index_cache = {} # archive_dir -> {date_str: entry}
+
+
+def _index_path(archive_dir):
+    return os.path.join(archive_dir, "index.json")
+
+
+def _load_index(archive_dir):
+    if archive_dir not in _index_cache:
+        index = {}
+        path = _index_path(archive_dir)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                index = json.load(f)
+        _index_cache[archive_dir] = index
+    return _index_cache[archive_dir]
+
+
+def _save_index(archive_dir, index):
+    path = _index_path(archive_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(dict(sorted(index.items())), f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _market_dir(archive_dir=None, market=None):
+    """市場的封存目錄 (證交所為 ARCHIVE_DIR 本身，與舊版封存相容)"""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    if market is None or market == store.DEFAULT_MARKET:
+        return archive_dir
+    return os.path.join(archive_dir, market)
+
+
+def raw_path(date_str, digest, archive_dir=None, market=None):
+    return os.path.join(_market_dir(archive_dir, market), date_str[:4], f"{date_str}-{digest[:16]}.json.gz")
+
+
+def save(date_str, content, archive_dir=None, market=None):
+    """封存原始回應 (bytes)，回傳檔案路徑"""
+    archive_dir = _market_dir(archive_dir, market)
+    digest = hashlib.sha256(content).hexdigest()
+    path = raw_path(date_str, digest, archive_dir)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, 'wb', compresslevel=6) as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    with _lock:
+        index = _load_index(archive_dir)
+        if index.get(date_str, {}).get('sha256') != digest:
+            index[date_str] = {'sha256': digest, 'size': len(content),
+                               'fetched': datetime.now().isoformat(timespec='seconds')}
+            _save_index(archive_dir, index)
+    return path
+
+
+def load(date_str, archive_dir=None, market=None):
+    """
+    讀取封存的原始回應 (bytes)，不存在時回傳 None
+    內容與記錄的 SHA-256 不符 (檔案損毀) 時拋出 ValueError
+    """
+    archive_dir = _market_dir(archive_dir, market)
+    with _lock:
+        entry = _load_index(archive_dir).get(date_str)
+    if entry is None:
+        return None
+    with gzip.open(raw_path(date_str, entry['sha256'], archive_dir), 'rb') as f:
+        content = f.read()
+    if hashlib.sha256(content).hexdigest() != entry['sha256']:
+        raise ValueError(f"{date_str} 封存檔內容與 SHA-256 不符")
+    return content
+
+
+def archived_dates(archive_dir=None, market=None):
+    """列出已封存的日期 (由舊到新)"""
+    archive_dir = _market_dir(archive_dir, market)
+    with _lock:
+        return sorted(_load_index(archive_dir))
+
+
+def parse_archived(date_str, archive_dir=None, market=None):
+    """由封存的原始回應解析每日收盤行情 (依市場的格式)，找不到表格時回傳 None"""
+    from . import markets
+    content = load(date_str, archive_dir, market)
+    if content is None:
+        return None
+    return markets.SOURCES[market or store.DEFAULT_MARKET].parse(json.loads(content))
+
+
+def _parse_job(args):
+    date_str, market, archive_dir = args
+    try:
+        df = parse_archived(date_str, archive_dir, market)
+    except ValueError as e:
+        return date_str, market, None, str(e)
+    if df is None:
+        return date_str, market, None, "封存中沒有每日收盤行情表格"
+    df[store.DATE_COL] = date_str
+    df[store.MARKET_COL] = market
+    return date_str, market, df, None
+
+
+def reingest(start=None, end=None, workers=None, archive_dir=None, store_dir=None, markets=None):
+    """
+    由封存重建欄式資料庫 (不需網路)
+    解析在多個 process 中並行執行，寫入依月份合併 (每個月份檔案只寫入一次)
+    無法解析的日期 (格式與 schema 不符、封存檔損毀) 不寫入，列出後繼續處理其他日期
+    start, end: 日期範圍 (YYYYMMDD，含)，預設為所有封存日期
+    store_dir: 寫入的資料庫目錄 (預設 settings.STORE_DIR，可指定新目錄重建後再替換)
+    markets: 重建的市場 (預設為所有有封存的市場)
+    回傳重建的日期 (由舊到新，任一市場重建成功即列入)
+    """
+    from . import markets as market_sources
+    archive_dir = archive_dir or ARCHIVE_DIR
+    jobs = sorted((d, m, archive_dir)
+                  for m in (markets or list(market_sources.SOURCES))
+                  for d in archived_dates(archive_dir, m)
+                  if (start is None or d >= start) and (end is None or d <= end))
+    if not jobs:
+        print("沒有可重建的封存資料")
+        return []
+
+    workers = max(1, min(workers or REINGEST_WORKERS or os.cpu_count() or 1, len(jobs)))
+    print(f"由封存重建 {len(jobs)} 天資料 (workers={workers})...")
+    written, failed, month, frames = set(), [], None, []
+
+    def flush():
+        if frames:
+            written.update(store.write_range(pd.concat(frames, ignore_index=True), store_dir))
+            frames.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map 依輸入順序 (日期) 回傳，同一個月份的資料連續出現
+        for date_str, market, df, error in pool.map(_parse_job, jobs, chunksize=8):
+            if error is not None:
+                print(f"{date_str} ({market}) 無法重建: {error}")
+                failed.append((date_str, market))
+                continue
+            if date_str[:6] != month:
+                flush()
+                month = date_str[:6]
+            frames.append(df)
+    flush()
+    print(f"完成，共重建 {len(written)} 天" + (f"，{len(failed)} 天無法解析" if failed else ""))
+    return sorted(written)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="原始回應封存")
+    parser.add_argument("--reingest", action="store_true", help="由封存重建資料庫 (不需網路)")
+    parser.add_argument("--start", help="開始日期 YYYYMMDD")
+    parser.add_argument("--end", help="結束日期 YYYYMMDD")
+    parser.add_argument("--workers", type=int, help="解析的 process 數 (預設 CPU 核心數)")
+    parser.add_argument("--store-dir", help="寫入的資料庫目錄 (預設 STORE_DIR)")
+    parser.add_argument("--markets", help="重建的市場，以逗號分隔 (預設所有市場)")
+    parser.add_argument("--list", action="store_true", help="列出已封存的日期")
+    args = parser.parse_args()
+    metrics.setup_logging()
+    markets = [m.strip().upper() for m in args.markets.split(',')] if args.markets else None
+    if args.reingest:
+        reingest(args.start, args.end, args.workers, store_dir=args.store_dir, markets=markets)
+    if args.list:
+        for market in markets or [store.DEFAULT_MARKET]:
+            for date_str in archived_dates(market=market):
+                print(date_str if market == store.DEFAULT_MARKET else f"{date_str} {market}")
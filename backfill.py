@@ -0,0 +1,142 @@
+import os
+import sys
+import json
+import threading
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer.settings import BACKFILL_DIR, MAX_RETRIES
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import markets as market_sources
+from tw_stock_analyzer import trading_calendar
+
+# 歷史資料回補
+# 依交易日曆列出日期範圍內可能的交易日，扣除資料庫已有、已知休市與進度檔中已完成的日期後，
+# 以各市場的限速器下載 (上市、上櫃同時進行)。每完成一天 (所有市場) 即更新進度檔，中斷後重新執行同一個範圍會從中斷處繼續，
+# 不會再次請求已完成的日期；失敗 (網路錯誤) 的日期最多重試 MAX_RETRIES 次。
+#
+#   python -m tw_stock_analyzer.backfill --start 20150101 --end 20241231
+# 進度檔: BACKFILL_DIR/<start>_<end>.json
+#   {"start": ..., "end": ..., "done": {"YYYYMMDD": "saved" | "closed"}, "failed": {"YYYYMMDD": 次數}}
+
+
+def _today():
+    return datetime.now().strftime("%Y%m%d")
+
+
+class Checkpoint:
+    """回補進度 (每次更新即寫入檔案，thread-safe)"""
+    def __init__(self, path, start, end):
+        self.path = path
+        self.start = start
+        self.end = end
+        self.done = {}
+        self.failed = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            self.done = data.get('done', {})
+            self.failed = data.get('failed', {})
+
+    def record(self, date_str, status):
+        """status: 'saved' / 'closed' 為完成，'failed' 累計失敗次數"""
+        with self._lock:
+            if status == 'failed':
+                self.failed[date_str] = self.failed.get(date_str, 0) + 1
+            else:
+                self.done[date_str] = status
+                self.failed.pop(date_str, None)
+            self._save()
+
+    def reset_failed(self):
+        with self._lock:
+            self.failed = {}
+            self._save()
+
+    def _save(self):
+        # 先寫入暫存檔再替換，中斷時不會留下損毀的進度檔
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'start': self.start, 'end': self.end,
+                       'done': dict(sorted(self.done.items())),
+                       'failed': dict(sorted(self.failed.items()))}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+def checkpoint_path(start, end, directory=None):
+    return os.path.join(directory or BACKFILL_DIR, f"{start}_{end}.json")
+
+
+def plan(start, end, checkpoint=None, max_attempts=None, markets=None):
+    """
+    列出需要下載的日期 (由舊到新)
+    排除週末、已知休市日 (含進度檔中記錄為休市的日期)、資料庫已有所有市場資料的日期，
+    以及進度檔中失敗達 max_attempts 次的日期
+    end 超過今天時以今天為準 (未來的日期尚無資料)
+    回傳 (待下載日期, 放棄的日期)
+    """
+    end = min(end, _today())
+    max_attempts = MAX_RETRIES if max_attempts is None else max_attempts
+    names = [source.name for source in market_sources.get_sources(markets)]
+    pending, skipped = [], []
+    for date_str in trading_calendar.sessions_between(start, end):
+        if checkpoint is not None and checkpoint.done.get(date_str) == 'closed':
+            continue
+        # 進度檔記錄已完成，但資料庫缺少部分市場 (例如之後才加入的市場) 時，只下載缺少的市場
+        if all(data_fetcher.check_data_exists(date_str, name) for name in names):
+            continue
+        if checkpoint is not None and checkpoint.failed.get(date_str, 0) >= max_attempts:
+            skipped.append(date_str)
+            continue
+        pending.append(date_str)
+    return pending, skipped
+
+
+def run_backfill(start, end, workers=None, limiter=None, retry_failed=False, directory=None, progress=None,
+                 markets=None):
+    """
+    回補 start ~ end (YYYYMMDD，含) 的每日行情，可中斷後續傳
+    retry_failed: 重新嘗試已達重試上限的日期
+    markets: 回補的市場 (預設 settings.MARKETS)
+    回傳 Checkpoint
+    """
+    if start > end:
+        raise ValueError(f"開始日期 {start} 晚於結束日期 {end}")
+    checkpoint = Checkpoint(checkpoint_path(start, end, directory), start, end)
+    if retry_failed:
+        checkpoint.reset_failed()
+
+    pending, skipped = plan(start, end, checkpoint, markets=markets)
+    if skipped:
+        print(f"{len(skipped)} 天已失敗 {MAX_RETRIES} 次，略過 (使用 --retry-failed 重新嘗試)")
+    if not pending:
+        print(f"{start} ~ {end} 沒有需要回補的日期")
+        return checkpoint
+    # 各市場同時下載，所需時間由最慢的限速器決定
+    rate = min(source.limiter.rate for source in market_sources.get_sources(markets))
+    print(f"需回補 {len(pending)} 天 ({pending[0]} ~ {pending[-1]})，"
+          f"預估至少 {len(pending) / rate / 60:.0f} 分鐘")
+
+    def on_day(date_str, ok):
+        if ok:
+            checkpoint.record(date_str, 'saved')
+        elif trading_calendar.is_closed(date_str):
+            # 證交所回應無資料，已記錄為休市日
+            checkpoint.record(date_str, 'closed')
+        else:
+            checkpoint.record(date_str, 'failed')
+
+    downloader.download_missing(pending, workers=workers, limiter=limiter, progress=progress, on_day=on_day,
+                                markets=markets)
+    return checkpoint
+
+
+if __name__ == "__main__":
+    # 參數與 python -m tw_stock_analyzer backfill 相同
+    from tw_stock_analyzer import cli
+    sys.exit(cli.main(['backfill'] + sys.argv[1:]))
@@ -0,0 +1,166 @@
+import os
+import sys
+import argparse
+import time
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer.settings import SCREEN_RULES, BACKTEST_HORIZONS
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import store
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import rules
+from tw_stock_analyzer import metrics
+
+# 篩選條件回測
+# 將歷史資料載入為 Panel (日期 x 股票)，一次計算所有日期的指標與每個規則的 2-D 布林遮罩
+# (與每日初篩使用相同的規則)，再以收盤價計算持有 N 個交易日的報酬、勝率與各規則的貢獻。
+#
+#   python -m tw_stock_analyzer.backtest --start 20200101 --end 20241231 --horizons 5 10 20
+
+BACKTEST_COLUMNS = ['證券代號', '證券名稱', '成交股數', '成交筆數', '開盤價', '最高價', '最低價', '收盤價']
+
+
+class BacktestResult:
+    """回測結果"""
+    def __init__(self, panel, masks, signals, returns):
+        self.panel = panel
+        self.masks = masks        # {規則名稱: bool 陣列 (可廣播為 日期 x 股票)}
+        self.signals = signals    # 2-D bool: 所有規則皆通過
+        self.returns = returns    # {持有天數: 2-D 報酬率 (收盤進、N 個交易日後收盤出)}
+        self.summary = None       # 每個持有天數的訊號數、平均報酬、勝率與全市場比較
+        self.attribution = None   # 每個規則的單獨/排除後表現
+        self.daily = None         # 每日訊號數
+
+    def trades(self):
+        """每筆訊號 (一列一檔一天) 與各持有天數的報酬"""
+        t_idx, j_idx = np.nonzero(self.signals)
+        data = {'Date': self.panel.dates[t_idx], '證券代號': self.panel.codes[j_idx],
+                '證券名稱': self.panel.names[j_idx], '收盤價': self.panel['close'][t_idx, j_idx]}
+        for h, ret in self.returns.items():
+            data[f'報酬_{h}日'] = ret[t_idx, j_idx]
+        return pd.DataFrame(data)
+
+
+def forward_returns(close, horizon):
+    """收盤價買進、horizon 個交易日後收盤價賣出的報酬率 (任一端無價格為 NaN)"""
+    out = np.full(close.shape, np.nan)
+    if horizon < close.shape[0]:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    return out
+
+
+def panel_rule_data(panel):
+    """Panel 轉為規則使用的欄位對應 (2-D 陣列；代號/名稱為 1-D，依股票欄廣播)"""
+    data = {name: panel[name] for name in panel.fields}
+    data['證券代號'] = panel.codes.astype(str)
+    data['證券名稱'] = panel.names.astype(str)
+    return data
+
+
+def _stats(mask, ret, median=False):
+    """訊號數、有報酬的筆數、平均報酬與勝率 (median=True 時加上中位數)"""
+    valid = mask & ~np.isnan(ret)
+    trades = int(valid.sum())
+    stats = {'signals': int(mask.sum()), 'trades': trades, 'mean': np.nan, 'hit_rate': np.nan}
+    if trades:
+        # 以 where= 直接加總，不取出子集合 (單一規則的遮罩可能涵蓋大部分資料)
+        stats['mean'] = float(np.sum(ret, where=valid) / trades)
+        stats['hit_rate'] = float(np.count_nonzero((ret > 0) & valid) / trades)
+    if median:
+        stats['median'] = float(np.median(ret[valid])) if trades else np.nan
+    return stats
+
+
+def summarize(result):
+    """
+    summary: 每個持有天數一列 (訊號的報酬與勝率，以及全市場同期平均作為基準)
+    attribution: 每個規則 x 持有天數一列
+        solo_*: 只套用該規則
+        without_*: 套用其他所有規則 (排除該規則)，與全部規則比較可看出該規則的貢獻
+    daily: 每日訊號數
+    """
+    traded = result.panel.traded
+    shape = traded.shape
+    summary, attribution = [], []
+    for h, ret in result.returns.items():
+        row = {'horizon': h, **_stats(result.signals, ret, median=True)}
+        market = _stats(traded, ret)
+        row['market_mean'] = market['mean']
+        row['market_hit_rate'] = market['hit_rate']
+        row['excess_mean'] = row['mean'] - market['mean']
+        summary.append(row)
+
+        for name in result.masks:
+            solo = _stats(np.broadcast_to(result.masks[name], shape) & traded, ret)
+            others = {k: v for k, v in result.masks.items() if k != name}
+            without = _stats(rules.combine(others, shape) & traded, ret)
+            attribution.append({
+                'rule': name, 'horizon': h,
+                'solo_signals': solo['signals'], 'solo_mean': solo['mean'], 'solo_hit_rate': solo['hit_rate'],
+                'without_signals': without['signals'], 'without_mean': without['mean'],
+                'without_hit_rate': without['hit_rate'],
+                'lift_mean': row['mean'] - without['mean'],
+                'lift_hit_rate': row['hit_rate'] - without['hit_rate'],
+            })
+    result.summary = pd.DataFrame(summary)
+    result.attribution = pd.DataFrame(attribution)
+    result.daily = pd.DataFrame({'Date': result.panel.dates, 'signals': result.signals.sum(axis=1),
+                                 'traded': traded.sum(axis=1)})
+    return result
+
+
+def run_backtest(start=None, end=None, horizons=None, screen_rules=None, panel=None):
+    """
+    回測初篩規則
+    start, end: 日期範圍 (YYYYMMDD，含)，預設為資料庫中所有日期
+    horizons: 持有天數 (交易日，預設 settings.BACKTEST_HORIZONS)
+    screen_rules: 篩選條件 (預設 settings.SCREEN_RULES)；含 macd_turn_positive 時一併計算 MACD
+    panel: 直接使用已載入的 Panel (不讀取資料庫)
+    回傳 BacktestResult
+    """
+    horizons = list(horizons or BACKTEST_HORIZONS)
+    screen_rules = screen_rules if screen_rules is not None else SCREEN_RULES
+
+    if panel is None:
+        dates = [d for d in store.available_dates()
+                 if (start is None or d >= start) and (end is None or d <= end)]
+        if not dates:
+            raise ValueError(f"資料庫中沒有 {start} ~ {end} 的資料")
+        panel = data_fetcher.load_panel(dates, columns=BACKTEST_COLUMNS)
+
+    # 所有日期的指標 (與每日初篩相同，只使用各股有資料的日期)
+    indicators.calculate_panel_indicators(panel)
+    if 'macd_turn_positive' in rules.rule_names(screen_rules):
+        indicators.calculate_panel_macd(panel)
+
+    masks = rules.evaluate(panel_rule_data(panel), screen_rules)
+    signals = rules.combine(masks, panel.shape) & panel.traded
+    close = panel['close']
+    returns = {h: forward_returns(close, h) for h in horizons}
+    return summarize(BacktestResult(panel, masks, signals, returns))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="篩選條件回測")
+    parser.add_argument("--start", help="開始日期 YYYYMMDD")
+    parser.add_argument("--end", help="結束日期 YYYYMMDD")
+    parser.add_argument("--horizons", nargs="+", type=int, default=BACKTEST_HORIZONS, help="持有天數")
+    parser.add_argument("--trades", help="輸出每筆訊號的 CSV 路徑")
+    args = parser.parse_args()
+    metrics.setup_logging()
+
+    started = time.perf_counter()
+    result = run_backtest(args.start, args.end, args.horizons)
+    print(f"回測 {result.panel.dates[0]} ~ {result.panel.dates[-1]} "
+          f"({result.panel.shape[0]} 天 x {result.panel.shape[1]} 檔)，"
+          f"耗時 {time.perf_counter() - started:.1f} 秒")
+    print(result.summary.to_string(index=False))
+    print(result.attribution.to_string(index=False))
+    if args.trades:
+        result.trades().to_csv(args.trades, index=False, encoding='utf-8-sig')
+        print(f"訊號明細已寫入 {args.trades}")
@@ -0,0 +1,469 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer.settings import DATA_DIR
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import store
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import rules
+from tw_stock_analyzer import report
+from tw_stock_analyzer import sharding
+from tw_stock_analyzer.panel import Panel
+
+# 效能基準測試
+# 以 generate_mock_data 產生不同規模的模擬全市場資料，
+# 量測 JSON 解析、clean_data、資料庫讀取、KD、MACD、MA/15 日最高價、篩選與報表各階段耗時，
+# 並與目前的參考實作 (逐檔計算 / iterrows 篩選) 比對數值，結果寫成 JSON 方便比較不同版本。
+# startup 階段與資料規模無關 (只執行一次)，在新的 process 中量測命令列各指令的啟動時間。
+#
+#   python -m tw_stock_analyzer.benchmark --scale small medium
+#   python -m tw_stock_analyzer.benchmark --scale large --compare data/benchmarks/上一版.json
+#
+# large (20,000 檔 x 2,500 天，約 5 千萬列) 需要約 16GB 記憶體
+
+# 名稱: (證券數, 天數, 其中權證數)
+SCALES = {
+    'small': (2000, 60, 0),
+    'medium': (2000, 250, 0),
+    'large': (20000, 2500, 18000),
+}
+
+STAGES = ['startup', 'json_parse', 'clean_data', 'store_load', 'kd', 'macd', 'ma_high', 'screen', 'report',
+          'sharded']
+
+JSON_DAYS = 20 # JSON 解析/clean_data 只量測最後 N 天 (每天的成本相同)
+SAMPLE_CODES = 300 # 參考實作 (逐檔計算) 只跑部分股票
+WORKER_COUNTS = [1, 2, 4] # sharded 階段量測的 process 數
+REPORT_HISTORY_CODES = 100 # report 階段的指標歷史工作表包含的股票數
+BENCHMARK_DIR = os.path.join(DATA_DIR, "benchmarks")
+
+# startup 階段: 各指令啟動時載入的模組 (python 參數)，取 STARTUP_REPEAT 次中最快的一次
+STARTUP_COMMANDS = {
+    'help': ['-m', 'tw_stock_analyzer', '--help'],
+    'notify': ['-c', 'import tw_stock_analyzer.cli, tw_stock_analyzer.notifier'],
+    'fetch': ['-c', 'import tw_stock_analyzer.cli, tw_stock_analyzer.downloader'],
+    'screen': ['-c', 'import tw_stock_analyzer.cli, tw_stock_analyzer.pipeline'],
+}
+# 比較基準: 啟動時即載入 yfinance 與完整分析流程 (改為延遲載入前 main.py 的啟動成本)
+STARTUP_REFERENCE = ['-c', 'import yfinance, tw_stock_analyzer.pipeline']
+STARTUP_REPEAT = 5
+
+# 證交所 MI_INDEX「每日收盤行情」欄位
+TWSE_FIELDS = ['證券代號', '證券名稱', '成交股數', '成交筆數', '成交金額', '開盤價', '最高價', '最低價',
+               '收盤價', '漲跌(+/-)', '漲跌價差', '最後揭示買價', '最後揭示買量', '最後揭示賣價',
+               '最後揭示賣量', '本益比']
+
+
+def generate_mock_data(stocks=100, days=100, warrants=0, seed=None):
+    """
+    模擬全市場長格式日資料 (每檔每天一列，至今天為止連續 days 天)
+    stocks: 證券數 (含權證)
+    warrants: 其中權證的數量 (6 位數代號，名稱含 購/售)
+    seed: 亂數種子 (None 表示不固定)
+    """
+    print(f"Generating mock data ({stocks} stocks, {days} days, {warrants} warrants)...")
+    rng = np.random.default_rng(seed)
+    regular = stocks - warrants
+    codes = np.array([f"{i:04d}" for i in range(regular)] + [f"03{i:04d}" for i in range(warrants)])
+    names = np.array([f"股票{c}" for c in codes[:regular]] +
+                     [f"元大{'購' if i % 2 else '售'}{c}" for i, c in enumerate(codes[regular:])])
+    dates = pd.date_range(end=pd.Timestamp.now().normalize(), periods=days)
+
+    n = stocks * days
+    close = rng.uniform(10, 200, n)
+    full_df = pd.DataFrame({
+        '證券代號': np.repeat(codes, days),
+        '證券名稱': np.repeat(names, days),
+        'Date': np.tile(dates, stocks),
+        '收盤價': close,
+        '最高價': np.maximum(close, rng.uniform(10, 200, n)),
+        '最低價': np.minimum(close, rng.uniform(10, 200, n)),
+        '開盤價': rng.uniform(10, 200, n),
+        '成交股數': rng.integers(1000, 100000, n),
+        '成交筆數': rng.integers(1, 1000, n),
+    })
+    return full_df
+
+
+def legacy_screen(result_df):
+    """main.py 原本的 iterrows 篩選 (screen 階段的參考實作)，回傳通過的 index"""
+    final = []
+    for idx, row in result_df.iterrows():
+        vol = row.get('成交股數', 0)
+        ma_vol = row.get('MA15_Vol', 0)
+        if pd.isna(ma_vol) or vol <= ma_vol: continue
+        stock_code = str(row.get('證券代號', '')).strip()
+        stock_name = str(row.get('證券名稱', '')).strip()
+        if len(stock_code) == 6 and any(k in stock_name for k in ["購", "售", "牛", "熊"]): continue
+        if row.get('開盤價', 0) >= row.get('收盤價', 0): continue
+        max_15_high = row.get('Max15_High', 0)
+        if pd.isna(max_15_high) or row['收盤價'] <= max_15_high: continue
+        trans_count = row.get('成交筆數', 0)
+        if pd.isna(trans_count) or trans_count >= 300: continue
+        if row.get('K', 0) <= row.get('D', 0): continue
+        final.append(idx)
+    return final
+
+
+def _timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    return value, time.perf_counter() - start
+
+
+def _compare(expected, actual, rtol=1e-9):
+    """回傳 (是否一致, 最大絕對誤差)；NaN 的位置必須相同"""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    if expected.shape != actual.shape or not np.array_equal(np.isnan(expected), np.isnan(actual)):
+        return False, float('inf')
+    valid = ~np.isnan(expected)
+    if not valid.any():
+        return True, 0.0
+    diff = np.abs(expected[valid] - actual[valid])
+    return bool(np.allclose(expected, actual, rtol=rtol, atol=rtol, equal_nan=True)), float(diff.max())
+
+
+def _fmt(value, decimals=2):
+    return f"{value:,.{decimals}f}"
+
+
+def make_payload(day_df, rng):
+    """將單日資料轉為證交所 MI_INDEX JSON 格式 (數字含千分位，部分價格為 '--')"""
+    n = len(day_df)
+    no_trade = rng.random(n) < 0.02
+    change = day_df['收盤價'].to_numpy() - day_df['開盤價'].to_numpy()
+    rows = []
+    for i, row in enumerate(day_df.itertuples(index=False)):
+        prices = ['--'] * 4 if no_trade[i] else [_fmt(row.開盤價), _fmt(row.最高價), _fmt(row.最低價), _fmt(row.收盤價)]
+        sign = '<p style= color:red>+</p>' if change[i] > 0 else '<p style= color:green>-</p>'
+        rows.append([row.證券代號, row.證券名稱, _fmt(row.成交股數, 0), _fmt(row.成交筆數, 0),
+                     _fmt(row.成交股數 * row.收盤價, 0), *prices, sign, _fmt(abs(change[i])),
+                     _fmt(row.收盤價), '1', _fmt(row.收盤價), '1', '0.00'])
+    data = {'stat': 'OK', 'tables': [{'title': '每日收盤行情(全部)', 'fields': TWSE_FIELDS, 'data': rows}]}
+    return json.dumps(data, ensure_ascii=False), no_trade
+
+
+class BenchmarkContext:
+    """單一規模的模擬資料與各階段共用的中間結果"""
+
+    def __init__(self, stocks, days, warrants, sample=SAMPLE_CODES, seed=0):
+        self.stocks, self.days, self.warrants = stocks, days, warrants
+        df = generate_mock_data(stocks=stocks, days=days, warrants=warrants, seed=seed)
+        # 日期轉為 YYYYMMDD (每個日期只格式化一次)
+        uniq, inverse = np.unique(df['Date'].to_numpy(), return_inverse=True)
+        df['Date'] = pd.DatetimeIndex(uniq).strftime('%Y%m%d').to_numpy()[inverse]
+        # 價格與證交所相同只到小數兩位
+        for col in ['收盤價', '最高價', '最低價', '開盤價']:
+            df[col] = df[col].round(2)
+        self.df = df
+        self.dates = list(pd.DatetimeIndex(uniq).strftime('%Y%m%d'))
+        codes = df['證券代號'].unique()
+        self.sample = set(np.random.default_rng(seed).choice(codes, min(sample, len(codes)), replace=False))
+        self.rng = np.random.default_rng(seed)
+        self._latest = None
+
+    def sample_frame(self):
+        return self.df[self.df['證券代號'].isin(self.sample)]
+
+    def latest(self):
+        """最後一天的資料與初篩指標 (篩選與報表的輸入)"""
+        if self._latest is None:
+            result = indicators.calculate_screen_indicators(self.df.copy())
+            self._latest = result[result['Date'] == self.dates[-1]].reset_index(drop=True)
+        return self._latest
+
+
+def bench_json_parse(ctx):
+    seconds, count = 0.0, 0
+    for date_str in ctx.dates[-JSON_DAYS:]:
+        payload, _ = make_payload(ctx.df[ctx.df['Date'] == date_str], ctx.rng)
+        table, elapsed = _timed(lambda: data_fetcher.find_quotes_table(json.loads(payload)))
+        seconds += elapsed
+        count += len(table['data'])
+    return {'seconds': seconds, 'rows': count, 'parity': count == ctx.stocks * min(JSON_DAYS, ctx.days)}
+
+
+def bench_clean_data(ctx):
+    """schema 單次轉換 (parse_quotes) 與逐欄轉換 (clean_data_generic) 比較"""
+    seconds, reference_seconds, parity, max_diff = 0.0, 0.0, True, 0.0
+    for date_str in ctx.dates[-JSON_DAYS:]:
+        day_df = ctx.df[ctx.df['Date'] == date_str]
+        payload, no_trade = make_payload(day_df, ctx.rng)
+        table = data_fetcher.find_quotes_table(json.loads(payload))
+        cleaned, elapsed = _timed(data_fetcher.parse_quotes, table['fields'], table['data'])
+        expected, ref_elapsed = _timed(
+            lambda: data_fetcher.clean_data_generic(pd.DataFrame(table['data'], columns=table['fields'])))
+        seconds += elapsed
+        reference_seconds += ref_elapsed
+        # 與逐欄轉換及原始數值比對 (價格四捨五入至小數兩位，無成交為 NaN)
+        for col in ['成交股數', '成交筆數', '開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '本益比']:
+            ok, diff = _compare(expected[col], cleaned[col], rtol=0)
+            parity, max_diff = parity and ok, max(max_diff, diff)
+        original = np.where(no_trade, np.nan, day_df['收盤價'].round(2).to_numpy())
+        ok, diff = _compare(original, cleaned['收盤價'], rtol=1e-12)
+        parity, max_diff = parity and ok, max(max_diff, diff)
+        parity &= list(cleaned['證券代號']) == list(day_df['證券代號'])
+    return {'seconds': seconds, 'rows': ctx.stocks * min(JSON_DAYS, ctx.days),
+            'reference_seconds': reference_seconds, 'reference_codes': ctx.stocks,
+            'parity': bool(parity), 'max_abs_diff': max_diff}
+
+
+def bench_store_load(ctx):
+    columns = data_fetcher.ANALYSIS_COLUMNS
+    with tempfile.TemporaryDirectory() as tmp:
+        _, write_seconds = _timed(store.write_range, ctx.df, store_dir=tmp)
+        original = store.STORE_DIR
+        store.STORE_DIR = tmp
+        try:
+            columns = [c for c in columns if c in ctx.df.columns]
+            panel, seconds = _timed(data_fetcher.load_panel, ctx.dates, columns=columns)
+            frame = data_fetcher.load_history(ctx.dates, columns=columns)
+            frame_bytes = int(frame.memory_usage(deep=True).sum())
+            del frame
+        finally:
+            store.STORE_DIR = original
+    # 模擬資料依 代號, 日期 排序，轉為 日期 x 股票 後與 Panel 比對
+    expected = ctx.df['收盤價'].to_numpy().reshape(ctx.stocks, ctx.days).T
+    position = {code: i for i, code in enumerate(panel.codes)}
+    col = [position[code] for code in ctx.df['證券代號'].to_numpy()[::ctx.days]]
+    ok, diff = _compare(expected, panel['close'][:, col])
+    return {'seconds': seconds, 'write_seconds': write_seconds, 'rows': len(ctx.df),
+            'parity': ok, 'max_abs_diff': diff, 'panel_bytes': int(panel.nbytes), 'frame_bytes': frame_bytes,
+            'raw_bytes': int(ctx.df.memory_usage(deep=True).sum())}
+
+
+def _reference(ctx, process):
+    """逐檔計算 (參考實作) 並與批次結果的相同股票比對"""
+    sample = ctx.sample_frame()
+    expected, reference_seconds = _timed(
+        lambda: pd.concat([process(g.copy()) for _, g in sample.groupby('證券代號')]))
+    expected = expected.sort_values(['證券代號', 'Date'], kind='stable')
+    return expected, reference_seconds, len(ctx.sample)
+
+
+def _batch_result(ctx, func, columns, expected, reference_seconds, reference_codes):
+    batch_df = ctx.df[['證券代號', 'Date', '收盤價', '最高價', '最低價', '成交股數']].copy()
+    result, seconds = _timed(func, batch_df)
+    actual = result[result['證券代號'].isin(ctx.sample)].sort_values(['證券代號', 'Date'], kind='stable')
+    parity, max_diff = True, 0.0
+    for col in columns:
+        ok, diff = _compare(expected[col], actual[col])
+        parity, max_diff = parity and ok, max(max_diff, diff)
+    return {'seconds': seconds, 'rows': len(batch_df), 'reference_seconds': reference_seconds,
+            'reference_codes': reference_codes, 'parity': parity, 'max_abs_diff': max_diff}
+
+
+def bench_kd(ctx):
+    expected, ref_seconds, ref_codes = _reference(ctx, indicators.calculate_kd)
+    return _batch_result(ctx, indicators.calculate_kd_batch, ['K', 'D'], expected, ref_seconds, ref_codes)
+
+
+def bench_macd(ctx):
+    expected, ref_seconds, ref_codes = _reference(ctx, indicators.calculate_macd)
+    return _batch_result(ctx, indicators.calculate_macd_batch, ['DIF', 'MACD', 'OSC'],
+                         expected, ref_seconds, ref_codes)
+
+
+def _legacy_ma_high(group):
+    group['MA15_Vol'] = indicators.calculate_ma_volume(group, days=15).shift(1)
+    group['Max15_High'] = group['最高價'].rolling(window=15).max().shift(1)
+    return group
+
+
+def _batch_ma_high(df):
+    layout = indicators._series_layout(df)
+    volume = indicators._to_2d(df['成交股數'], layout)
+    high = indicators._to_2d(df['最高價'], layout)
+    df['MA15_Vol'] = indicators._from_2d(indicators._shift_2d(indicators._rolling_2d(volume, 15, 'mean')), layout)
+    df['Max15_High'] = indicators._from_2d(indicators._shift_2d(indicators._rolling_2d(high, 15, 'max')), layout)
+    return df
+
+
+def bench_ma_high(ctx):
+    columns = ['MA15_Vol', 'Max15_High']
+    expected, ref_seconds, ref_codes = _reference(ctx, _legacy_ma_high)
+    return _batch_result(ctx, _batch_ma_high, columns, expected, ref_seconds, ref_codes)
+
+
+def bench_screen(ctx):
+    latest = ctx.latest()
+    (passed, _), seconds = _timed(rules.run_screen, latest, verbose=False)
+    expected, reference_seconds = _timed(legacy_screen, latest)
+    return {'seconds': seconds, 'rows': len(latest), 'reference_seconds': reference_seconds,
+            'reference_codes': len(latest), 'parity': list(passed.index) == expected,
+            'passed': len(passed)}
+
+
+def bench_report(ctx):
+    """報表 (最新一天全部股票 + 指標歷史) 各格式的耗時與檔案大小；seconds 為預設格式 (xlsx)"""
+    latest = ctx.latest()
+    histories = ctx.df[ctx.df['證券代號'].isin(latest['證券代號'].head(REPORT_HISTORY_CODES))]
+    original = report.REPORT_DIR
+    formats, parity = {}, True
+    with tempfile.TemporaryDirectory() as tmp:
+        report.REPORT_DIR = tmp
+        try:
+            for fmt in report.FORMATS:
+                path, seconds = _timed(report.generate_report, latest, ctx.dates[-1],
+                                       histories=histories, fmt=fmt)
+                parity = parity and path is not None
+                formats[fmt] = {'seconds': seconds, 'bytes': os.path.getsize(path) if path else 0}
+        finally:
+            report.REPORT_DIR = original
+    return {'seconds': formats['xlsx']['seconds'], 'rows': len(latest), 'parity': parity,
+            'bytes': formats['xlsx']['bytes'], 'formats': formats}
+
+
+def bench_sharded(ctx):
+    """Panel 指標 (初篩 + MACD) 依 process 數的耗時，並與單一 process 的結果比對"""
+    base = Panel.from_frame(ctx.df[['證券代號', 'Date', '最高價', '最低價', '收盤價', '成交股數']])
+    names = ['MA15_Vol', 'Max15_High', 'K', 'D', 'DIF', 'MACD', 'OSC', 'OSC_Prev']
+    scaling, expected, parity = {}, None, True
+    for workers in WORKER_COUNTS:
+        panel = Panel(base.dates, base.codes, dict(base.fields), base.mask)
+        if workers > 1:
+            # 先啟動 process pool，不計入耗時
+            list(sharding._get_pool(workers).map(abs, range(workers)))
+        _, seconds = _timed(lambda: indicators.calculate_panel_macd(
+            indicators.calculate_panel_indicators(panel, workers=workers), workers=workers))
+        scaling[str(workers)] = seconds
+        if expected is None:
+            expected = panel
+        else:
+            parity = parity and all(np.array_equal(expected.fields[n], panel.fields[n], equal_nan=True)
+                                    for n in names)
+    sharding.shutdown()
+    return {'seconds': scaling[str(WORKER_COUNTS[-1])], 'rows': int(base.mask.sum()),
+            'reference_seconds': scaling[str(WORKER_COUNTS[0])], 'reference_codes': len(base.codes),
+            'parity': parity, 'scaling': scaling, 'cpus': os.cpu_count()}
+
+
+def _startup_seconds(args):
+    # 從套件的上一層目錄執行，與 python -m tw_stock_analyzer 相同
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    best = None
+    for _ in range(STARTUP_REPEAT):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def bench_startup(ctx=None):
+    """命令列各指令的啟動時間 (新的 process，含直譯器啟動)，與啟動時載入 yfinance 的版本比較"""
+    commands = {name: _startup_seconds(args) for name, args in STARTUP_COMMANDS.items()}
+    return {'seconds': commands['help'], 'reference_seconds': _startup_seconds(STARTUP_REFERENCE),
+            'reference_codes': 0, 'parity': True, 'commands': commands}
+
+
+BENCHMARKS = {
+    'json_parse': bench_json_parse,
+    'clean_data': bench_clean_data,
+    'store_load': bench_store_load,
+    'kd': bench_kd,
+    'macd': bench_macd,
+    'ma_high': bench_ma_high,
+    'screen': bench_screen,
+    'report': bench_report,
+    'sharded': bench_sharded,
+    'startup': bench_startup,
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(scales=None, stages=None, sample=SAMPLE_CODES, output=None):
+    """
+    執行基準測試
+    scales: {名稱: (證券數, 天數, 權證數)} (預設 small, medium)
+    stages: 要執行的階段 (預設全部)
+    output: 結果 JSON 路徑 (None 表示不寫檔)
+    回傳結果 dict
+    """
+    scales = scales or {name: SCALES[name] for name in ['small', 'medium']}
+    stages = stages or STAGES
+    results = []
+    if 'startup' in stages:
+        row = {'scale': '-', 'stage': 'startup'}
+        row.update(bench_startup())
+        results.append(row)
+        print("[-] startup: " + ", ".join(f"{name} {seconds:.3f}s" for name, seconds in row['commands'].items()) +
+              f" (載入 yfinance {row['reference_seconds']:.3f}s)")
+    data_stages = [stage for stage in stages if stage != 'startup']
+    for scale, (stocks, days, warrants) in scales.items() if data_stages else []:
+        ctx = BenchmarkContext(stocks, days, warrants, sample=sample)
+        for stage in data_stages:
+            row = {'scale': scale, 'stage': stage, 'stocks': stocks, 'days': days, 'warrants': warrants}
+            row.update(BENCHMARKS[stage](ctx))
+            results.append(row)
+            ref = f" (參考實作 {row['reference_seconds']:.3f}s / {row['reference_codes']} 檔)" \
+                if 'reference_seconds' in row else ""
+            print(f"[{scale}] {stage}: {row['seconds']:.3f}s{ref} parity={row['parity']}")
+        del ctx
+
+    data = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'results': results,
+    }
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        print(f"結果已寫入 {output}")
+    return data
+
+
+def compare(previous, current):
+    """比較兩次結果，回傳 DataFrame: scale, stage, 前次/本次秒數與比值"""
+    key = ['scale', 'stage']
+    old = pd.DataFrame(previous['results'])[key + ['seconds']]
+    new = pd.DataFrame(current['results'])[key + ['seconds']]
+    merged = old.merge(new, on=key, suffixes=('_previous', '_current'))
+    merged['ratio'] = merged['seconds_current'] / merged['seconds_previous']
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="效能基準測試")
+    parser.add_argument("--scale", nargs="+", default=['small', 'medium'], choices=sorted(SCALES))
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES)
+    parser.add_argument("--sample", type=int, default=SAMPLE_CODES, help="參考實作比對的股票數")
+    parser.add_argument("--output", default=os.path.join(
+        BENCHMARK_DIR, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"))
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--workers", nargs="+", type=int, default=WORKER_COUNTS,
+                        help="sharded 階段量測的 process 數 (第一個為比較基準)")
+    args = parser.parse_args()
+    WORKER_COUNTS = args.workers
+
+    data = run_suite({name: SCALES[name] for name in args.scale}, args.stages, args.sample, args.output)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print(compare(json.load(f), data).to_string(index=False))
+    if not all(row['parity'] for row in data['results']):
+        print("數值比對失敗")
+        sys.exit(1)
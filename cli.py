@@ -0,0 +1,209 @@
+import os
+import re
+import sys
+import argparse
+from datetime import datetime
+from . import settings
+from . import metrics
+
+# 命令列入口
+#   python -m tw_stock_analyzer fetch [--date YYYYMMDD ...] [--days N]   下載每日行情
+#   python -m tw_stock_analyzer backfill --start YYYYMMDD [--end ...]    回補歷史資料 (可續傳)
+#   python -m tw_stock_analyzer screen [--date YYYYMMDD]                 篩選並列出候選股 (不產生報表)
+#   python -m tw_stock_analyzer report [--date ...] [--format csv]       篩選並產生報表
+#   python -m tw_stock_analyzer notify [--date ...]                      將報表加入通知佇列並送出
+#   python -m tw_stock_analyzer run [--profile]                          每日分析 (同 main.py)
+#   python -m tw_stock_analyzer daemon                                   常駐排程 (每個交易日資料公布後分析)
+#
+# 本模組只 import 標準函式庫與 settings、metrics，pandas、pyarrow、yfinance 等在各指令需要時才載入：
+# --help 與通知等不處理資料的指令不必等待這些套件載入 (啟動時間見 benchmark.py 的 startup 階段)。
+
+REPORT_NAME = re.compile(r"stock_analysis_(\d{8})\.(\w+)$") # 主要報表檔名 (不含其他工作表的檔案)
+REPORT_FORMATS = ['csv', 'html', 'parquet', 'xlsx'] # 同 report.FORMATS (不為了檢查參數載入 pandas)
+
+
+def _markets(value):
+    return [m.strip().upper() for m in value.split(',')] if value else None
+
+
+def fetch(args):
+    """下載指定日期 (預設最近 --days 個交易日) 的每日行情，已有資料的日期略過"""
+    from . import downloader
+    from . import trading_calendar
+    dates = args.date or trading_calendar.get_trading_days(args.days)
+    results = downloader.download_missing(dates, workers=args.workers, markets=_markets(args.markets))
+    failed = [d for d, ok in results.items() if not ok]
+    print(f"檢查 {len(dates)} 天: 下載 {len(results) - len(failed)} 天，無資料或失敗 {len(failed)} 天")
+    for date_str in failed:
+        print(f"  {date_str}")
+    return 0
+
+
+def backfill(args):
+    """回補歷史每日行情 (見 backfill.py)"""
+    from . import backfill as backfill_module
+    markets = _markets(args.markets)
+    if args.dry_run:
+        checkpoint = backfill_module.Checkpoint(backfill_module.checkpoint_path(args.start, args.end),
+                                                args.start, args.end)
+        pending, skipped = backfill_module.plan(args.start, args.end, checkpoint, markets=markets)
+        print(f"需回補 {len(pending)} 天，略過 {len(skipped)} 天 (已達重試上限)")
+        for date_str in pending:
+            print(date_str)
+        return 0
+
+    def print_progress(done, total):
+        if done % 20 == 0 or done == total:
+            print(f"進度 {done}/{total}")
+
+    try:
+        result = backfill_module.run_backfill(args.start, args.end, args.workers, retry_failed=args.retry_failed,
+                                              progress=print_progress, markets=markets)
+    except KeyboardInterrupt:
+        print("已中斷，重新執行相同指令即可從中斷處繼續")
+        return 130
+    print(f"完成: 已完成 {len(result.done)} 天，失敗 {len(result.failed)} 天 (進度檔 {result.path})")
+    return 0
+
+
+def _run_pipeline(args, write_report, report_format=None):
+    from . import pipeline
+    from . import trading_calendar
+    # 過去的日期以 Panel 完整計算指標: 增量狀態只能向後推進，不改寫每日使用的狀態檔
+    historical = args.date is not None and args.date < trading_calendar.get_trading_days(1)[-1]
+    result = pipeline.AnalysisPipeline(on_progress=pipeline.log_progress, write_report=write_report,
+                                       report_format=report_format,
+                                       incremental=False if historical else None).run(end_date=args.date)
+    print(f"執行紀錄已寫入 {result.metrics.write()}")
+    return result
+
+
+def screen(args):
+    """執行篩選並列出候選股 (不產生報表)"""
+    result = _run_pipeline(args, write_report=False)
+    if not result.ok:
+        return 1
+    if result.final_df.empty:
+        print(f"{result.today_date} 無符合條件股票")
+        return 0
+    from . import report as report_module
+    columns = [c for c in report_module.order_columns(result.final_df.columns) if c in report_module.PRIORITY_COLS]
+    print(result.final_df[columns].to_string(index=False))
+    return 0
+
+
+def report(args):
+    """執行篩選並產生報表"""
+    result = _run_pipeline(args, write_report=True, report_format=args.format)
+    if not result.ok:
+        return 1
+    if result.report_path is None and not result.final_df.empty:
+        return 1
+    return 0
+
+
+def find_report(date_str=None, directory=None):
+    """REPORT_DIR 中指定日期 (預設最新一天) 的主要報表檔案，找不到時回傳 None"""
+    directory = directory or settings.REPORT_DIR
+    if not os.path.isdir(directory):
+        return None
+    found = []
+    for name in os.listdir(directory):
+        match = REPORT_NAME.match(name)
+        if match and (date_str is None or match.group(1) == date_str):
+            path = os.path.join(directory, name)
+            found.append((match.group(1), os.path.getmtime(path), path))
+    return max(found)[2] if found else None
+
+
+def notify(args):
+    """將報表加入通知佇列，並在 --timeout 秒內送出佇列中的通知 (包含先前未送出的)"""
+    from . import notifier
+    from . import outbox
+    worker = outbox.start_worker()
+    try:
+        path = find_report(args.date)
+        if path is None:
+            print(f"找不到{args.date or '任何'}報表，只送出佇列中的通知")
+        else:
+            date_str = REPORT_NAME.match(os.path.basename(path)).group(1)
+            notifier.send_telegram_report(path, args.message or f"📊 股市分析報告 ({date_str})")
+    finally:
+        pending = worker.stop(args.timeout)
+    if pending:
+        print(f"尚有 {pending} 則通知未送出，將於下次執行時重試")
+    return 0
+
+
+def run(args):
+    """每日分析: 下載 -> 篩選 -> 報表 -> 通知 (同 main.py)"""
+    from . import main as daily
+    if args.profile:
+        daily.profile_main(report_format=args.report_format)
+    else:
+        daily.main(report_format=args.report_format)
+    return 0
+
+
+def daemon(args):
+    """常駐排程 (見 scheduler.py)"""
+    from . import scheduler
+    scheduler.Scheduler(markets=_markets(args.markets), report_format=args.report_format).run_forever()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m tw_stock_analyzer", description="台灣股市分析工具")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("fetch", help="下載每日行情")
+    p.add_argument("--date", nargs="+", help="日期 YYYYMMDD (預設最近 --days 個交易日)")
+    p.add_argument("--days", type=int, default=1, help="最近的交易日數 (預設 1)")
+    p.add_argument("--workers", type=int, help="並行 worker 數 (預設 DOWNLOAD_WORKERS)")
+    p.add_argument("--markets", help="市場，以逗號分隔 (預設 MARKETS)")
+    p.set_defaults(func=fetch)
+
+    p = commands.add_parser("backfill", help="回補歷史每日行情 (可中斷後續傳)")
+    p.add_argument("--start", required=True, help="開始日期 YYYYMMDD")
+    p.add_argument("--end", default=datetime.now().strftime("%Y%m%d"), help="結束日期 YYYYMMDD (預設今天)")
+    p.add_argument("--workers", type=int, help="並行 worker 數 (預設 DOWNLOAD_WORKERS)")
+    p.add_argument("--retry-failed", action="store_true", help="重新嘗試已達重試上限的日期")
+    p.add_argument("--dry-run", action="store_true", help="只列出需下載的日期")
+    p.add_argument("--markets", help="回補的市場，以逗號分隔 (預設 MARKETS)")
+    p.set_defaults(func=backfill)
+
+    for name, func, text in [("screen", screen, "篩選並列出候選股"), ("report", report, "篩選並產生報表")]:
+        p = commands.add_parser(name, help=text)
+        p.add_argument("--date", help="分析日期 YYYYMMDD (預設最近的交易日)")
+        if name == "report":
+            p.add_argument("--format", choices=REPORT_FORMATS, help=f"報表格式 (預設 {settings.REPORT_FORMAT})")
+        p.set_defaults(func=func)
+
+    p = commands.add_parser("notify", help="將報表加入通知佇列並送出")
+    p.add_argument("--date", help="報表日期 YYYYMMDD (預設最新的報表)")
+    p.add_argument("--message", help="訊息內容")
+    p.add_argument("--timeout", type=float, default=settings.OUTBOX_FLUSH_TIMEOUT,
+                   help=f"最多等待送出的秒數 (預設 {settings.OUTBOX_FLUSH_TIMEOUT:g})")
+    p.set_defaults(func=notify)
+
+    p = commands.add_parser("run", help="每日分析 (下載、篩選、報表、通知)")
+    p.add_argument("--profile", action="store_true", help="以 cProfile 執行並輸出效能分析")
+    p.add_argument("--report-format", choices=REPORT_FORMATS, help=f"報表格式 (預設 {settings.REPORT_FORMAT})")
+    p.set_defaults(func=run)
+
+    p = commands.add_parser("daemon", help="常駐排程: 每個交易日資料公布後立即分析並發送通知")
+    p.add_argument("--markets", help="市場，以逗號分隔 (預設 MARKETS)")
+    p.add_argument("--report-format", choices=REPORT_FORMATS, help=f"報表格式 (預設 {settings.REPORT_FORMAT})")
+    p.set_defaults(func=daemon)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # 逐日下載/儲存與各篩選條件通過數等訊息以 logging 輸出
+    metrics.setup_logging(settings.LOG_LEVEL)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
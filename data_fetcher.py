@@ -1,54 +1,156 @@
-import requests
-import time
+import numpy as np
 import pandas as pd
 import os
+import re
+import glob
 import json
-from .settings import TWSE_URL, DATA_DIR
+import logging
+import warnings
+from .settings import TWSE_URL, DATA_DIR, STORE_FORMAT, TWSE_REQUESTS_PER_SECOND, TWSE_BURST, COMPACT_MEMORY, ARCHIVE_RAW
+from . import store
+from .panel import Panel
+from .rate_limiter import TokenBucket
+from . import trading_calendar
+from . import archive
+from . import http_client
+from . import metrics
 
-def fetch_daily_quotes(date_str):
+log = logging.getLogger(__name__)
+
+# 所有對證交所的請求共用同一個限速器 (遵守證交所頻率限制)
+TWSE_LIMITER = TokenBucket(TWSE_REQUESTS_PER_SECOND, TWSE_BURST)
+
+# 分析流程 (初篩 + 報表) 需要的欄位，載入歷史資料時只讀取這些欄位
+ANALYSIS_COLUMNS = ['證券代號', '證券名稱', '成交股數', '成交筆數', '成交金額',
+                    '開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '本益比', store.MARKET_COL]
+
+# 證交所 MI_INDEX「每日收盤行情」欄位 -> 型態
+# text: 字串 (去除前後空白)
+# int: 整數 (移除千分位，無資料視為 0)
+# float: 浮點數 (移除千分位，'--' 為缺值)
+# sign: 漲跌符號 (+1 / -1 / 0，原始值為 '<p style= color:red>+</p>' 等 HTML)
+QUOTE_SCHEMA = {
+    '證券代號': 'text',
+    '證券名稱': 'text',
+    '成交股數': 'int',
+    '成交筆數': 'int',
+    '成交金額': 'int',
+    '開盤價': 'float',
+    '最高價': 'float',
+    '最低價': 'float',
+    '收盤價': 'float',
+    '漲跌(+/-)': 'sign',
+    '漲跌價差': 'float',
+    '最後揭示買價': 'float',
+    '最後揭示買量': 'int',
+    '最後揭示賣價': 'float',
+    '最後揭示賣量': 'int',
+    '本益比': 'float',
+}
+
+# 數值欄位中代表無資料的值 ('' 或 '--')，比對 '|' 分隔的整欄字串
+_MISSING = re.compile(r"\|(?:-{2,})?(?=\|)")
+
+def fetch_daily_quotes(date_str, limiter=None):
     """
     從證交所抓取每日收盤行情
     date_str: YYYYMMDD (例如: 20241230)
+    limiter: 限速器 (預設為共用的 TWSE_LIMITER)
+    欄位與 QUOTE_SCHEMA 不符時拋出 ValueError (證交所格式變更，需更新 schema)
+    有資料的原始回應會先封存 (ARCHIVE_RAW)，更新 schema 後可由封存重建，不需重新下載
     """
     url = f"{TWSE_URL}?date={date_str}&type=ALL&response=json"
-    print(f"正在抓取 {date_str} 的資料...")
-    
+    log.info(f"正在抓取 {date_str} 的資料...", extra={'event': 'fetch', 'date': date_str})
+
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        
-        if data.get('stat') != 'OK':
-            print(f"{date_str} 無資料或休市: {data.get('stat')}")
-            return None
-            
-        # 解析資料
-        # 尋找包含 "每日收盤行情" 的表格
-        target_table = None
-        if 'tables' in data:
-            for table in data['tables']:
-                if "每日收盤行情" in table.get('title', ''):
-                    target_table = table
-                    break
-        
-        if not target_table:
-            print("未找到每日收盤行情表格")
-            return None
-            
-        fields = target_table['fields']
-        raw_data = target_table['data']
-        
-        df = pd.DataFrame(raw_data, columns=fields)
-        return clean_data(df)
-        
+        # 網路錯誤與限流由 http_client 重試 (每次重試同樣經過限速器)；重試用盡才視為失敗 (不記錄為休市日)
+        data, response = http_client.get_json(url, limiter=limiter or TWSE_LIMITER)
     except Exception as e:
-        print(f"抓取資料失敗: {e}")
+        log.error(f"抓取資料失敗: {http_client.describe_error(e)}",
+                  extra={'event': 'fetch_failed', 'date': date_str, 'error': http_client.describe_error(e)})
         return None
-    finally:
-        time.sleep(3) # 遵守證交所頻率限制
+
+    if data.get('stat') != 'OK':
+        log.info(f"{date_str} 無資料或休市: {data.get('stat')}",
+                 extra={'event': 'no_data', 'date': date_str, 'stat': data.get('stat')})
+        # 記錄休市日，之後不再重複查詢 (今天的資料可能只是尚未公布，不記錄)
+        trading_calendar.mark_closed(date_str, data.get('stat', ''))
+        return None
+
+    if ARCHIVE_RAW:
+        archive.save(date_str, response.content)
+    table = find_quotes_table(data)
+    if table is None:
+        log.warning("未找到每日收盤行情表格", extra={'event': 'no_table', 'date': date_str})
+        return None
+    return parse_quotes(table['fields'], table['data'])
+
+def find_quotes_table(data):
+    """
+    由證交所 MI_INDEX 回應 (已解析的 JSON) 取出「每日收盤行情」表格 (含 fields, data)
+    找不到表格時回傳 None
+    """
+    # 尋找包含 "每日收盤行情" 的表格
+    for table in data.get('tables', []):
+        if "每日收盤行情" in table.get('title', ''):
+            return table
+    return None
+
+def _check_schema(fields):
+    missing = [f for f in QUOTE_SCHEMA if f not in fields]
+    unknown = [f for f in fields if f not in QUOTE_SCHEMA]
+    if missing or unknown:
+        raise ValueError(f"每日收盤行情欄位與 schema 不符: 缺少 {missing}，未知 {unknown}")
+
+def _parse_numbers(values, kind):
+    """
+    一次解析整欄數值字串 (合併為單一字串後以 numpy 解析，不逐值轉換)
+    無法解析的值拋出 ValueError
+    """
+    text = '|' + '|'.join(values).replace(',', '').replace(' ', '') + '|'
+    if '||' in text or '--' in text:
+        text = _MISSING.sub('|nan' if kind == 'float' else '|0', text)
+    dtype = np.float64 if kind == 'float' else np.int64
+    with warnings.catch_warnings():
+        # numpy 遇到無法解析的內容時只發出 DeprecationWarning 並回傳部分結果，改為錯誤
+        warnings.simplefilter('error', DeprecationWarning)
+        arr = np.fromstring(text[1:-1], dtype=dtype, sep='|') if values else np.empty(0, dtype)
+    if len(arr) != len(values):
+        raise ValueError(f"解析結果筆數不符 ({len(arr)} != {len(values)})")
+    return arr
+
+def _convert_column(field, values):
+    kind = QUOTE_SCHEMA[field]
+    try:
+        if kind == 'text':
+            return [v.strip() for v in values]
+        if kind == 'sign':
+            return np.array([1 if '+' in v else -1 if '-' in v else 0 for v in values], dtype=np.int8)
+        return _parse_numbers(values, kind)
+    except (ValueError, TypeError, AttributeError, DeprecationWarning) as e:
+        raise ValueError(f"欄位 {field} 含無法解析的值: {e}") from e
+
+def _from_columns(fields, columns):
+    _check_schema(fields)
+    return pd.DataFrame({field: _convert_column(field, values) for field, values in zip(fields, columns)})
+
+def parse_quotes(fields, rows):
+    """
+    依 QUOTE_SCHEMA 將證交所原始表格 (fields + data 的字串列) 直接轉為型態固定的 DataFrame
+    欄位或數值與 schema 不符時拋出 ValueError
+    """
+    width = len(fields)
+    if rows and set(map(len, rows)) != {width}:
+        raise ValueError(f"每日收盤行情資料列欄位數與 fields ({width}) 不符")
+    columns = list(zip(*rows)) if rows else [()] * width
+    return _from_columns(list(fields), columns)
 
 def clean_data(df):
-    """清理資料：移除逗號，轉換數值"""
+    """清理資料 (原始字串 DataFrame，欄位需符合 QUOTE_SCHEMA)：移除逗號，轉換為固定型態"""
+    return _from_columns(list(df.columns), [df[col].tolist() for col in df.columns])
+
+def clean_data_generic(df):
+    """清理資料：移除逗號，轉換數值 (逐欄嘗試轉換，不檢查欄位；供 schema 以外的表格使用)"""
     # 複製一份以免修改原始資料
     df = df.copy()
     
@@ -71,21 +173,99 @@ def clean_data(df):
             
     return df
 
-def save_daily_data(date_str, df):
-    """儲存每日資料為 CSV"""
+def _csv_path(date_str, market=None):
+    """每日 CSV 路徑: 證券交易所為 YYYYMMDD.csv，其他市場為 YYYYMMDD_<市場>.csv"""
+    if market is None or market == store.DEFAULT_MARKET:
+        return os.path.join(DATA_DIR, f"{date_str}.csv")
+    return os.path.join(DATA_DIR, f"{date_str}_{market}.csv")
+
+def _read_csv_day(date_str, usecols=None):
+    """讀取同一天所有市場的 CSV，沒有任何檔案時回傳 None"""
+    paths = sorted(glob.glob(os.path.join(DATA_DIR, f"{date_str}.csv")) +
+                   glob.glob(os.path.join(DATA_DIR, f"{date_str}_*.csv")))
+    frames = [pd.read_csv(p, usecols=usecols, dtype={'證券代號': str, '證券名稱': str}) for p in paths]
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+def save_daily_data(date_str, df, market=None):
+    """
+    儲存每日資料 (預設寫入欄式資料庫，STORE_FORMAT='csv' 時沿用每日 CSV)
+    market: 市場 (預設為證交所)，同一天不同市場的資料分別保存
+    """
     if df is not None:
-        file_path = os.path.join(DATA_DIR, f"{date_str}.csv")
-        df.to_csv(file_path, index=False, encoding='utf-8-sig')
-        print(f"資料已儲存至 {file_path}")
+        if STORE_FORMAT == 'csv':
+            file_path = _csv_path(date_str, market)
+            df.assign(**{store.MARKET_COL: market or store.DEFAULT_MARKET}).to_csv(
+                file_path, index=False, encoding='utf-8-sig')
+        else:
+            file_path = store.write_day(date_str, df, market=market)
+        log.info(f"資料已儲存至 {file_path}",
+                 extra={'event': 'saved', 'date': date_str, 'market': market or store.DEFAULT_MARKET, 'rows': len(df)})
 
 def load_daily_data(date_str):
-    """讀取每日資料"""
-    file_path = os.path.join(DATA_DIR, f"{date_str}.csv")
-    if os.path.exists(file_path):
-        return pd.read_csv(file_path)
-    return None
+    """讀取每日資料 (所有市場)"""
+    if STORE_FORMAT == 'csv':
+        return _read_csv_day(date_str)
+    return store.read_day(date_str)
+
+def load_history(dates, columns=None, codes=None, compact=None):
+    """
+    讀取多日資料並合併為長格式 DataFrame (含 'Date' 欄位)
+    columns: 只讀取需要的欄位 (None 表示全部)，不需要的欄位不會載入
+    codes: 只讀取指定的證券代號 (None 表示全部)
+    compact: 精簡型態 (category 代號/名稱/日期、float32 價格、整數數量，預設 settings.COMPACT_MEMORY)
+    無資料時回傳 None
+    """
+    if STORE_FORMAT != 'csv':
+        df = store.load_range(dates, columns=columns, codes=codes, compact=compact)
+        metrics.incr('rows_loaded', len(df) if df is not None else 0)
+        return df
+
+    all_dfs = []
+    for date_str in dates:
+        usecols = (lambda c: c in columns) if columns is not None else None
+        df = _read_csv_day(date_str, usecols)
+        if df is None:
+            continue
+        if codes is not None:
+            df = df[df['證券代號'].isin(codes)]
+        df['Date'] = date_str
+        all_dfs.append(df)
+    if not all_dfs:
+        return None
+    df = pd.concat(all_dfs, ignore_index=True)
+    metrics.incr('rows_loaded', len(df))
+    return df
+
+def load_panel(dates, columns=None, compact=None):
+    """
+    讀取多日資料並直接建立 Panel (日期 x 股票)
+    columns: 只讀取需要的欄位 (None 表示全部)
+    compact: 價格以 float32 保存 (預設 settings.COMPACT_MEMORY)
+    無資料時回傳 None
+    """
+    if STORE_FORMAT == 'csv':
+        df = load_history(dates, columns, compact=False)
+        return Panel.from_frame(df) if df is not None else None
+
+    table = store.load_table(dates, columns=columns)
+    if table is None:
+        return None
+    metrics.incr('rows_loaded', table.num_rows)
+    if COMPACT_MEMORY if compact is None else compact:
+        table = store.compact_table(table, dictionary=False)
+    fields = {name: table.column(name).to_numpy(zero_copy_only=False)
+              for name in table.column_names if name not in ('Date', '證券代號', '證券名稱', store.MARKET_COL)}
+    names = table.column('證券名稱').to_numpy(zero_copy_only=False) if '證券名稱' in table.column_names else None
+    markets = (table.column(store.MARKET_COL).to_numpy(zero_copy_only=False)
+               if store.MARKET_COL in table.column_names else None)
+    return Panel.from_columns(table.column('Date').to_numpy(zero_copy_only=False),
+                              table.column('證券代號').to_numpy(zero_copy_only=False),
+                              fields, names, markets)
 
-def check_data_exists(date_str):
-    """檢查資料是否已存在"""
-    file_path = os.path.join(DATA_DIR, f"{date_str}.csv")
-    return os.path.exists(file_path)
+def check_data_exists(date_str, market=None):
+    """檢查資料是否已存在 (market 指定時只檢查該市場，否則任一市場有資料即為存在)"""
+    if STORE_FORMAT == 'csv':
+        if market is None:
+            return _read_csv_day(date_str, usecols=['證券代號']) is not None
+        return os.path.exists(_csv_path(date_str, market))
+    return store.has_day(date_str, market=market)
@@ -0,0 +1,81 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .settings import DOWNLOAD_WORKERS
+from . import data_fetcher
+from . import markets as market_sources
+from . import trading_calendar
+from . import metrics
+
+log = logging.getLogger(__name__)
+
+def download_missing(dates, workers=None, limiter=None, progress=None, on_day=None, markets=None):
+    """
+    並行下載尚未存在的日期資料 (每個市場分別檢查，只下載缺少的市場)
+    每個市場有自己的限速器 (markets.MarketSource.limiter) 與自己的 worker，
+    不同市場的請求同時進行，互不佔用對方的頻率限制，加入上櫃市場不會增加總下載時間。
+    同一市場內多個 worker 只是讓等待網路回應的時間與限速器的間隔重疊，請求速率不會超過設定值。
+    資料寫入在呼叫端執行緒中依序進行 (資料庫的月份檔案不支援並行寫入)。
+    workers: 每個市場的 worker 數 (預設 DOWNLOAD_WORKERS)
+    limiter: 指定時所有市場共用此限速器 (預設各市場使用自己的限速器)
+    progress: callback(完成天數, 總天數)，每完成一天 (所有市場) 呼叫一次
+    on_day: callback(date_str, 是否取得資料)，在該日所有市場的資料寫入後呼叫 (可用於記錄進度)
+    markets: 下載的市場 (預設 settings.MARKETS)
+    每個市場同時送出的請求不超過 worker 數，中斷 (例如 Ctrl+C) 時不會再送出其餘日期的請求
+    回傳 {date_str: bool} 表示每個日期是否所有市場都取得資料
+    """
+    sources = market_sources.get_sources(markets)
+    # 已知休市日不再查詢
+    open_dates = [d for d in dates if not trading_calendar.is_closed(d)]
+    missing = {source.name: [d for d in open_dates if not data_fetcher.check_data_exists(d, source.name)]
+               for source in sources}
+    remaining = {}
+    for name, market_dates in missing.items():
+        for date_str in market_dates:
+            remaining[date_str] = remaining.get(date_str, 0) + 1
+    if not remaining:
+        return {}
+
+    workers = max(1, workers or DOWNLOAD_WORKERS)
+    total = len(remaining)
+    log.info(f"需下載 {total} 天資料 (" +
+             "、".join(f"{s.label} {len(missing[s.name])} 天" for s in sources if missing[s.name]) +
+             f"，每個市場 workers={workers})...",
+             extra={'event': 'download_start', 'days': total, 'workers': workers,
+                    'markets': {name: len(dates) for name, dates in missing.items() if dates}})
+
+    results = {}
+    finished = 0
+    queues = {source.name: iter(missing[source.name]) for source in sources}
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers * len(sources)) as pool:
+        def submit_next(source):
+            date_str = next(queues[source.name], None)
+            if date_str is not None:
+                pending[pool.submit(source.fetch, date_str, limiter)] = (date_str, source)
+
+        # 每個市場各自維持 workers 個進行中的請求
+        for source in sources:
+            for _ in range(workers):
+                submit_next(source)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                date_str, source = pending.pop(future)
+                df = future.result()
+                if df is not None:
+                    data_fetcher.save_daily_data(date_str, df, market=source.name)
+                    metrics.incr('days_fetched')
+                else:
+                    log.info(f"無法取得 {date_str} {source.label}資料 (可能為假日)",
+                             extra={'event': 'day_missing', 'date': date_str, 'market': source.name})
+                    metrics.incr('days_missing')
+                results[date_str] = results.get(date_str, True) and df is not None
+                remaining[date_str] -= 1
+                if not remaining[date_str]:
+                    finished += 1
+                    if on_day is not None:
+                        on_day(date_str, results[date_str])
+                    if progress is not None:
+                        progress(finished, total)
+                submit_next(source)
+    return results
@@ -0,0 +1,36 @@
+import pandas as pd
+from .settings import STAGE2_LOOKBACK_DAYS, STAGE2_BACKFILL
+from . import data_fetcher
+from . import downloader
+from . import trading_calendar
+
+# 本地歷史資料來源
+# Stage 2 的 MACD 只需要約 6 個月的 最高/最低/收盤價，直接由本地儲存的證交所每日資料組成，
+# 與 Stage 1 使用相同的價格，不需網路即可重複計算。
+
+HISTORY_COLUMNS = ['最高價', '最低價', '收盤價']
+
+def lookback_dates(end_date, days):
+    """end_date (含) 往前 days 個交易日 (排除週末與已知休市日)"""
+    return trading_calendar.get_trading_days(days, end_date=end_date)
+
+def local_histories(codes, end_date, lookback_days=None, backfill=None, markets=None):
+    """
+    由本地資料組成多檔股票的歷史資料
+    codes: 證券代號列表
+    end_date: 最後一天 (YYYYMMDD)
+    lookback_days: 回溯的平日數 (預設 STAGE2_LOOKBACK_DAYS)
+    backfill: 是否先下載缺少的日期 (預設 STAGE2_BACKFILL)
+    markets: 下載的市場 (預設 settings.MARKETS，見 downloader.download_missing)
+    回傳長格式 DataFrame: 證券代號, Date, 最高價, 最低價, 收盤價 (只含有成交的日期)
+    """
+    dates = lookback_dates(end_date, lookback_days or STAGE2_LOOKBACK_DAYS)
+    if STAGE2_BACKFILL if backfill is None else backfill:
+        downloader.download_missing(dates, markets=markets)
+
+    hist = data_fetcher.load_history(dates, columns=HISTORY_COLUMNS, codes=list(codes))
+    if hist is None:
+        return pd.DataFrame(columns=['證券代號', 'Date'] + HISTORY_COLUMNS)
+    # 停牌 (無成交) 的日期沒有價格，與 yfinance 相同不列入
+    hist = hist.dropna(subset=['收盤價'])
+    return hist[['證券代號', 'Date'] + HISTORY_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,127 @@
+import time
+import random
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from .settings import MAX_RETRIES, RETRY_DELAY, HTTP_TIMEOUT, HTTP_POOL_SIZE
+from . import metrics
+
+# 共用 HTTP 連線
+# 所有對外請求 (證交所、Telegram) 共用同一個 requests.Session：
+#   - keep-alive 連線池，長時間回補不會每次請求都重新建立 TLS 連線
+#   - 回應以 gzip 壓縮傳輸
+#   - 每個請求都有逾時 (HTTP_TIMEOUT)
+#   - 網路錯誤、5xx 與限流 (429 或證交所回傳非 JSON 的阻擋頁面) 以指數退避 + 隨機抖動重試 MAX_RETRIES 次
+# 「無資料」(證交所回應 stat 不是 OK) 是正常回應，不重試，由呼叫端判斷。
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+
+
+class ThrottledError(requests.RequestException):
+    """重試後仍被限流 (429 或證交所阻擋頁面)"""
+
+
+def get_session():
+    """取得共用的 Session (第一次呼叫時建立)"""
+    global _session
+    with _lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({'Accept-Encoding': 'gzip, deflate',
+                                    'User-Agent': 'Mozilla/5.0 (tw-stock-analyzer)'})
+            _session = session
+        return _session
+
+
+def backoff_delay(attempt, base=None):
+    """第 attempt 次重試 (從 1 開始) 前的等待秒數: base * 2^(attempt-1)，乘上 0.5~1.5 的隨機抖動"""
+    base = RETRY_DELAY if base is None else base
+    return base * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+
+
+def _retry_after(response):
+    """伺服器要求的等待秒數 (Retry-After 標頭或 Telegram 的 parameters.retry_after)"""
+    value = response.headers.get('Retry-After')
+    if value is None and 'json' in response.headers.get('Content-Type', ''):
+        try:
+            value = response.json().get('parameters', {}).get('retry_after')
+        except (ValueError, AttributeError):
+            value = None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def describe_error(error):
+    """
+    例外的簡短說明 (供日誌與通知佇列的錯誤欄位使用)
+    不輸出例外全文: 連線錯誤的訊息包含完整網址 (Telegram 網址內含 bot token)
+    """
+    if isinstance(error, (ThrottledError, requests.HTTPError)):
+        return str(error)
+    return type(error).__name__
+
+
+def request(method, url, retries=None, expect_json=False, limiter=None, **kwargs):
+    """
+    發送請求，遇到暫時性錯誤時重試
+    retries: 重試次數 (預設 MAX_RETRIES)
+    expect_json: 回應必須是 JSON，否則視為限流 (證交所限流時回傳 HTML 頁面) 並重試；
+                 解析結果存於 response.json_data (不重複解析)
+    limiter: 限速器，每次嘗試 (含重試) 前都取得權杖
+    回傳 requests.Response (4xx 等非暫時性錯誤不重試，由呼叫端以 response.ok 判斷)；
+    重試用盡時拋出最後一次的例外 (限流為 ThrottledError)
+    """
+    retries = MAX_RETRIES if retries is None else retries
+    kwargs.setdefault('timeout', HTTP_TIMEOUT)
+    session = get_session()
+    error = None
+    for attempt in range(retries + 1):
+        if attempt:
+            wait = backoff_delay(attempt)
+            if error is not None and getattr(error, 'retry_after', None):
+                wait = max(wait, error.retry_after)
+            log.warning(f"  {describe_error(error)}，{wait:.1f} 秒後重試 ({attempt}/{retries})",
+                        extra={'event': 'http_retry', 'error': describe_error(error), 'attempt': attempt, 'wait': wait})
+            metrics.incr('http_retries')
+            if isinstance(error, ThrottledError):
+                metrics.incr('http_throttled')
+            time.sleep(wait)
+        if limiter is not None:
+            limiter.acquire()
+        metrics.incr('http_requests')
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+            continue
+        if response.status_code in RETRY_STATUS:
+            error = (ThrottledError if response.status_code == 429 else requests.HTTPError)(
+                f"HTTP {response.status_code}", response=response)
+            error.retry_after = _retry_after(response)
+            continue
+        if expect_json and response.ok:
+            try:
+                response.json_data = response.json()
+            except ValueError:
+                error = ThrottledError("回應不是 JSON (可能被限流)", response=response)
+                continue
+        return response
+    raise error
+
+
+def get_json(url, retries=None, limiter=None, **kwargs):
+    """GET 並解析 JSON，回傳 (資料, Response)；HTTP 錯誤拋出 requests.HTTPError"""
+    response = request('GET', url, retries=retries, expect_json=True, limiter=limiter, **kwargs)
+    response.raise_for_status()
+    return response.json_data, response
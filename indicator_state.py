@@ -0,0 +1,264 @@
+import os
+import copy
+import logging
+import numpy as np
+import pandas as pd
+from .settings import STATE_PATH, MARKETS
+from . import data_fetcher
+from .panel import as_float64
+
+log = logging.getLogger(__name__)
+
+# 增量指標狀態
+# 每檔股票保存最後的 K, D, EMA12, EMA26, MACD 與滾動視窗所需的最近 N 筆資料，
+# 每日只需以當天資料推進一步，不必重新讀取 45 天歷史。
+# 滾動視窗與遞迴規則與 indicators 中的批次計算相同 (只使用各股有資料的日期)。
+
+INDICATOR_COLUMNS = ['MA15_Vol', 'Max15_High', 'K', 'D', 'DIF', 'MACD', 'OSC', 'OSC_Prev']
+
+# 最近一次讀取/寫入的狀態保留在記憶體中 (常駐模式每日不必重新讀取狀態檔)，狀態檔被改寫時重新讀取
+# key: 狀態檔路徑, value: (修改時間, IndicatorState)
+_cache = {}
+
+
+def _push(buf, idx, values):
+    """將新值推入各股的滾動視窗 (最舊的一筆移出)"""
+    rows = buf[idx]
+    rows[:, :-1] = rows[:, 1:]
+    rows[:, -1] = values
+    buf[idx] = rows
+
+
+def _ema_step(prev, value, window, n):
+    """
+    推進一步 SMA 起始的 EMA (與 indicators.calculate_custom_ema 規則相同):
+    前一日 EMA 為 NaN 時以當日 SMA(n) 起算，否則 前一日EMA + alpha * (當日值 - 前一日EMA)
+    """
+    sma = window.mean(axis=1) # 視窗內有 NaN 時為 NaN
+    return np.where(np.isnan(prev), sma, prev + (2 / (n + 1)) * (value - prev))
+
+
+class IndicatorState:
+    """全市場指標狀態 (每檔股票一列)"""
+
+    def __init__(self, ma_days=15, high_days=15, kd_period=9):
+        self.params = (ma_days, high_days, kd_period)
+        self.last_date = None
+        self.codes = np.array([], dtype=str)
+        self.last_seen = np.array([], dtype='<U8') # YYYYMMDD
+        self.arrays = {}
+        self._index = {}
+        self._resize(0)
+
+    @property
+    def _buffer_sizes(self):
+        ma_days, high_days, kd_period = self.params
+        return {'vol_buf': ma_days, 'high_buf': max(high_days, kd_period), 'low_buf': kd_period,
+                'di_buf': 26, 'dif_buf': 9}
+
+    def _resize(self, n):
+        """擴充陣列以容納 n 檔股票，新股票的視窗為 NaN、K/D 為 50"""
+        old = len(self.last_seen)
+        self.last_seen = np.concatenate([self.last_seen, np.full(n - old, '', dtype='<U8')])
+        for name, size in self._buffer_sizes.items():
+            pad = np.full((n - old, size), np.nan)
+            self.arrays[name] = np.vstack([self.arrays[name], pad]) if name in self.arrays else pad
+        for name in ['K', 'D']:
+            pad = np.full(n - old, 50.0)
+            self.arrays[name] = np.concatenate([self.arrays.get(name, np.empty(0)), pad])
+        for name in ['ema12', 'ema26', 'MACD', 'OSC', 'DIF', 'MA15_Vol', 'Max15_High', 'OSC_Prev']:
+            pad = np.full(n - old, np.nan)
+            self.arrays[name] = np.concatenate([self.arrays.get(name, np.empty(0)), pad])
+
+    def _positions(self, codes):
+        new = [c for c in dict.fromkeys(codes) if c not in self._index]
+        if new:
+            start = len(self.codes)
+            self.codes = np.concatenate([self.codes, np.asarray(new, dtype=str)])
+            self._index.update({c: start + i for i, c in enumerate(new)})
+            self._resize(len(self.codes))
+        return np.fromiter((self._index[c] for c in codes), dtype=np.int64, count=len(codes))
+
+    def advance(self, date_str, codes, high, low, close, volume):
+        """
+        以一個交易日的資料推進狀態
+        codes: 當日有資料的證券代號
+        high, low, close, volume: 對應的 1-D 陣列
+        """
+        if self.last_date is not None and date_str <= self.last_date:
+            raise ValueError(f"{date_str} 不晚於狀態日期 {self.last_date}")
+        ma_days, high_days, kd_period = self.params
+        a = self.arrays
+        idx = self._positions(list(codes))
+        high, low, close, volume = (as_float64(x) for x in (high, low, close, volume))
+
+        # 不含今日的 15 日均量與 15 日最高價 (需在推入今日資料前計算)
+        a['MA15_Vol'][idx] = a['vol_buf'][idx].mean(axis=1)
+        a['Max15_High'][idx] = a['high_buf'][idx, -high_days:].max(axis=1)
+        _push(a['vol_buf'], idx, volume)
+        _push(a['high_buf'], idx, high)
+        _push(a['low_buf'], idx, low)
+
+        # KD
+        rsv_max = a['high_buf'][idx, -kd_period:].max(axis=1)
+        rsv_min = a['low_buf'][idx].min(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = (close - rsv_min) / (rsv_max - rsv_min) * 100
+        rsv = np.where(np.isnan(rsv), 50, rsv)
+        a['K'][idx] = (1/3) * rsv + (2/3) * a['K'][idx]
+        a['D'][idx] = (1/3) * a['K'][idx] + (2/3) * a['D'][idx]
+
+        # MACD
+        di = (high + low + 2 * close) / 4
+        _push(a['di_buf'], idx, di)
+        a['ema12'][idx] = _ema_step(a['ema12'][idx], di, a['di_buf'][idx, -12:], 12)
+        a['ema26'][idx] = _ema_step(a['ema26'][idx], di, a['di_buf'][idx], 26)
+        dif = a['ema12'][idx] - a['ema26'][idx]
+        _push(a['dif_buf'], idx, dif)
+        a['MACD'][idx] = _ema_step(a['MACD'][idx], dif, a['dif_buf'][idx], 9)
+        a['DIF'][idx] = dif
+        a['OSC_Prev'][idx] = a['OSC'][idx]
+        a['OSC'][idx] = dif - a['MACD'][idx]
+
+        self.last_seen[idx] = date_str
+        self.last_date = date_str
+
+    def advance_frame(self, date_str, day_df):
+        """以單日 DataFrame (TWSE 欄位) 推進狀態"""
+        self.advance(date_str, day_df['證券代號'].astype(str).to_numpy(),
+                     day_df['最高價'], day_df['最低價'], day_df['收盤價'], day_df['成交股數'])
+
+    @classmethod
+    def from_panel(cls, panel, **params):
+        """由歷史 Panel 逐日推進建立狀態 (完整重算)"""
+        state = cls(**params)
+        high, low, close, volume = panel['high'], panel['low'], panel['close'], panel['volume']
+        for t, date_str in enumerate(panel.dates):
+            cols = panel.mask[t]
+            state.advance(date_str, panel.codes[cols], high[t, cols], low[t, cols],
+                          close[t, cols], volume[t, cols])
+        return state
+
+    def latest_frame(self):
+        """
+        狀態日期當天有資料的股票及其指標 (一檔一列)
+        當天沒有資料列的股票 (下市、暫停交易) 不列入，與 Panel.latest_frame(last_day_only=True) 相同
+        """
+        sel = self.last_seen == self.last_date
+        data = {'證券代號': self.codes[sel]}
+        for name in INDICATOR_COLUMNS:
+            data[name] = self.arrays[name][sel]
+        return pd.DataFrame(data)
+
+    def save(self, path=None):
+        path = path or STATE_PATH
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, codes=self.codes, last_seen=self.last_seen,
+                            last_date=np.array(self.last_date or ''), params=np.array(self.params),
+                            **self.arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=None, **params):
+        """讀取狀態檔，不存在或參數不同時回傳 None"""
+        path = path or STATE_PATH
+        if not os.path.exists(path):
+            return None
+        state = cls(**params)
+        with np.load(path, allow_pickle=False) as data:
+            if tuple(data['params']) != state.params:
+                return None
+            state.codes = data['codes']
+            state.last_seen = data['last_seen']
+            state.last_date = str(data['last_date']) or None
+            state.arrays = {name: data[name] for name in data.files
+                            if name not in ('codes', 'last_seen', 'last_date', 'params')}
+        state._index = {c: i for i, c in enumerate(state.codes)}
+        return state
+
+
+def get_state(path=None):
+    """讀取狀態 (狀態檔未改變時使用記憶體中的狀態)，不存在或參數不同時回傳 None"""
+    path = path or STATE_PATH
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    if path in _cache and _cache[path][0] == mtime:
+        return _cache[path][1]
+    state = IndicatorState.load(path)
+    if state is not None:
+        _cache[path] = (mtime, state)
+    return state
+
+
+def _save_state(state, path=None):
+    path = path or STATE_PATH
+    state.save(path)
+    _cache[path] = (os.stat(path).st_mtime_ns, state)
+
+
+def update_daily(target_days, columns=None, path=None, markets=None):
+    """
+    每日增量更新指標狀態，回傳最新交易日的資料與指標 (一檔一列)
+    狀態存在且日期仍在 target_days 內時，只以新的交易日推進 (通常只有今天)；
+    狀態不存在或過期時，以 target_days 的歷史資料完整重算。
+    markets: 每個交易日應有資料的市場 (預設 settings.MARKETS)
+    狀態只保存到所有市場都有資料的日期: 部分市場尚未取得 (例如櫃買中心較晚公布或下載失敗) 的日期
+    只在記憶體中的複本上推進，待該市場的資料寫入後再正式推進，否則晚到的資料不會再被讀取。
+    之後的交易日已有所有市場的資料時，仍缺少的市場視為當天休市 (不再等待)，狀態照常推進。
+    """
+    markets = markets or MARKETS
+    available = [d for d in target_days if data_fetcher.check_data_exists(d)]
+    if not available:
+        return None
+    latest = available[-1]
+    complete = [d for d in available if all(data_fetcher.check_data_exists(d, m) for m in markets)]
+    # 早於最新完整日期的缺漏: 該市場當天休市或已無法取得
+    closed = [d for d in available if d not in complete and complete and d < complete[-1]]
+    incomplete = [d for d in available if d not in complete and d not in closed]
+    # 可保存的日期: 第一個仍在等待市場資料的日期之前
+    settled = [d for d in available if not incomplete or d < incomplete[0]]
+
+    state = get_state(path)
+    if state is not None and (state.last_date not in available or
+                              not settled or state.last_date > settled[-1]):
+        # 過期，或先前推進時有市場尚無資料
+        state = None
+    previous = state.last_date if state is not None else None
+    skipped = [d for d in closed if previous is None or d > previous]
+    if skipped:
+        log.warning(f"{'、'.join(skipped)} 部分市場無資料，視為該市場休市",
+                    extra={'event': 'state_market_closed', 'dates': skipped})
+    if state is None:
+        log.info("指標狀態不存在或已過期，以歷史資料完整重算...", extra={'event': 'state_rebuild', 'days': len(settled)})
+        state = IndicatorState()
+        if settled:
+            panel = data_fetcher.load_panel(settled, columns=['最高價', '最低價', '收盤價', '成交股數'])
+            state = IndicatorState.from_panel(panel)
+            _save_state(state, path)
+    else:
+        new_days = [d for d in settled if d > state.last_date]
+        log.info(f"以 {len(new_days)} 個新交易日推進指標狀態 (狀態日期 {state.last_date})",
+                 extra={'event': 'state_advance', 'days': len(new_days), 'state_date': state.last_date})
+        for date_str in new_days:
+            state.advance_frame(date_str, data_fetcher.load_daily_data(date_str))
+        if new_days:
+            _save_state(state, path)
+
+    pending = [d for d in available if state.last_date is None or d > state.last_date]
+    if pending:
+        log.warning(f"{'、'.join(incomplete)} 尚缺部分市場資料，指標狀態暫不保存這些日期",
+                    extra={'event': 'state_partial', 'dates': pending})
+        state = copy.deepcopy(state)
+        for date_str in pending:
+            state.advance_frame(date_str, data_fetcher.load_daily_data(date_str))
+
+    day_df = data_fetcher.load_daily_data(latest)
+    if columns is not None:
+        day_df = day_df[[c for c in columns if c in day_df.columns]]
+    # 精簡載入的價格為 float32: 還原為原始的 float64 (初篩結果直接寫入報表，與 Panel.latest_frame 相同)
+    day_df = day_df.assign(**{c: as_float64(day_df[c]) for c in day_df.columns if day_df[c].dtype == np.float32})
+    result = day_df.merge(state.latest_frame(), on='證券代號', how='inner')
+    result['Date'] = latest
+    return result
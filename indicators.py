@@ -1,5 +1,7 @@
 import pandas as pd
 import numpy as np
+from .panel import as_float64
+from . import sharding
 
 def calculate_ma_volume(df, days=15):
     """
@@ -32,12 +34,8 @@ def calculate_ma_volume(df, days=15):
     
     return ma
 
-def calculate_kd(df, period=9):
-    """
-    計算 KD 值
-    df: 必須包含 '收盤價', '最高價', '最低價'
-    period: 週期 (預設 9)
-    """
+def _price_columns(df):
+    """取得 收盤價, 最高價, 最低價 的欄位名稱 (支援 TWSE 與 yfinance 欄位)"""
     # 欄位對應
     close_col = '收盤價'
     high_col = '最高價'
@@ -56,6 +54,16 @@ def calculate_kd(df, period=9):
     if 'High' in df.columns: high_col = 'High'
     if 'Low' in df.columns: low_col = 'Low'
     
+    return close_col, high_col, low_col
+
+def calculate_kd(df, period=9):
+    """
+    計算 KD 值
+    df: 必須包含 '收盤價', '最高價', '最低價'
+    period: 週期 (預設 9)
+    """
+    close_col, high_col, low_col = _price_columns(df)
+    
     # 計算 RSV
     # RSV = (今日收盤 - 最近9天最低) / (最近9天最高 - 最近9天最低) * 100
     
@@ -93,6 +101,212 @@ def calculate_kd(df, period=9):
     
     return df
 
+# ---------------------------------------------------------------------------
+# 全市場批次計算
+# 長格式資料 (每列為 一檔股票 x 一天) 依 (代號, 日期) 排成 2-D 陣列:
+# 每一欄為一檔股票，自第 0 列起為該股依日期排序的資料 (與逐檔 sort_values('Date') 的序列相同)，
+# 資料較短的股票在尾端補 NaN。所有股票同時以陣列運算處理，
+# 只有遞迴公式 (K, D) 需要沿時間軸逐列計算。
+# ---------------------------------------------------------------------------
+
+def _series_layout(df, code_col='證券代號', date_col='Date'):
+    """建立長格式 -> 2-D (天數 x 股票數) 的索引對應"""
+    stock_idx, _ = pd.factorize(df[code_col])
+    date_idx, _ = pd.factorize(df[date_col], sort=True)
+    order = np.lexsort((date_idx, stock_idx))
+    cols = stock_idx[order]
+    counts = np.bincount(cols)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rows = np.arange(len(order)) - starts[cols]
+    shape = (int(counts.max()) if len(counts) else 0, len(counts))
+    return {'order': order, 'rows': rows, 'cols': cols, 'shape': shape}
+
+def _to_2d(values, layout):
+    arr = np.full(layout['shape'], np.nan)
+    arr[layout['rows'], layout['cols']] = as_float64(values)[layout['order']]
+    return arr
+
+def _from_2d(arr, layout):
+    out = np.empty(len(layout['order']))
+    out[layout['order']] = arr[layout['rows'], layout['cols']]
+    return out
+
+def _rolling_2d(arr, window, how):
+    """
+    沿時間軸 (axis 0) 的滾動計算，視窗內需有完整 window 筆有效值 (與 pandas rolling 預設相同)
+    how: 'min', 'max' 或 'mean'
+    """
+    if how == 'mean':
+        # 使用 pandas 的滾動平均以確保與逐檔計算的結果完全一致
+        return pd.DataFrame(arr).rolling(window=window).mean().to_numpy()
+    out = np.full(arr.shape, np.nan)
+    if arr.shape[0] >= window:
+        view = np.lib.stride_tricks.sliding_window_view(arr, window, axis=0)
+        func = np.min if how == 'min' else np.max
+        out[window - 1:] = func(view, axis=-1) # 視窗內有 NaN 時結果為 NaN
+    return out
+
+def _shift_2d(arr, periods=1):
+    out = np.full(arr.shape, np.nan)
+    if periods < arr.shape[0]:
+        out[periods:] = arr[:-periods]
+    return out
+
+def kd_arrays(high, low, close, period=9):
+    """
+    以 2-D 陣列 (天數 x 股票數) 計算 KD，結果與 calculate_kd 逐檔計算完全相同
+    回傳 (K, D)
+    """
+    rsv_min = _rolling_2d(low, period, 'min')
+    rsv_max = _rolling_2d(high, period, 'max')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = (close - rsv_min) / (rsv_max - rsv_min) * 100
+    rsv = np.where(np.isnan(rsv), 50, rsv) # 無法計算時補 50
+
+    k_values = np.empty(rsv.shape)
+    d_values = np.empty(rsv.shape)
+    k = np.full(rsv.shape[1], 50.0)
+    d = np.full(rsv.shape[1], 50.0)
+    for i in range(rsv.shape[0]):
+        r = rsv[i]
+        valid = ~np.isnan(r)
+        k = np.where(valid, (1/3) * r + (2/3) * k, k)
+        d = np.where(valid, (1/3) * k + (2/3) * d, d)
+        k_values[i] = k
+        d_values[i] = d
+    return k_values, d_values
+
+def calculate_kd_batch(df, period=9, code_col='證券代號', date_col='Date'):
+    """
+    全市場批次計算 KD
+    df: 長格式 DataFrame (多檔股票、多天)，需包含代號、日期與 收盤價/最高價/最低價
+    結果寫入 df['K'], df['D']，數值與逐檔呼叫 calculate_kd 相同
+    """
+    close_col, high_col, low_col = _price_columns(df)
+    layout = _series_layout(df, code_col, date_col)
+    k, d = kd_arrays(_to_2d(df[high_col], layout), _to_2d(df[low_col], layout),
+                     _to_2d(df[close_col], layout), period)
+    df['K'] = _from_2d(k, layout)
+    df['D'] = _from_2d(d, layout)
+    return df
+
+def _screen_arrays(high, low, close, volume, ma_days, high_days, kd_period):
+    """初篩指標的陣列計算 (輸入為觀測值對齊的 2-D 陣列)"""
+    out = {}
+    if volume is not None:
+        out['MA15_Vol'] = _shift_2d(_rolling_2d(volume, ma_days, 'mean'))
+    out['Max15_High'] = _shift_2d(_rolling_2d(high, high_days, 'max'))
+    out['K'], out['D'] = kd_arrays(high, low, close, kd_period)
+    return out
+
+def calculate_screen_indicators(df, ma_days=15, high_days=15, kd_period=9,
+                                code_col='證券代號', date_col='Date'):
+    """
+    全市場批次計算初篩所需指標 (取代逐檔 groupby.apply)
+    MA15_Vol: 不含今日的 15 日平均成交量
+    Max15_High: 不含今日的 15 日最高價
+    K, D: KD(9)
+    """
+    close_col, high_col, low_col = _price_columns(df)
+    vol_col = next((c for c in ['成交股數', 'Volume', '成交量'] if c in df.columns), None)
+    layout = _series_layout(df, code_col, date_col)
+
+    out = _screen_arrays(_to_2d(df[high_col], layout), _to_2d(df[low_col], layout),
+                         _to_2d(df[close_col], layout),
+                         _to_2d(df[vol_col], layout) if vol_col else None,
+                         ma_days, high_days, kd_period)
+    for name, arr in out.items():
+        df[name] = _from_2d(arr, layout)
+    return df
+
+def calculate_panel_indicators(panel, ma_days=15, high_days=15, kd_period=9, workers=None):
+    """
+    在 Panel (日期 x 股票) 上計算初篩指標，結果寫回 panel:
+    MA15_Vol, Max15_High, K, D
+    計算時只使用各股有資料的日期 (與逐檔計算相同)，沒有資料的日期為 NaN
+    workers: 依股票分段以多個 process 計算 (預設 settings.INDICATOR_WORKERS，結果與單一 process 相同)
+    """
+    volume = panel.compact(panel['volume']) if 'volume' in panel else None
+    outputs = (['MA15_Vol'] if volume is not None else []) + ['Max15_High', 'K', 'D']
+    out = sharding.run_sharded(
+        _screen_arrays, {'high': panel.compact(panel['high']), 'low': panel.compact(panel['low']),
+                         'close': panel.compact(panel['close']), 'volume': volume},
+        outputs, workers, ma_days=ma_days, high_days=high_days, kd_period=kd_period)
+    for name, arr in out.items():
+        panel[name] = panel.expand(arr)
+    return panel
+
+def ema_2d(values, n):
+    """
+    以 2-D 陣列 (天數 x 股票數) 計算 SMA 起始的 EMA，規則與 calculate_custom_ema 相同:
+    第 n 天 (index n-1) = SMA(n)，之後 = 前一日 EMA + (2/(n+1)) * (當日數值 - 前一日 EMA)
+    前一日 EMA 為 NaN 時改用當日 SMA 重新起算，因此每一欄會從自己的第一個有效 SMA 開始
+    (例如 DIF 前段為 NaN 時的 MACD)
+    """
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        return ema_2d(values[:, None], n)[:, 0]
+
+    ema_values = np.full(values.shape, np.nan)
+    if values.shape[0] < n:
+        return ema_values
+
+    sma_values = _rolling_2d(values, n, 'mean')
+    alpha = 2 / (n + 1)
+    ema_values[n-1] = sma_values[n-1]
+    for i in range(n, values.shape[0]):
+        prev = ema_values[i-1]
+        ema_values[i] = np.where(np.isnan(prev), sma_values[i], prev + alpha * (values[i] - prev))
+    return ema_values
+
+def macd_arrays(high, low, close):
+    """
+    以 2-D 陣列計算 MACD，結果與 calculate_macd 逐檔計算相同
+    回傳 (DIF, MACD, OSC)
+    """
+    di = (high + low + 2 * close) / 4
+    dif = ema_2d(di, 12) - ema_2d(di, 26)
+    macd = ema_2d(dif, 9)
+    return dif, macd, dif - macd
+
+def calculate_macd_batch(df, code_col='證券代號', date_col='Date'):
+    """
+    全市場批次計算 MACD
+    df: 長格式 DataFrame (多檔股票、多天)，需包含代號、日期與 收盤價/最高價/最低價 (或 Close/High/Low)
+    結果寫入 df['DIF'], df['MACD'], df['OSC']，數值與逐檔呼叫 calculate_macd 相同
+    """
+    close_col, high_col, low_col = _price_columns(df)
+    layout = _series_layout(df, code_col, date_col)
+    dif, macd, osc = macd_arrays(_to_2d(df[high_col], layout), _to_2d(df[low_col], layout),
+                                 _to_2d(df[close_col], layout))
+    df['DIF'] = _from_2d(dif, layout)
+    df['MACD'] = _from_2d(macd, layout)
+    df['OSC'] = _from_2d(osc, layout)
+    return df
+
+def _panel_macd_arrays(high, low, close):
+    dif, macd, osc = macd_arrays(high, low, close)
+    return {'DIF': dif, 'MACD': macd, 'OSC': osc, 'OSC_Prev': _shift_2d(osc)}
+
+def calculate_panel_macd(panel, workers=None):
+    """
+    在 Panel 上計算 MACD，結果寫回 panel: DIF, MACD, OSC
+    OSC_Prev: 該股前一個有資料日期的 OSC
+    workers: 依股票分段以多個 process 計算 (預設 settings.INDICATOR_WORKERS)
+    """
+    out = sharding.run_sharded(
+        _panel_macd_arrays, {'high': panel.compact(panel['high']), 'low': panel.compact(panel['low']),
+                             'close': panel.compact(panel['close'])},
+        ['DIF', 'MACD', 'OSC', 'OSC_Prev'], workers)
+    for name, arr in out.items():
+        panel[name] = panel.expand(arr)
+    return panel
+
+def latest_rows(df, code_col='證券代號', date_col='Date'):
+    """取得每檔股票最後一天的資料 (依代號排序)"""
+    latest = df.sort_values([code_col, date_col], kind='stable').groupby(code_col, sort=False).tail(1)
+    return latest.reset_index(drop=True)
+
 def calculate_custom_ema(series, n):
     """
     計算自定義 EMA:
@@ -0,0 +1,180 @@
+import logging
+import numpy as np
+import pandas as pd
+from .settings import MARKETS, TPEX_URL, TPEX_REQUESTS_PER_SECOND, TPEX_BURST, ARCHIVE_RAW
+from .rate_limiter import TokenBucket
+from . import data_fetcher
+from . import archive
+from . import http_client
+
+# 市場資料來源
+# 每個市場 (上市 TWSE、上櫃 TPEX) 一個 MarketSource：
+#   - 各自的端點與限速器 (證交所與櫃買中心的頻率限制互相獨立，兩個市場的請求可同時進行)
+#   - 各自的原始格式，解析後統一為 data_fetcher.QUOTE_SCHEMA 的欄位與型態，
+#     寫入同一個資料庫，以「市場」欄位 (store.MARKET_COL) 區分
+# 休市日只由證交所的回應判斷並記錄 (兩個市場的交易日相同)。
+
+log = logging.getLogger(__name__)
+
+# 所有對櫃買中心的請求共用同一個限速器 (與 TWSE_LIMITER 分開)
+TPEX_LIMITER = TokenBucket(TPEX_REQUESTS_PER_SECOND, TPEX_BURST)
+
+# 櫃買中心「上櫃股票行情」欄位 -> QUOTE_SCHEMA 欄位
+# 欄位名稱比對前去除空白，其他欄位 (均價、發行股數、次日參考價...) 不使用
+# 漲跌為帶正負號的價差，拆為 漲跌(+/-) 與 漲跌價差；上櫃行情沒有本益比 (缺值)
+# 最後買/賣量的單位為千股，與證交所的最後揭示買/賣量 (張) 相同
+TPEX_FIELDS = {
+    '代號': '證券代號',
+    '名稱': '證券名稱',
+    '收盤': '收盤價',
+    '漲跌': '漲跌價差',
+    '開盤': '開盤價',
+    '最高': '最高價',
+    '最低': '最低價',
+    '成交股數': '成交股數',
+    '成交金額(元)': '成交金額',
+    '成交筆數': '成交筆數',
+    '最後買價': '最後揭示買價',
+    '最後買量(千股)': '最後揭示買量',
+    '最後賣價': '最後揭示賣價',
+    '最後賣量(千股)': '最後揭示賣量',
+}
+
+
+class MarketSource:
+    """
+    單一市場的每日收盤行情來源
+    name: 市場代碼 (寫入資料庫的市場欄位)
+    fetch(date_str, limiter): 下載並解析，無資料或失敗時回傳 None
+    parse(data): 由已解析的原始 JSON 取出行情 (封存重建使用)，找不到表格時回傳 None
+    limiter: 該市場專用的限速器
+    """
+    def __init__(self, name, label, fetch, parse, limiter):
+        self.name = name
+        self.label = label
+        self._fetch = fetch
+        self.parse = parse
+        self.limiter = limiter
+
+    def fetch(self, date_str, limiter=None):
+        return self._fetch(date_str, limiter or self.limiter)
+
+    def __repr__(self):
+        return f"MarketSource({self.name})"
+
+
+def _fetch_twse(date_str, limiter):
+    # 執行時才取得函式 (測試會替換 data_fetcher.fetch_daily_quotes)
+    return data_fetcher.fetch_daily_quotes(date_str, limiter)
+
+
+def _parse_twse(data):
+    table = data_fetcher.find_quotes_table(data)
+    if table is None:
+        return None
+    return data_fetcher.parse_quotes(table['fields'], table['data'])
+
+
+def find_tpex_table(data):
+    """由櫃買中心回應 (已解析的 JSON) 取出上櫃股票行情表格 (含 fields, data)，找不到時回傳 None"""
+    for table in data.get('tables', []):
+        fields = [f.strip() for f in table.get('fields', [])]
+        if '代號' in fields and '收盤' in fields:
+            return table
+    return None
+
+
+def _parse_change(values):
+    """漲跌 ('+0.50'、'-1.20'、'0.00'、'---'、'除息' 等) -> (漲跌符號, 漲跌價差絕對值)"""
+    values = [v.replace(',', '').strip() for v in values]
+    sign = np.array([1 if v[:1] == '+' and v[1:2].isdigit() else -1 if v[:1] == '-' and v[1:2].isdigit() else 0
+                     for v in values], dtype=np.int8)
+    change = pd.to_numeric(pd.Series([v.lstrip('+-') for v in values], dtype=object), errors='coerce')
+    return sign, change.abs().to_numpy(dtype=np.float64)
+
+
+def _empty_column(kind, n):
+    """無資料的欄位: 文字為空字串、浮點數為缺值、整數與符號為 0 (與 QUOTE_SCHEMA 的缺值規則相同)"""
+    if kind == 'text':
+        return [''] * n
+    if kind == 'float':
+        return np.full(n, np.nan)
+    return np.zeros(n, dtype=np.int8 if kind == 'sign' else np.int64)
+
+
+def parse_tpex_quotes(fields, rows):
+    """
+    將櫃買中心原始表格 (fields + data 的字串列) 轉為與 QUOTE_SCHEMA 相同欄位、型態的 DataFrame
+    缺少 TPEX_FIELDS 中的欄位或數值無法解析時拋出 ValueError
+    """
+    fields = [f.strip() for f in fields]
+    missing = [f for f in TPEX_FIELDS if f not in fields]
+    if missing:
+        raise ValueError(f"上櫃股票行情欄位與 schema 不符: 缺少 {missing}")
+    width = len(fields)
+    if rows and set(map(len, rows)) != {width}:
+        raise ValueError(f"上櫃股票行情資料列欄位數與 fields ({width}) 不符")
+    raw = dict(zip(fields, zip(*rows))) if rows else {f: () for f in fields}
+
+    columns = {}
+    for source, field in TPEX_FIELDS.items():
+        if field == '漲跌價差':
+            columns['漲跌(+/-)'], columns[field] = _parse_change(raw[source])
+        else:
+            columns[field] = data_fetcher._convert_column(field, list(raw[source]))
+    # 上櫃行情沒有的欄位 (本益比等) 補上缺值，欄位順序與證交所相同
+    return pd.DataFrame({field: columns[field] if field in columns else _empty_column(kind, len(rows))
+                         for field, kind in data_fetcher.QUOTE_SCHEMA.items()})
+
+
+def _parse_tpex(data):
+    table = find_tpex_table(data)
+    if table is None:
+        return None
+    return parse_tpex_quotes(table['fields'], table['data'])
+
+
+def fetch_tpex_quotes(date_str, limiter=None):
+    """
+    從櫃買中心抓取上櫃股票每日收盤行情
+    date_str: YYYYMMDD
+    limiter: 限速器 (預設為共用的 TPEX_LIMITER)
+    無資料 (休市或尚未公布) 或重試用盡時回傳 None；格式與 TPEX_FIELDS 不符時拋出 ValueError
+    """
+    url = f"{TPEX_URL}?date={date_str[:4]}/{date_str[4:6]}/{date_str[6:]}&response=json"
+    log.info(f"正在抓取 {date_str} 的上櫃資料...", extra={'event': 'fetch', 'date': date_str, 'market': 'TPEX'})
+
+    try:
+        data, response = http_client.get_json(url, limiter=limiter or TPEX_LIMITER)
+    except Exception as e:
+        log.error(f"抓取上櫃資料失敗: {http_client.describe_error(e)}",
+                  extra={'event': 'fetch_failed', 'date': date_str, 'market': 'TPEX',
+                         'error': http_client.describe_error(e)})
+        return None
+
+    table = find_tpex_table(data)
+    if table is None or not table.get('data'):
+        log.info(f"{date_str} 無上櫃資料或休市", extra={'event': 'no_data', 'date': date_str, 'market': 'TPEX'})
+        return None
+
+    if ARCHIVE_RAW:
+        archive.save(date_str, response.content, market='TPEX')
+    return parse_tpex_quotes(table['fields'], table['data'])
+
+
+SOURCES = {
+    'TWSE': MarketSource('TWSE', '上市', _fetch_twse, _parse_twse, data_fetcher.TWSE_LIMITER),
+    'TPEX': MarketSource('TPEX', '上櫃', fetch_tpex_quotes, _parse_tpex, TPEX_LIMITER),
+}
+
+
+def get_sources(markets=None):
+    """
+    取得市場資料來源列表
+    markets: 市場代碼列表 (預設 settings.MARKETS)，不支援的市場拋出 ValueError
+    """
+    names = MARKETS if markets is None else markets
+    unknown = [m for m in names if m not in SOURCES]
+    if unknown:
+        raise ValueError(f"不支援的市場: {unknown} (可用: {sorted(SOURCES)})")
+    return [SOURCES[m] for m in names]
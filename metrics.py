@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from .settings import METRICS_DIR, LOG_LEVEL
+
+# 執行紀錄 (每次執行一份 JSON)
+#   stages: 各階段 wall/CPU 時間與該階段的記憶體峰值 (RSS)
+#   counters: 下載天數、載入筆數、初篩/複篩通過數、HTTP 重試次數等，由各模組以 metrics.incr() 累計
+# 以及結構化日誌: 逐日/逐批的訊息以 logging 輸出，extra 欄位在 JSON 日誌中成為獨立欄位。
+
+MEMORY_SAMPLE_INTERVAL = 0.05 # 秒
+
+# LogRecord 內建屬性 (其餘屬性為 extra 欄位)
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def rss():
+    """目前行程的常駐記憶體 (bytes)，無法取得時回傳 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def max_rss():
+    """行程啟動以來的記憶體峰值 (bytes)，無法取得時回傳 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _mb(value):
+    return round(value / 2**20, 1) if value is not None else None
+
+
+class _PeakSampler:
+    """
+    在背景執行緒定期取樣 RSS，記錄期間的最大值
+    取樣間隔內的短暫峰值可能漏失；若期間創下行程的新峰值 (max_rss 增加)，以該值為準
+    """
+    def __init__(self):
+        self.peak = rss()
+        self._start_max = max_rss()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if self.peak is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+            self.peak = max(self.peak, rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.peak = max(self.peak, rss())
+        end_max = max_rss()
+        if self.peak is not None and end_max is not None and end_max > self._start_max:
+            self.peak = max(self.peak, end_max)
+
+
+class RunMetrics:
+    """一次執行的計時、記憶體與計數 (thread-safe)"""
+    def __init__(self, name="run"):
+        self.name = name
+        self.started = datetime.now()
+        self.stages = {}
+        self.counters = {}
+        self.info = {}
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._lock = threading.Lock()
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        with self._lock:
+            self.counters[name] = value
+
+    @contextmanager
+    def stage(self, name):
+        """
+        記錄階段的 wall/CPU 時間與記憶體峰值
+        with metrics.stage('load') as stage: ...  (結束後 stage 內含 wall, cpu, peak_rss_mb)
+        """
+        stage = {}
+        start_rss = rss()
+        wall, cpu = time.perf_counter(), time.process_time()
+        sampler = _PeakSampler()
+        try:
+            with sampler:
+                yield stage
+        finally:
+            # 階段失敗時同樣記錄
+            stage['wall'] = round(time.perf_counter() - wall, 4)
+            stage['cpu'] = round(time.process_time() - cpu, 4)
+            stage['peak_rss_mb'] = _mb(sampler.peak)
+            end_rss = rss()
+            if start_rss is not None and end_rss is not None:
+                stage['rss_delta_mb'] = _mb(end_rss - start_rss)
+            with self._lock:
+                self.stages[name] = stage
+
+    def to_dict(self):
+        with self._lock:
+            peaks = [s['peak_rss_mb'] for s in self.stages.values() if s.get('peak_rss_mb') is not None]
+            return {
+                'name': self.name,
+                'started': self.started.isoformat(timespec='seconds'),
+                'wall': round(time.perf_counter() - self._wall, 4),
+                'cpu': round(time.process_time() - self._cpu, 4),
+                'peak_rss_mb': max(peaks) if peaks else _mb(rss()),
+                'stages': dict(self.stages),
+                'counters': dict(sorted(self.counters.items())),
+                **self.info,
+            }
+
+    def path(self, directory=None, suffix=".json"):
+        stamp = self.started.strftime("%Y%m%d-%H%M%S")
+        return os.path.join(directory or METRICS_DIR, f"{self.name}-{stamp}{suffix}")
+
+    def write(self, path=None):
+        """寫入 JSON，回傳檔案路徑"""
+        path = path or self.path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        return path
+
+
+# 目前的執行 (各模組的計數累計於此，start_run() 開始新的一份)
+_current = RunMetrics()
+
+
+def start_run(name="run"):
+    global _current
+    _current = RunMetrics(name)
+    return _current
+
+
+def current():
+    return _current
+
+
+def incr(name, n=1):
+    _current.incr(name, n)
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆日誌一行 JSON (時間、等級、模組、訊息與 extra 欄位)"""
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level=None, json_path=None):
+    """
+    設定 tw_stock_analyzer 的日誌: 訊息輸出至主控台，json_path 指定時另外寫入 JSON lines
+    level: 預設 settings.LOG_LEVEL
+    各程式入口 (main、cli、streamlit_app 及各模組的 __main__) 開始時呼叫，否則 INFO 訊息不會顯示；
+    重複呼叫時會取代先前的設定
+    """
+    logger = logging.getLogger('tw_stock_analyzer')
+    logger.setLevel(level or LOG_LEVEL)
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(console)
+    if json_path:
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        handler = logging.FileHandler(json_path, encoding='utf-8')
+        handler.setFormatter(JsonFormatter())
+        logger.addHandler(handler)
+    return logger
@@ -1,45 +1,50 @@
-import requests
-import os
-from .settings import TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID
+from . import settings
+from . import http_client
+from . import outbox
 
-def send_telegram_report(file_path, message=""):
+# Telegram 通知
+# send_telegram_report / send_message 只將通知加入佇列 (outbox.py) 後立即返回，
+# 實際送出由 outbox 的背景 worker (或 python -m tw_stock_analyzer.outbox --drain) 負責，
+# 網路中斷時通知保留在佇列中稍後重試。
+# 設定於執行時讀取 (測試可改為本機的替代伺服器)
+
+def configured():
+    return bool(settings.TELEGRAM_BOT_TOKEN and settings.TELEGRAM_CHAT_ID)
+
+def api_url(method):
+    return f"{settings.TELEGRAM_API_URL}/bot{settings.TELEGRAM_BOT_TOKEN}/{method}"
+
+def post(method, data, files=None, timeout=30):
+    """
+    呼叫 Telegram Bot API (只送出一次，重試由 outbox 依佇列狀態處理)
+    回傳 requests.Response；網路錯誤、5xx 與限流 (429) 拋出 requests.RequestException
     """
-    發送 Telegram 訊息與檔案
+    return http_client.request('POST', api_url(method), retries=0, data=data, files=files, timeout=timeout)
+
+def send_telegram_report(file_path, message="", chat_id=None):
+    """
+    將檔案與說明加入通知佇列
+    回傳是否已加入佇列
     """
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+    if not configured():
         print("Telegram 設定缺失，無法發送通知")
         return False
-        
-    api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendDocument"
-    
+
     try:
-        with open(file_path, 'rb') as f:
-            files = {'document': f}
-            data = {'chat_id': TELEGRAM_CHAT_ID, 'caption': message}
-            
-            response = requests.post(api_url, files=files, data=data, timeout=30)
-            
-            if response.ok:
-                print("Telegram 通知發送成功")
-                return True
-            else:
-                print(f"Telegram 發送失敗: {response.text}")
-                return False
-                
+        count = outbox.enqueue_document(file_path, chat_id or settings.TELEGRAM_CHAT_ID, message)
+        print(f"Telegram 通知已加入佇列 ({count} 則)")
+        return True
     except Exception as e:
-        print(f"Telegram 發送錯誤: {e}")
+        print(f"Telegram 通知加入佇列失敗: {e}")
         return False
 
-def send_message(message):
-    """僅發送文字訊息"""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+def send_message(message, chat_id=None):
+    """將文字訊息加入通知佇列，回傳是否已加入佇列"""
+    if not configured():
         return False
-        
-    api_url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    
+
     try:
-        data = {'chat_id': TELEGRAM_CHAT_ID, 'text': message}
-        response = requests.post(api_url, data=data, timeout=10)
-        return response.ok
+        outbox.enqueue_message(message, chat_id or settings.TELEGRAM_CHAT_ID)
+        return True
     except Exception:
         return False
@@ -0,0 +1,326 @@
+import os
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+from contextlib import contextmanager
+from .settings import (OUTBOX_PATH, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_DELAY, OUTBOX_POLL_INTERVAL,
+                       TELEGRAM_MESSAGES_PER_SECOND)
+from .rate_limiter import TokenBucket
+from . import http_client
+from . import notifier
+from . import metrics
+
+# 通知佇列 (outbox)
+# 通知先寫入 SQLite 佇列 (OUTBOX_PATH)，由背景 worker 送出，分析流程不必等待 Telegram 回應；
+# 佇列保存在磁碟上，網路中斷或程式結束時未送出的通知會在下次執行 (或常駐的 worker) 時繼續送出。
+#   - 失敗 (網路錯誤、5xx) 以指數退避 + 隨機抖動重試，最多 OUTBOX_MAX_ATTEMPTS 次；限流 (429) 依伺服器要求的秒數等待
+#   - 4xx (token 錯誤、chat 不存在等) 不會因重試而成功，直接標記為失敗
+#   - 每個 chat 依序送出 (前一則尚未送出時，後面的訊息不會先送) 並各自限速 (TELEGRAM_MESSAGES_PER_SECOND)
+#   - 同一個 chat 連續的文字訊息合併為一則送出 (不超過 MAX_MESSAGE_CHARS)
+#   - 超過長度限制的文字、caption 與檔案在加入佇列時拆成多則
+#
+#   python -m tw_stock_analyzer.outbox --status
+#   python -m tw_stock_analyzer.outbox --drain [--retry-failed]
+
+log = logging.getLogger(__name__)
+
+# Telegram Bot API 的限制
+MAX_MESSAGE_CHARS = 4096
+MAX_CAPTION_CHARS = 1024
+MAX_DOCUMENT_BYTES = 50 * 2**20
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id TEXT NOT NULL,
+    method TEXT NOT NULL,             -- sendMessage / sendDocument
+    text TEXT NOT NULL DEFAULT '',    -- 訊息內容或檔案的 caption
+    file_name TEXT,
+    file_data BLOB,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending / sent / failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    created REAL NOT NULL,
+    sent REAL,
+    error TEXT
+)
+"""
+
+_limiters = {} # chat_id -> TokenBucket
+_limiters_lock = threading.Lock()
+
+
+@contextmanager
+def _connect(path=None):
+    """開啟佇列資料庫 (區塊結束時 commit 並關閉連線)"""
+    path = path or OUTBOX_PATH
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    # 主執行緒寫入、worker 讀取/更新，各自開啟連線 (WAL 模式讀寫不互相阻擋)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(_SCHEMA)
+        conn.execute("CREATE INDEX IF NOT EXISTS outbox_pending ON outbox (status, chat_id, id)")
+        conn.row_factory = sqlite3.Row
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _limiter(chat_id):
+    with _limiters_lock:
+        if chat_id not in _limiters:
+            _limiters[chat_id] = TokenBucket(TELEGRAM_MESSAGES_PER_SECOND, 3)
+        return _limiters[chat_id]
+
+
+def split_text(text, limit):
+    """將文字拆成不超過 limit 字的片段 (優先在換行處切開)"""
+    parts = []
+    while len(text) > limit:
+        cut = text.rfind('\n', 0, limit + 1)
+        if cut <= 0:
+            cut = limit
+        parts.append(text[:cut])
+        text = text[cut:].lstrip('\n')
+    if text or not parts:
+        parts.append(text)
+    return parts
+
+
+def _insert(conn, chat_id, method, text='', file_name=None, file_data=None):
+    now = time.time()
+    conn.execute("INSERT INTO outbox (chat_id, method, text, file_name, file_data, next_attempt, created) "
+                 "VALUES (?, ?, ?, ?, ?, ?, ?)", (str(chat_id), method, text, file_name, file_data, now, now))
+
+
+def enqueue_message(text, chat_id, path=None):
+    """加入文字訊息 (超過 MAX_MESSAGE_CHARS 時拆成多則)，回傳加入的筆數"""
+    parts = split_text(text, MAX_MESSAGE_CHARS)
+    with _connect(path) as conn:
+        for part in parts:
+            _insert(conn, chat_id, 'sendMessage', part)
+    _notify_workers()
+    return len(parts)
+
+
+def enqueue_document(file_path, chat_id, caption="", path=None):
+    """
+    加入檔案 (內容存入佇列，之後刪除或覆寫原檔不影響送出)，回傳加入的筆數
+    超過 MAX_DOCUMENT_BYTES 的檔案拆成 <檔名>.001、.002 ... 多個檔案 (caption 只附在第一個)；
+    超過 MAX_CAPTION_CHARS 的 caption 其餘部分接在檔案後以文字訊息送出
+    """
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    name = os.path.basename(file_path)
+    chunks = [content[i:i + MAX_DOCUMENT_BYTES] for i in range(0, len(content), MAX_DOCUMENT_BYTES)] or [b'']
+    names = [name] if len(chunks) == 1 else [f"{name}.{i:03d}" for i in range(1, len(chunks) + 1)]
+    captions = split_text(caption, MAX_CAPTION_CHARS)
+    with _connect(path) as conn:
+        for i, (part_name, data) in enumerate(zip(names, chunks)):
+            _insert(conn, chat_id, 'sendDocument', captions[0] if i == 0 else '', part_name, data)
+        for text in captions[1:]:
+            for part in split_text(text, MAX_MESSAGE_CHARS):
+                _insert(conn, chat_id, 'sendMessage', part)
+    _notify_workers()
+    return len(chunks) + len(captions) - 1
+
+
+def _batches(rows):
+    """同一個 chat 的待送訊息 -> 送出批次 (連續的文字訊息合併，合併後不超過 MAX_MESSAGE_CHARS)"""
+    batch = []
+    for row in rows:
+        if row['method'] == 'sendMessage' and batch and batch[-1]['method'] == 'sendMessage' and \
+                sum(len(r['text']) + 2 for r in batch) + len(row['text']) <= MAX_MESSAGE_CHARS:
+            batch.append(row)
+            continue
+        if batch:
+            yield batch
+        batch = [row]
+    if batch:
+        yield batch
+
+
+def _send(batch, path=None):
+    """送出一個批次，回傳 None (成功) 或 (錯誤說明, 是否可重試, 伺服器要求的等待秒數)"""
+    first = batch[0]
+    if first['method'] == 'sendMessage':
+        data = {'chat_id': first['chat_id'], 'text': '\n\n'.join(r['text'] for r in batch)}
+        files = None
+    else:
+        # 檔案內容送出前才讀取 (列出待送通知時不載入)
+        with _connect(path) as conn:
+            content = conn.execute("SELECT file_data FROM outbox WHERE id = ?", (first['id'],)).fetchone()[0]
+        data = {'chat_id': first['chat_id'], 'caption': first['text']}
+        files = {'document': (first['file_name'], content)}
+    _limiter(first['chat_id']).acquire()
+    try:
+        response = notifier.post(first['method'], data, files)
+    except http_client.requests.RequestException as e:
+        return http_client.describe_error(e), True, getattr(e, 'retry_after', None)
+    if response.ok:
+        return None
+    # 4xx: 請求本身有問題 (token、chat_id、檔案過大...)，重試也不會成功
+    return f"HTTP {response.status_code}: {response.text[:200]}", False, None
+
+
+def _mark_failure(conn, batch, error, retryable, retry_after, now):
+    for row in batch:
+        attempts = row['attempts'] + 1
+        if not retryable or attempts >= OUTBOX_MAX_ATTEMPTS:
+            conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, error = ? WHERE id = ?",
+                         (attempts, error, row['id']))
+            metrics.incr('notifications_failed')
+            log.error(f"通知送出失敗，不再重試: {error}",
+                      extra={'event': 'notify_failed', 'id': row['id'], 'attempts': attempts, 'error': error})
+            continue
+        wait = http_client.backoff_delay(attempts, OUTBOX_RETRY_DELAY)
+        if retry_after:
+            wait = max(wait, retry_after)
+        conn.execute("UPDATE outbox SET attempts = ?, next_attempt = ?, error = ? WHERE id = ?",
+                     (attempts, now + wait, error, row['id']))
+        metrics.incr('notifications_retried')
+        log.warning(f"通知送出失敗: {error}，{wait:.1f} 秒後重試 ({attempts}/{OUTBOX_MAX_ATTEMPTS})",
+                    extra={'event': 'notify_retry', 'id': row['id'], 'attempts': attempts, 'wait': wait})
+
+
+def drain(path=None, now=None):
+    """
+    送出目前到期的通知 (每個 chat 依序送出，遇到失敗即停止該 chat，保持順序)
+    now: 判斷是否到期的時間 (預設目前時間)
+    回傳送出的通知筆數
+    """
+    sent = 0
+    with _connect(path) as conn:
+        rows = conn.execute("SELECT id, chat_id, method, text, file_name, attempts, next_attempt FROM outbox "
+                            "WHERE status = 'pending' ORDER BY id").fetchall()
+    by_chat = {}
+    for row in rows:
+        by_chat.setdefault(row['chat_id'], []).append(row)
+
+    for chat_rows in by_chat.values():
+        due_at = time.time() if now is None else now
+        # 只取開頭已到期的訊息: 前一則等待重試時，後面的訊息不會先送出
+        due = []
+        for row in chat_rows:
+            if row['next_attempt'] > due_at:
+                break
+            due.append(row)
+        for batch in _batches(due):
+            failure = _send(batch, path)
+            with _connect(path) as conn:
+                if failure is None:
+                    conn.executemany("UPDATE outbox SET status = 'sent', sent = ?, file_data = NULL WHERE id = ?",
+                                     [(time.time(), r['id']) for r in batch])
+                    sent += len(batch)
+                    metrics.incr('notifications_sent', len(batch))
+                    log.info(f"已送出 {len(batch)} 則通知", extra={'event': 'notify_sent', 'count': len(batch)})
+                    continue
+                _mark_failure(conn, batch, *failure, time.time())
+            break
+    return sent
+
+
+def next_due(path=None):
+    """下一則待送通知的到期時間 (epoch 秒)，沒有待送通知時回傳 None"""
+    with _connect(path) as conn:
+        return conn.execute("SELECT MIN(next_attempt) FROM outbox WHERE status = 'pending'").fetchone()[0]
+
+
+def status(path=None):
+    """各狀態的通知筆數 {'pending': n, 'sent': n, 'failed': n}"""
+    with _connect(path) as conn:
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+    return {s: counts.get(s, 0) for s in ('pending', 'sent', 'failed')}
+
+
+def retry_failed(path=None):
+    """將失敗的通知重新加入佇列，回傳筆數"""
+    with _connect(path) as conn:
+        count = conn.execute("UPDATE outbox SET status = 'pending', attempts = 0, next_attempt = ? "
+                             "WHERE status = 'failed'", (time.time(),)).rowcount
+    _notify_workers()
+    return count
+
+
+_workers = set()
+
+
+def _notify_workers():
+    for worker in list(_workers):
+        worker.wake()
+
+
+class Worker:
+    """
+    背景送出通知的執行緒
+    start() 後持續送出到期的通知 (新通知加入佇列時立即處理)；
+    stop(timeout) 在 timeout 秒內盡量送完到期的通知後結束，其餘留在佇列中
+    """
+    def __init__(self, path=None, poll_interval=None):
+        self.path = path
+        self.poll_interval = OUTBOX_POLL_INTERVAL if poll_interval is None else poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._deadline = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox", daemon=True)
+        _workers.add(self)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            try:
+                drain(self.path)
+                due = next_due(self.path)
+            except Exception as e:
+                # 佇列或網路以外的錯誤 (例如資料庫被鎖定) 不結束 worker，下一輪再試
+                log.error(f"通知佇列處理失敗: {e}", extra={'event': 'outbox_error', 'error': str(e)})
+                due = time.time() + self.poll_interval
+            now = time.time()
+            if self._stop.is_set() and (due is None or due > self._deadline):
+                return
+            wait = self.poll_interval if due is None else min(self.poll_interval, max(0.0, due - now))
+            if self._stop.is_set():
+                wait = min(wait, max(0.0, self._deadline - now))
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def stop(self, timeout=0):
+        """停止 worker: timeout 秒內盡量送完到期的通知，回傳佇列中剩餘的待送筆數"""
+        self._deadline = time.time() + timeout
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            # 單次請求最多 HTTP_TIMEOUT 秒
+            self._thread.join(timeout + http_client.HTTP_TIMEOUT)
+        _workers.discard(self)
+        return status(self.path)['pending']
+
+
+def start_worker(path=None):
+    return Worker(path).start()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="通知佇列")
+    parser.add_argument("--status", action="store_true", help="列出各狀態的通知筆數")
+    parser.add_argument("--drain", action="store_true", help="送出到期的通知")
+    parser.add_argument("--retry-failed", action="store_true", help="重新送出失敗的通知")
+    args = parser.parse_args()
+    metrics.setup_logging()
+    if args.retry_failed:
+        print(f"已重新加入 {retry_failed()} 則通知")
+    if args.drain:
+        print(f"已送出 {drain()} 則通知")
+    if args.status or not (args.drain or args.retry_failed):
+        print(status())
@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+
+# 英文別名 -> TWSE 欄位名稱
+FIELD_ALIASES = {
+    'open': '開盤價',
+    'high': '最高價',
+    'low': '最低價',
+    'close': '收盤價',
+    'volume': '成交股數',
+    'trades': '成交筆數',
+}
+
+DEFAULT_FIELDS = list(FIELD_ALIASES.values())
+
+# 證交所價格最多到小數兩位
+PRICE_DECIMALS = 2
+
+
+def as_float64(values):
+    """
+    轉為 float64 陣列
+    float32 視為精簡載入的價格，四捨五入至 PRICE_DECIMALS 位，還原為與原始資料完全相同的 float64
+    (計算結果與以 float64 載入時一致)
+    """
+    arr = np.asarray(values)
+    if arr.dtype == np.float32:
+        return np.round(arr.astype(np.float64), PRICE_DECIMALS)
+    return np.asarray(arr, dtype=float)
+
+
+class Panel:
+    """
+    日期 x 股票 的對齊資料
+    dates: 日期字串陣列 (由舊到新)，對應每個陣列的列
+    codes: 證券代號陣列，對應每個陣列的欄
+    fields: {欄位名稱: 2-D float 陣列 (天數 x 股票數)}，精簡載入的價格為 float32，取值時還原為 float64
+    mask: 2-D bool 陣列，True 表示該股當日有資料列 (停牌但有資料列仍為 True，價格為 NaN)
+    names: 每檔股票最新的證券名稱
+    markets: 每檔股票最新的市場 (TWSE/TPEX，未載入市場欄位時為 None)
+    """
+    def __init__(self, dates, codes, fields, mask, names=None, markets=None):
+        self.dates = np.asarray(dates)
+        self.codes = np.asarray(codes)
+        self.fields = dict(fields)
+        self.mask = np.asarray(mask, dtype=bool)
+        self.names = np.asarray(names) if names is not None else np.full(len(self.codes), '', dtype=object)
+        self.markets = np.asarray(markets) if markets is not None else None
+        self._compact_order = None
+
+    @classmethod
+    def from_columns(cls, date_values, code_values, field_values, name_values=None, market_values=None):
+        """
+        由長格式的欄位陣列建立 Panel (每個元素為 一檔股票 x 一天)
+        field_values: {欄位名稱: 1-D 陣列}
+        """
+        t_idx, dates = pd.factorize(np.asarray(date_values), sort=True)
+        j_idx, codes = pd.factorize(np.asarray(code_values), sort=True)
+        shape = (len(dates), len(codes))
+
+        mask = np.zeros(shape, dtype=bool)
+        mask[t_idx, j_idx] = True
+
+        fields = {}
+        for name, values in field_values.items():
+            values = np.asarray(values)
+            # float32 (精簡載入的價格) 保留原型態，其餘 (含整數的成交量) 轉為 float64 以 NaN 表示無資料
+            dtype = np.float32 if values.dtype == np.float32 else np.float64
+            arr = np.full(shape, np.nan, dtype=dtype)
+            arr[t_idx, j_idx] = values
+            fields[name] = arr
+
+        def latest(values):
+            # 依日期排序後寫入，最後寫入的 (最新一天) 值保留
+            if values is None:
+                return None
+            order = np.argsort(t_idx, kind='stable')
+            out = np.empty(len(codes), dtype=object)
+            out[j_idx[order]] = np.asarray(values, dtype=object)[order]
+            return out
+
+        return cls(np.asarray(dates), np.asarray(codes), fields, mask, latest(name_values), latest(market_values))
+
+    @classmethod
+    def from_frame(cls, df, fields=None, code_col='證券代號', date_col='Date', name_col='證券名稱',
+                   market_col='市場'):
+        """由長格式 DataFrame 建立 Panel"""
+        if fields is None:
+            fields = [c for c in df.columns if c not in (code_col, date_col, name_col, market_col)]
+        names = df[name_col].to_numpy() if name_col in df.columns else None
+        markets = df[market_col].to_numpy() if market_col in df.columns else None
+        return cls.from_columns(df[date_col].to_numpy(), df[code_col].to_numpy(),
+                                {f: df[f].to_numpy() for f in fields if f in df.columns}, names, markets)
+
+    @property
+    def shape(self):
+        return self.mask.shape
+
+    def _raw(self, field):
+        return self.fields[FIELD_ALIASES.get(field, field)]
+
+    def __getitem__(self, field):
+        """取得欄位 (float64)"""
+        return as_float64(self._raw(field))
+
+    def __setitem__(self, field, arr):
+        arr = np.asarray(arr, dtype=float)
+        if arr.shape != self.shape:
+            raise ValueError(f"{field} 的形狀 {arr.shape} 與 Panel {self.shape} 不符")
+        self.fields[FIELD_ALIASES.get(field, field)] = arr
+
+    def __contains__(self, field):
+        return FIELD_ALIASES.get(field, field) in self.fields
+
+    @property
+    def nbytes(self):
+        """欄位陣列與資料遮罩佔用的記憶體 (bytes)"""
+        return self.mask.nbytes + sum(arr.nbytes for arr in self.fields.values())
+
+    @property
+    def traded(self):
+        """當日有成交 (有資料列且收盤價有效)"""
+        return self.mask & ~np.isnan(self._raw('close'))
+
+    def _order(self):
+        if self._compact_order is None:
+            # 穩定排序: 有資料的日期依原順序排到前面
+            self._compact_order = np.argsort(~self.mask, axis=0, kind='stable')
+            self._compact_valid = np.arange(self.shape[0])[:, None] < self.mask.sum(axis=0)
+        return self._compact_order
+
+    def compact(self, arr):
+        """
+        將日期對齊的陣列轉為「觀測值對齊」：每欄只保留該股有資料的日期並移到前面，尾端補 NaN
+        (與逐檔 groupby + sort_values('Date') 取得的序列相同，滾動視窗不會跨越沒有資料的日期)
+        """
+        out = np.take_along_axis(np.asarray(arr, dtype=float), self._order(), axis=0)
+        out[~self._compact_valid] = np.nan
+        return out
+
+    def expand(self, arr):
+        """compact 的反向轉換，沒有資料的日期填入 NaN"""
+        out = np.full(self.shape, np.nan)
+        np.put_along_axis(out, self._order(), arr, axis=0)
+        out[~self.mask] = np.nan
+        return out
+
+    def last_index(self):
+        """每檔股票最後一個有資料的日期列號"""
+        return self.shape[0] - 1 - np.argmax(self.mask[::-1], axis=0)
+
+    def latest_frame(self, fields=None, last_day_only=False):
+        """
+        每檔股票最後一天的資料 (一檔一列，依代號排序)
+        last_day_only: 只包含 Panel 最後一個日期有資料列的股票 (與 IndicatorState.latest_frame 相同)；
+                       預設為每檔各自最後有資料的一天 (與原本逐檔 iloc[[-1]] 相同)
+        """
+        rows = self.last_index()
+        cols = np.arange(self.shape[1])
+        if last_day_only:
+            cols = cols[self.mask[-1]]
+            rows = rows[cols]
+        data = {'證券代號': self.codes[cols], '證券名稱': self.names[cols], 'Date': self.dates[rows]}
+        if self.markets is not None:
+            data['市場'] = self.markets[cols]
+        for field in fields or self.fields:
+            data[field] = as_float64(self._raw(field)[rows, cols])
+        return pd.DataFrame(data)
+
+    def to_frame(self, fields=None):
+        """轉回長格式 DataFrame (只包含有資料的列，依 Date, 證券代號 排序)"""
+        t_idx, j_idx = np.nonzero(self.mask)
+        data = {'Date': self.dates[t_idx], '證券代號': self.codes[j_idx], '證券名稱': self.names[j_idx]}
+        if self.markets is not None:
+            data['市場'] = self.markets[j_idx]
+        for field in fields or self.fields:
+            data[field] = as_float64(self._raw(field)[t_idx, j_idx])
+        return pd.DataFrame(data)
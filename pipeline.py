@@ -0,0 +1,194 @@
+import logging
+import pandas as pd
+from .settings import INCREMENTAL_INDICATORS, SCREEN_RULES
+from . import data_fetcher
+from . import downloader
+from . import indicators
+from . import indicator_state
+from . import trading_calendar
+from . import rules
+from . import verify
+from . import report
+from . import metrics
+from .panel import Panel
+
+log = logging.getLogger(__name__)
+
+# 分析流程 (CLI 與 Streamlit 共用)
+# load -> indicators -> screen -> verify -> report
+# 每個階段開始/結束 (以及下載進度) 透過 on_progress 回報，方便顯示進度條與計時
+
+STAGES = ['load', 'indicators', 'screen', 'verify', 'report']
+
+# 各階段佔整體進度的比例 (用於進度條)
+STAGE_WEIGHTS = {'load': 0.4, 'indicators': 0.2, 'screen': 0.05, 'verify': 0.3, 'report': 0.05}
+
+
+def log_progress(stage, event, info):
+    """CLI 進度: 記錄各階段開始、耗時與產生的資料大小"""
+    if event == 'start':
+        log.info(f"[{stage}] 開始 ({info['fraction']:.0%})", extra={'event': 'stage_start', 'stage': stage})
+    elif event == 'end':
+        log.info(f"[{stage}] 完成，耗時 {info['elapsed']:.1f} 秒，資料 {info['memory'] / 2**20:.1f} MB",
+                 extra={'event': 'stage_end', 'stage': stage, 'seconds': info['elapsed'],
+                        'data_mb': round(info['memory'] / 2**20, 1)})
+
+
+def nbytes(obj):
+    """DataFrame / Panel (或其 list/tuple) 佔用的記憶體 (bytes)"""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, Panel):
+        return int(obj.nbytes)
+    if isinstance(obj, (list, tuple)):
+        return sum(nbytes(item) for item in obj)
+    return 0
+
+
+class PipelineResult:
+    """分析結果"""
+    def __init__(self, today_date):
+        self.today_date = today_date
+        self.latest_df = None      # 每檔最新一天的資料與指標 (初篩輸入)
+        self.stage1_df = None      # 初篩通過
+        self.final_df = None       # 複篩 (MACD) 通過
+        self.rule_counts = None    # 各篩選條件通過數
+        self.report_path = None
+        self.timings = {}          # 各階段耗時 (秒)
+        self.memory = {}           # 各階段產生的資料佔用記憶體 (bytes)
+        self.metrics = None        # metrics.RunMetrics: 各階段 wall/CPU 時間、記憶體峰值與計數
+        self.frames = {}           # 中間資料 (keep_intermediate=True 時保留)
+
+    @property
+    def ok(self):
+        return self.latest_df is not None
+
+
+class AnalysisPipeline:
+    """
+    lookback_days: 初篩使用的交易日數
+    screen_rules: 初篩條件 (預設 settings.SCREEN_RULES)
+    incremental: 是否使用增量指標狀態 (預設 settings.INCREMENTAL_INDICATORS)
+    keep_intermediate: 是否在結果中保留中間資料 (Panel、歷史資料等)
+    report_format: 報表格式 (預設 settings.REPORT_FORMAT，見 report.py)
+    markets: 下載的市場，以及指標狀態保存前須有資料的市場 (預設 settings.MARKETS)
+    on_progress: callback(stage, event, info)
+        event: 'start' / 'progress' / 'end'
+        info: {'fraction': 整體進度 0~1, 'elapsed': 階段耗時, 'memory': 階段產生的資料 (bytes), ...}
+    """
+    def __init__(self, lookback_days=45, screen_rules=None, incremental=None,
+                 keep_intermediate=False, write_report=True, on_progress=None, report_format=None, markets=None):
+        self.lookback_days = lookback_days
+        self.screen_rules = screen_rules if screen_rules is not None else SCREEN_RULES
+        self.incremental = INCREMENTAL_INDICATORS if incremental is None else incremental
+        self.keep_intermediate = keep_intermediate
+        self.write_report = write_report
+        self.report_format = report_format
+        self.markets = markets
+        self.on_progress = on_progress
+        self._done = 0.0
+
+    def _emit(self, stage, event, **info):
+        if self.on_progress is None:
+            return
+        weight = STAGE_WEIGHTS[stage]
+        within = {'start': 0.0, 'end': 1.0}.get(event, info.get('stage_fraction', 0.0))
+        info['fraction'] = min(1.0, self._done + weight * within)
+        self.on_progress(stage, event, info)
+
+    def _run_stage(self, result, stage, func, *args):
+        self._emit(stage, 'start')
+        with result.metrics.stage(stage) as timing:
+            value = func(result, *args)
+        result.timings[stage] = timing['wall']
+        result.memory[stage] = nbytes(value)
+        timing['data_mb'] = round(result.memory[stage] / 2**20, 1)
+        self._emit(stage, 'end', elapsed=result.timings[stage], memory=result.memory[stage])
+        self._done += STAGE_WEIGHTS[stage]
+        return value
+
+    def run(self, end_date=None, run_metrics=None):
+        """
+        執行完整流程，回傳 PipelineResult
+        run_metrics: 記錄計時與計數的 metrics.RunMetrics (由 metrics.start_run() 建立，預設開始新的一份)
+        """
+        self._done = 0.0
+        target_days = trading_calendar.get_trading_days(self.lookback_days, end_date=end_date)
+        result = PipelineResult(target_days[-1])
+        result.metrics = run_metrics or metrics.start_run("pipeline")
+        result.metrics.info.update(date=result.today_date, incremental=self.incremental)
+
+        self._run_stage(result, 'load', self._load, target_days)
+        self._run_stage(result, 'indicators', self._indicators, target_days)
+        if not result.ok:
+            log.warning("沒有足夠的資料進行分析", extra={'event': 'no_data', 'date': result.today_date})
+            return result
+        self._run_stage(result, 'screen', self._screen)
+        self._run_stage(result, 'verify', self._verify)
+        self._run_stage(result, 'report', self._report)
+        return result
+
+    def _load(self, result, target_days):
+        log.info(f"檢查 {len(target_days)} 天的歷史資料...", extra={'event': 'check_days', 'days': len(target_days)})
+
+        def progress(done, total):
+            self._emit('load', 'progress', stage_fraction=done / total, done=done, total=total)
+
+        downloader.download_missing(target_days, progress=progress, markets=self.markets)
+        if not self.incremental:
+            log.info("載入資料中...", extra={'event': 'load_panel'})
+            panel = data_fetcher.load_panel(target_days, columns=data_fetcher.ANALYSIS_COLUMNS)
+            result.frames['panel'] = panel
+            return panel
+
+    def _indicators(self, result, target_days):
+        if self.incremental:
+            # 以保存的指標狀態推進新的交易日 (狀態不存在或過期時自動完整重算)
+            log.info("更新技術指標狀態 (MA15, KD, MACD)...", extra={'event': 'indicators', 'incremental': True})
+            latest = indicator_state.update_daily(target_days, columns=data_fetcher.ANALYSIS_COLUMNS,
+                                                  markets=self.markets)
+        else:
+            # 在 Panel (日期 x 股票) 上一次計算全市場指標 (MA15 Volume, 15 日最高價, KD)
+            log.info("計算技術指標 (MA15, KD)...", extra={'event': 'indicators', 'incremental': False})
+            panel = result.frames.get('panel') if self.keep_intermediate else result.frames.pop('panel', None)
+            latest = None
+            if panel is not None:
+                indicators.calculate_panel_indicators(panel)
+                # 與增量狀態相同，只篩選最後一天有資料的股票 (不以過去的資料篩選已不在行情表中的股票)
+                latest = panel.latest_frame(last_day_only=True)
+        if latest is not None and not latest.empty:
+            result.latest_df = latest
+        return latest
+
+    def _screen(self, result):
+        log.info("執行篩選條件...", extra={'event': 'screen_start'})
+        result.stage1_df, result.rule_counts = rules.run_screen(result.latest_df, self.screen_rules)
+        result.metrics.set('screened', len(result.latest_df))
+        result.metrics.set('stage1_passed', len(result.stage1_df))
+        return result.stage1_df
+
+    def _verify(self, result):
+        if result.stage1_df.empty:
+            result.final_df = result.stage1_df
+            result.metrics.set('stage2_passed', 0)
+            return None
+        log.info(f"{len(result.stage1_df)} 檔通過初篩，正在載入歷史資料驗證 MACD...",
+                 extra={'event': 'stage1_passed', 'passed': len(result.stage1_df)})
+        codes = result.stage1_df['證券代號'].astype(str).str.strip().tolist()
+        histories = verify.load_histories(codes, result.today_date, markets=self.markets,
+                                          code_markets=verify.code_markets(result.stage1_df))
+        # 報表的指標歷史工作表使用 (未保留中間資料時於報表階段釋放)
+        result.frames['histories'] = histories
+        result.final_df = verify.verify_macd(result.stage1_df, histories)
+        result.metrics.set('history_rows', len(histories))
+        result.metrics.set('stage2_passed', len(result.final_df))
+        log.info(f"篩選完成，共 {len(result.final_df)} 檔符合條件",
+                 extra={'event': 'stage2_passed', 'passed': len(result.final_df)})
+        return [histories, result.final_df]
+
+    def _report(self, result):
+        histories = result.frames.get('histories') if self.keep_intermediate else result.frames.pop('histories', None)
+        if self.write_report and not result.final_df.empty:
+            result.report_path = report.generate_report(result.final_df, result.today_date,
+                                                        rule_counts=result.rule_counts, histories=histories,
+                                                        fmt=self.report_format)
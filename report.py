@@ -1,40 +1,202 @@
-import pandas as pd
 import os
-from .settings import REPORT_DIR
+import html
+import math
+import logging
+import pandas as pd
+from .settings import REPORT_DIR, REPORT_FORMAT, REPORT_HISTORY_DAYS
+from . import indicators
 
-def generate_excel(df, date_str):
+log = logging.getLogger(__name__)
+
+# 報表輸出
+# 報表由多個工作表組成 (候選股、各篩選條件通過數、每檔候選股的指標歷史)，
+# 每個工作表是 DataFrame 或依序產生 DataFrame 的 iterator，寫入時逐段 (REPORT_CHUNK_ROWS 列) 轉換並輸出，
+# 不需要先合併成一個大表，記憶體用量與報表大小無關：
+#   xlsx: openpyxl write-only 模式 (逐列寫入，不在記憶體中保留整個活頁簿)，每個工作表一頁
+#   csv: 每個工作表一個檔案 (主要工作表為 stock_analysis_YYYYMMDD.csv，其他加上工作表名稱)
+#   parquet: 每個工作表一個檔案，每段為一個 row group
+#   html: 單一檔案，每個工作表一個表格
+
+REPORT_CHUNK_ROWS = 5000
+
+FORMATS = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet',
+    'html': 'text/html',
+}
+
+# 重要欄位移到前面，其餘欄位維持原順序
+PRIORITY_COLS = ['證券代號', '證券名稱', '成交股數', '收盤價', '開盤價', 'K', 'D']
+
+
+def order_columns(columns):
+    """將重要欄位移到前面 (只回傳欄位順序，不複製資料)"""
+    columns = list(columns)
+    first = [c for c in PRIORITY_COLS if c in columns]
+    return first + [c for c in columns if c not in first]
+
+
+def _chunks(data):
+    """將工作表資料 (DataFrame 或 DataFrame 的 iterator) 切成最多 REPORT_CHUNK_ROWS 列的片段"""
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    for frame in frames:
+        for start in range(0, len(frame), REPORT_CHUNK_ROWS):
+            yield frame.iloc[start:start + REPORT_CHUNK_ROWS]
+
+
+def _rows(chunk):
+    """片段 -> Python 值的列 (numpy 數值與 category 轉為內建型態，缺值為 None)"""
+    for row in chunk.astype(object).itertuples(index=False, name=None):
+        yield [None if isinstance(v, float) and math.isnan(v) else v for v in row]
+
+
+def _write_xlsx(sheets, path):
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    for _, title, data in sheets:
+        sheet = workbook.create_sheet(title=title[:31]) # Excel 工作表名稱最多 31 字
+        header = False
+        for chunk in _chunks(data):
+            if not header:
+                sheet.append(list(chunk.columns))
+                header = True
+            for row in _rows(chunk):
+                sheet.append(row)
+    workbook.save(path)
+    return path
+
+
+def _sheet_path(path, name, index):
+    # 第一個 (主要) 工作表使用報表檔名，其他加上工作表名稱
+    if index == 0:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}_{name}{ext}"
+
+
+def _write_csv(sheets, path):
+    for i, (name, _, data) in enumerate(sheets):
+        target = _sheet_path(path, name, i)
+        with open(target, 'w', encoding='utf-8-sig', newline='') as f:
+            header = True
+            for chunk in _chunks(data):
+                chunk.to_csv(f, index=False, header=header)
+                header = False
+    return path
+
+
+def _write_parquet(sheets, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    for i, (name, _, data) in enumerate(sheets):
+        target = _sheet_path(path, name, i)
+        writer = None
+        try:
+            for chunk in _chunks(data):
+                table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+                if writer is None:
+                    writer = pq.ParquetWriter(target, table.schema, compression='zstd')
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+    return path
+
+
+def _write_html(sheets, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>股市分析報告</title></head><body>\n')
+        for _, title, data in sheets:
+            f.write(f'<h2>{html.escape(title)}</h2>\n<table border="1">\n')
+            header = False
+            for chunk in _chunks(data):
+                if not header:
+                    cells = ''.join(f'<th>{html.escape(str(c))}</th>' for c in chunk.columns)
+                    f.write(f'<thead><tr>{cells}</tr></thead>\n<tbody>\n')
+                    header = True
+                f.writelines('<tr>' + ''.join('<td></td>' if v is None else f'<td>{html.escape(str(v))}</td>'
+                                              for v in row) + '</tr>\n'
+                             for row in _rows(chunk))
+            f.write('</tbody></table>\n' if header else '</table>\n')
+        f.write('</body></html>\n')
+    return path
+
+
+_WRITERS = {'xlsx': _write_xlsx, 'csv': _write_csv, 'parquet': _write_parquet, 'html': _write_html}
+
+
+def write_report(sheets, date_str, fmt=None, directory=None):
+    """
+    寫入報表
+    sheets: [(名稱, 標題, DataFrame 或 DataFrame 的 iterator), ...]，第一個為主要工作表
+    fmt: 'xlsx' / 'csv' / 'parquet' / 'html' (預設 settings.REPORT_FORMAT)
+    回傳主要檔案的路徑
+    """
+    fmt = fmt or REPORT_FORMAT
+    if fmt not in _WRITERS:
+        raise ValueError(f"不支援的報表格式: {fmt} (可用: {sorted(_WRITERS)})")
+    directory = directory or REPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"stock_analysis_{date_str}.{fmt}")
+    return _WRITERS[fmt](sheets, path)
+
+
+def indicator_history(codes, histories, days=None):
+    """
+    每檔候選股最近 days 天 (預設 REPORT_HISTORY_DAYS) 的價格與指標 (K, D, DIF, MACD, OSC)
+    histories: Stage 2 使用的長格式歷史資料
+    依候選股順序逐檔產生 DataFrame (供 write_report 串流寫入)
+    """
+    days = REPORT_HISTORY_DAYS if days is None else days
+    codes = list(dict.fromkeys(codes))
+    if histories is None or histories.empty or not codes:
+        return
+    hist = histories[histories['證券代號'].isin(codes)].copy()
+    hist = hist.rename(columns={'High': '最高價', 'Low': '最低價', 'Close': '收盤價'})
+    hist = indicators.calculate_macd_batch(indicators.calculate_kd_batch(hist))
+    hist = hist.sort_values(['證券代號', 'Date'], kind='stable')
+    columns = ['證券代號', 'Date', '最高價', '最低價', '收盤價', 'K', 'D', 'DIF', 'MACD', 'OSC']
+    groups = dict(tuple(hist.groupby('證券代號', sort=False, observed=True)))
+    for code in codes:
+        if code in groups:
+            yield groups[code][columns].tail(days)
+
+
+def generate_report(df, date_str, rule_counts=None, histories=None, fmt=None):
     """
-    產生 Excel 報表
+    產生報表 (候選股、各篩選條件通過數、每檔候選股的指標歷史)
     df: 篩選後的 DataFrame
+    rule_counts: rules.run_screen 回傳的各條件通過數 (可省略)
+    histories: 複篩使用的長格式歷史資料 (可省略)
     date_str: 日期字串 (用於檔名)
+    fmt: 報表格式 (預設 settings.REPORT_FORMAT)
     """
     if df.empty:
-        print("無符合條件的資料，不產生報表")
+        log.info("無符合條件的資料，不產生報表", extra={'event': 'no_report', 'date': date_str})
         return None
-        
-    filename = f"stock_analysis_{date_str}.xlsx"
-    file_path = os.path.join(REPORT_DIR, filename)
-    
+
+    sheets = [('candidates', '候選股', df[order_columns(df.columns)])]
+    if rule_counts is not None and not rule_counts.empty:
+        sheets.append(('rules', '篩選統計', rule_counts.rename(
+            columns={'rule': '條件', 'passed': '單獨通過', 'remaining': '累計剩餘'})))
+    if histories is not None:
+        codes = df['證券代號'].astype(str).str.strip().tolist()
+        sheets.append(('history', '指標歷史', indicator_history(codes, histories)))
+
     try:
-        # 選取並重新命名欄位 (可選)
-        # 這裡保留所有欄位，但將重要欄位移到前面
-        cols = df.columns.tolist()
-        priority_cols = ['證券代號', '證券名稱', '成交股數', '收盤價', '開盤價', 'K', 'D']
-        
-        new_cols = []
-        for c in priority_cols:
-            if c in cols:
-                new_cols.append(c)
-                cols.remove(c)
-        new_cols.extend(cols)
-        
-        df = df[new_cols]
-        
-        # 輸出 Excel
-        df.to_excel(file_path, index=False, engine='openpyxl')
-        print(f"報表已產生: {file_path}")
+        file_path = write_report(sheets, date_str, fmt)
+        log.info(f"報表已產生: {file_path}", extra={'event': 'report', 'date': date_str, 'path': file_path})
         return file_path
-        
     except Exception as e:
-        print(f"產生報表失敗: {e}")
+        log.error(f"產生報表失敗: {e}", extra={'event': 'report_failed', 'date': date_str, 'error': str(e)})
         return None
+
+
+def generate_excel(df, date_str):
+    """
+    產生 Excel 報表 (只有候選股)
+    df: 篩選後的 DataFrame
+    date_str: 日期字串 (用於檔名)
+    """
+    return generate_report(df, date_str, fmt='xlsx')
@@ -0,0 +1,129 @@
+import logging
+import numpy as np
+import pandas as pd
+from .settings import SCREEN_RULES
+from .panel import as_float64
+
+log = logging.getLogger(__name__)
+
+# 篩選規則引擎
+# 每個規則是一個具名、可帶參數的條件函式: rule(data, **params) -> bool 陣列
+# data 可以是 DataFrame (一列一檔) 或 欄位名稱 -> 陣列 的對應 (例如 Panel 的 日期 x 股票 陣列)，
+# 條件以整欄陣列運算一次判斷所有資料，缺值 (NaN) 一律視為不通過。
+
+RULES = {}
+
+def rule(name):
+    """註冊篩選規則"""
+    def decorator(func):
+        RULES[name] = func
+        return func
+    return decorator
+
+def _col(data, name):
+    return as_float64(data[name])
+
+@rule('volume_above_ma')
+def volume_above_ma(data, ratio=1.0):
+    """當日成交量 > 過去 15 日平均量 (不含今日)"""
+    ma = _col(data, 'MA15_Vol')
+    return _col(data, '成交股數') > ma * ratio
+
+@rule('red_candle')
+def red_candle(data):
+    """紅K: 開盤價 < 收盤價"""
+    return _col(data, '開盤價') < _col(data, '收盤價')
+
+@rule('breakout_high')
+def breakout_high(data):
+    """收盤價 > 過去 15 日最高價 (不含今日)"""
+    return _col(data, '收盤價') > _col(data, 'Max15_High')
+
+@rule('max_trades')
+def max_trades(data, limit=300):
+    """成交筆數 < limit (籌碼集中)"""
+    return _col(data, '成交筆數') < limit
+
+@rule('kd_golden_cross')
+def kd_golden_cross(data):
+    """K(9) > D(9)"""
+    return _col(data, 'K') > _col(data, 'D')
+
+@rule('macd_turn_positive')
+def macd_turn_positive(data):
+    """MACD OSC 由昨日 <= 0 轉為今日 > 0"""
+    return (_col(data, 'OSC_Prev') <= 0) & (_col(data, 'OSC') > 0)
+
+@rule('exclude_warrants')
+def exclude_warrants(data, keywords=("購", "售", "牛", "熊")):
+    """排除權證 (6 位數代號 且 名稱含 購/售/牛/熊)"""
+    codes = np.char.strip(np.asarray(data['證券代號']).astype(str))
+    names = np.asarray(data['證券名稱']).astype(str)
+    has_keyword = np.zeros(np.broadcast(codes, names).shape, dtype=bool)
+    for k in keywords:
+        has_keyword |= np.char.find(names, k) >= 0
+    return ~((np.char.str_len(codes) == 6) & has_keyword)
+
+def _normalize(rules):
+    """規則設定可為 'name' 或 ('name', {params})"""
+    normalized = []
+    for item in rules:
+        if isinstance(item, str):
+            name, params = item, {}
+        else:
+            name, params = item[0], dict(item[1] if len(item) > 1 else {})
+        if name not in RULES:
+            raise KeyError(f"未知的篩選規則: {name}")
+        normalized.append((name, params))
+    return normalized
+
+def rule_names(rules=None):
+    """設定中的規則名稱 (依序)"""
+    return [name for name, _ in _normalize(rules if rules is not None else SCREEN_RULES)]
+
+def evaluate(data, rules=None):
+    """
+    計算每個規則的布林遮罩
+    回傳 {規則名稱: bool 陣列} (依設定順序)
+    """
+    return {name: np.asarray(RULES[name](data, **params), dtype=bool)
+            for name, params in _normalize(rules if rules is not None else SCREEN_RULES)}
+
+def pass_counts(masks):
+    """
+    每個規則的通過數
+    passed: 單獨套用該規則的通過數
+    remaining: 依序套用到該規則為止仍通過的數量
+    """
+    rows = []
+    combined = None
+    for name, mask in masks.items():
+        combined = mask if combined is None else combined & mask
+        rows.append({'rule': name, 'passed': int(mask.sum()), 'remaining': int(combined.sum())})
+    return pd.DataFrame(rows, columns=['rule', 'passed', 'remaining'])
+
+def combine(masks, shape=None):
+    """所有規則皆通過"""
+    result = np.ones(shape, dtype=bool) if shape is not None else None
+    for mask in masks.values():
+        result = mask if result is None else result & mask
+    return result
+
+def run_screen(df, rules=None, verbose=True):
+    """
+    對 DataFrame (一列一檔) 執行篩選
+    回傳 (通過的 DataFrame, 每個規則的通過數)
+    """
+    masks = evaluate(df, rules)
+    counts = pass_counts(masks)
+    if verbose:
+        log.info(f"篩選 {len(df)} 檔:", extra={'event': 'screen', 'rows': len(df)})
+        for row in counts.itertuples():
+            log.info(f"  {row.rule}: 通過 {row.passed} 檔，累計剩餘 {row.remaining} 檔",
+                     extra={'event': 'rule', 'rule': row.rule, 'passed': int(row.passed),
+                            'remaining': int(row.remaining)})
+    passed = combine(masks, shape=len(df))
+    return df[passed], counts
+
+# 設定中的規則名稱錯誤時立即報錯 (而非執行到篩選時)
+_normalize(SCREEN_RULES)
@@ -0,0 +1,29 @@
+#!/bin/bash
+
+# 常駐排程 (取代以 cron 每天執行 run_daily.sh)
+# 啟動一次即可，之後每個交易日資料公布後自動分析並發送通知；可由 launchd / systemd 於開機時啟動
+
+# Configuration
+PROJECT_DIR="/Users/wujianyu/.gemini/antigravity/scratch/tw_stock_analyzer"
+LOG_FILE="$PROJECT_DIR/daemon.log"
+DATE=$(date +"%Y-%m-%d %H:%M:%S")
+
+echo "[$DATE] Starting stock analysis daemon..." >> "$LOG_FILE"
+
+# Change to project directory
+cd "$PROJECT_DIR" || {
+    echo "[$DATE] Error: Could not change directory to $PROJECT_DIR" >> "$LOG_FILE"
+    exit 1
+}
+
+# Activate virtual environment
+if [ -f "venv/bin/activate" ]; then
+    source venv/bin/activate
+else
+    echo "[$DATE] Error: Virtual environment not found at $PROJECT_DIR/venv" >> "$LOG_FILE"
+    exit 1
+fi
+
+# Run daemon from the parent directory (python -m tw_stock_analyzer)
+# Redirect stdout and stderr to log
+cd .. && exec python -m tw_stock_analyzer daemon >> "$LOG_FILE" 2>&1
@@ -0,0 +1,161 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from .settings import (DAEMON_START, DAEMON_DEADLINE, DAEMON_POLL_INTERVAL, DAEMON_POLL_MAX_INTERVAL,
+                       OUTBOX_FLUSH_TIMEOUT, STAGE2_LOOKBACK_DAYS, LOG_LEVEL, LOG_JSON)
+from . import store
+from . import data_fetcher
+from . import downloader
+from . import markets as market_sources
+from . import trading_calendar
+from . import indicator_state
+from . import history
+from . import http_client
+from . import metrics
+from . import outbox
+from . import cli
+from . import main as daily
+
+# 常駐排程 (取代以 cron 每天啟動一次 main.py)
+# 程式持續執行，資料與狀態保留在記憶體中，不必每天重新載入：
+#   - 資料庫月份檔案 (store.enable_cache，最多保留 STORE_CACHE_MONTHS 個月份) 與指標狀態 (indicator_state.get_state)，每日只讀取新的一天
+#   - 通知佇列的 worker 持續執行，網路中斷時的通知稍後自動重試
+# 每個交易日 DAEMON_START 起檢查當天資料是否已公布 (指數退避，最長間隔 DAEMON_POLL_MAX_INTERVAL 秒)，
+# 所有市場都取得資料後立即分析並將報表加入通知佇列；DAEMON_DEADLINE 時只有部分市場公布則以已公布的市場分析
+# (指標狀態不保存這一天，缺少的市場之後寫入時再正式推進，見 indicator_state.update_daily)，
+# 都沒有資料則略過當天。當天的報表已存在時 (例如重新啟動) 不再分析。
+#
+#   python -m tw_stock_analyzer daemon
+
+log = logging.getLogger(__name__)
+
+
+def _at(date_str, hhmm):
+    return datetime.strptime(f"{date_str} {hhmm}", "%Y%m%d %H:%M")
+
+
+class Scheduler:
+    """
+    markets: 下載與分析的市場 (預設 settings.MARKETS)
+    report_format: 報表格式 (預設 settings.REPORT_FORMAT)
+    """
+    def __init__(self, markets=None, report_format=None):
+        self.markets = markets
+        self.report_format = report_format
+        self.last_date = None # 最後處理 (分析或略過) 的交易日
+        self.worker = None
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    def _sleep(self, seconds):
+        """等待 seconds 秒，期間呼叫 stop() 時回傳 False"""
+        return not self._stop.wait(max(0.0, seconds))
+
+    def next_session(self, now=None):
+        """下一個要處理的交易日 -> (日期, 開始檢查資料的時間, 截止時間)"""
+        now = now or datetime.now()
+        day = now
+        while True:
+            date_str = day.strftime("%Y%m%d")
+            deadline = _at(date_str, DAEMON_DEADLINE)
+            if deadline > now and not trading_calendar.is_closed(date_str) and \
+                    (self.last_date is None or date_str > self.last_date):
+                return date_str, max(now, _at(date_str, DAEMON_START)), deadline
+            day += timedelta(days=1)
+
+    def warm(self):
+        """啟動時將近期資料 (初篩與 MACD 複篩使用的月份) 與指標狀態載入記憶體"""
+        start = time.perf_counter()
+        store.enable_cache()
+        days = trading_calendar.get_trading_days(STAGE2_LOOKBACK_DAYS)
+        data_fetcher.load_history(days, columns=data_fetcher.ANALYSIS_COLUMNS + history.HISTORY_COLUMNS)
+        indicator_state.get_state()
+        log.info(f"已載入近期資料與指標狀態，耗時 {time.perf_counter() - start:.1f} 秒",
+                 extra={'event': 'daemon_warm', 'seconds': time.perf_counter() - start})
+
+    def wait_for_data(self, date_str, deadline):
+        """
+        下載 date_str 的資料，尚未公布時以指數退避重新檢查直到 deadline (datetime)
+        回傳是否取得資料 (截止時只有部分市場公布仍回傳 True)；休市或呼叫 stop() 時回傳 False
+        """
+        sources = market_sources.get_sources(self.markets)
+        attempt = 0
+        while True:
+            downloader.download_missing([date_str], markets=self.markets)
+            missing = [s.name for s in sources if not data_fetcher.check_data_exists(date_str, s.name)]
+            if not missing:
+                return True
+            if trading_calendar.is_closed(date_str):
+                log.info(f"{date_str} 休市", extra={'event': 'daemon_closed', 'date': date_str})
+                return False
+            remaining = deadline.timestamp() - time.time()
+            if remaining <= 0:
+                if len(missing) < len(sources):
+                    log.warning(f"{date_str} 截止時 {'、'.join(missing)} 仍未公布，以已公布的市場分析",
+                                extra={'event': 'daemon_partial', 'date': date_str, 'missing': missing})
+                    return True
+                log.warning(f"{date_str} 截止時仍無資料，略過",
+                            extra={'event': 'daemon_skip', 'date': date_str})
+                return False
+            attempt += 1
+            wait = min(http_client.backoff_delay(attempt, DAEMON_POLL_INTERVAL), DAEMON_POLL_MAX_INTERVAL, remaining)
+            log.info(f"{date_str} 資料尚未公布 ({'、'.join(missing)})，{wait:.0f} 秒後重新檢查",
+                     extra={'event': 'daemon_poll', 'date': date_str, 'missing': missing, 'wait': wait})
+            if not self._sleep(wait):
+                return False
+
+    def run_day(self, date_str):
+        """分析 date_str 並將報表加入通知佇列 (由常駐的 worker 送出)，回傳 PipelineResult"""
+        run_metrics = metrics.start_run("daily")
+        run_metrics.info.update(daemon=True, data_ready=datetime.now().isoformat(timespec='seconds'))
+        metrics.setup_logging(LOG_LEVEL, run_metrics.path(suffix=".log.jsonl") if LOG_JSON else None)
+        try:
+            return daily.analyze(run_metrics, self.report_format, end_date=date_str, markets=self.markets)
+        finally:
+            print(f"執行紀錄已寫入 {run_metrics.write()}")
+            # 等待下一個交易日期間的日誌不寫入這次執行的紀錄
+            metrics.setup_logging(LOG_LEVEL)
+
+    def run_forever(self):
+        """持續執行直到 stop() 或 Ctrl+C"""
+        metrics.setup_logging(LOG_LEVEL)
+        print("=== 啟動台灣股市分析常駐排程 ===")
+        self.worker = outbox.start_worker()
+        announced = None
+        try:
+            self.warm()
+            while not self._stop.is_set():
+                date_str, start, deadline = self.next_session()
+                if cli.find_report(date_str):
+                    log.info(f"{date_str} 的報表已存在，略過", extra={'event': 'daemon_done', 'date': date_str})
+                    self.last_date = date_str
+                    continue
+                wait = (start - datetime.now()).total_seconds()
+                if wait > 0:
+                    if announced != date_str:
+                        log.info(f"下一個交易日 {date_str}，{start:%m/%d %H:%M} 開始檢查資料",
+                                 extra={'event': 'daemon_next', 'date': date_str, 'start': start.isoformat()})
+                        announced = date_str
+                    # 最多等待一小時後重新計算 (系統休眠或調整時間後仍能準時)
+                    self._sleep(min(wait, 3600))
+                    continue
+                try:
+                    if self.wait_for_data(date_str, deadline):
+                        self.run_day(date_str)
+                except Exception as e:
+                    # 單日分析失敗不結束常駐程式
+                    log.exception(f"{date_str} 分析失敗: {e}", extra={'event': 'daemon_error', 'date': date_str})
+                self.last_date = date_str
+        except KeyboardInterrupt:
+            print("已停止")
+        finally:
+            pending = self.worker.stop(OUTBOX_FLUSH_TIMEOUT)
+            if pending:
+                print(f"尚有 {pending} 則通知未送出，將於下次執行時重試")
+
+
+if __name__ == "__main__":
+    Scheduler().run_forever()
@@ -25,17 +25,124 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = get_setting('DATA_DIR', os.path.join(BASE_DIR, "data"))
 REPORT_DIR = get_setting('REPORT_DIR', os.path.join(BASE_DIR, "reports"))
 
+# 欄式資料庫 (年/月分區)
+# STORE_FORMAT: 'parquet' (預設), 'feather', 或 'csv' (舊版每日一個 CSV)
+STORE_DIR = get_setting('STORE_DIR', os.path.join(DATA_DIR, "store"))
+STORE_FORMAT = get_setting('STORE_FORMAT', "parquet")
+# 載入歷史資料時使用精簡型態 (代號/名稱/日期為 category、價格 float32、數量為整數)
+COMPACT_MEMORY = str(get_setting('COMPACT_MEMORY', True)).lower() not in ('0', 'false', 'no')
+# 常駐模式保留在記憶體中的月份檔案數 (超過時移除最久未使用的月份；預設涵蓋 MACD 複篩約 6 個月的歷史)
+STORE_CACHE_MONTHS = int(get_setting('STORE_CACHE_MONTHS', 8))
+
+# 增量指標狀態 (每日只以新交易日推進，不存在或過期時自動完整重算)
+INCREMENTAL_INDICATORS = str(get_setting('INCREMENTAL_INDICATORS', True)).lower() not in ('0', 'false', 'no')
+STATE_PATH = get_setting('STATE_PATH', os.path.join(DATA_DIR, "state", "indicator_state.npz"))
+
+# 報表格式 (xlsx / csv / parquet / html，見 report.py) 與指標歷史工作表的天數
+REPORT_FORMAT = get_setting('REPORT_FORMAT', "xlsx")
+REPORT_HISTORY_DAYS = int(get_setting('REPORT_HISTORY_DAYS', 30))
+
 # Create directories if they don't exist
 os.makedirs(DATA_DIR, exist_ok=True)
 os.makedirs(REPORT_DIR, exist_ok=True)
 
 # TWSE URL
 TWSE_URL = get_setting('TWSE_URL', "https://www.twse.com.tw/rwd/zh/afterTrading/MI_INDEX")
+# TPEx (櫃買中心) 上櫃股票每日收盤行情
+TPEX_URL = get_setting('TPEX_URL', "https://www.tpex.org.tw/www/zh-tw/afterTrading/dailyQuotes")
+
+# 下載的市場 (TWSE: 上市，TPEX: 上櫃)，列表或以逗號分隔的字串，見 markets.py
+MARKETS = get_setting('MARKETS', ['TWSE', 'TPEX'])
+if isinstance(MARKETS, str):
+    MARKETS = [m.strip().upper() for m in MARKETS.split(',') if m.strip()]
+
+# 交易日曆: 已確認的休市日快取，以及預先載入的假日 (YYYYMMDD 列表或以逗號分隔的字串)
+CALENDAR_PATH = get_setting('CALENDAR_PATH', os.path.join(DATA_DIR, "calendar.json"))
+TRADING_HOLIDAYS = get_setting('TRADING_HOLIDAYS', [])
+if isinstance(TRADING_HOLIDAYS, str):
+    TRADING_HOLIDAYS = [d.strip() for d in TRADING_HOLIDAYS.split(',') if d.strip()]
+
+# 下載限速: 每秒請求數 (預設約每 3 秒一次) 與並行 worker 數
+TWSE_REQUESTS_PER_SECOND = float(get_setting('TWSE_REQUESTS_PER_SECOND', 1 / 3))
+TWSE_BURST = int(get_setting('TWSE_BURST', 1))
+# 櫃買中心的頻率限制與證交所分開計算 (各自的限速器，兩個市場的請求同時進行)
+TPEX_REQUESTS_PER_SECOND = float(get_setting('TPEX_REQUESTS_PER_SECOND', 1 / 3))
+TPEX_BURST = int(get_setting('TPEX_BURST', 1))
+DOWNLOAD_WORKERS = int(get_setting('DOWNLOAD_WORKERS', 3))
+
+# Panel 指標計算的 process 數 (1 為不分段，0 為 CPU 核心數) 與每段最少股票數 (見 sharding.py)
+INDICATOR_WORKERS = int(get_setting('INDICATOR_WORKERS', 1))
+INDICATOR_MIN_SHARD = int(get_setting('INDICATOR_MIN_SHARD', 250))
+
+# 證交所原始回應封存 (gzip，可由封存重建資料庫) 與重建時的 process 數 (0 為 CPU 核心數)
+ARCHIVE_RAW = str(get_setting('ARCHIVE_RAW', True)).lower() not in ('0', 'false', 'no')
+ARCHIVE_DIR = get_setting('ARCHIVE_DIR', os.path.join(DATA_DIR, "raw"))
+REINGEST_WORKERS = int(get_setting('REINGEST_WORKERS', 0))
+
+# 歷史資料回補的進度檔目錄 (每個日期範圍一個檔案，中斷後可續傳)
+BACKFILL_DIR = get_setting('BACKFILL_DIR', os.path.join(DATA_DIR, "backfill"))
+
+# 初篩條件 (依序套用，規則定義見 rules.py)
+# 每項為 規則名稱 或 (規則名稱, {參數})；未知的規則名稱在載入 rules 時即報錯
+SCREEN_RULES = get_setting('SCREEN_RULES', [
+    ('volume_above_ma', {'ratio': 1.0}),   # 成交量 > MA15
+    ('exclude_warrants', {}),              # 排除權證
+    ('red_candle', {}),                    # 開盤 < 收盤
+    ('breakout_high', {}),                 # 收盤 > 過去 15 日最高價
+    ('max_trades', {'limit': 300}),        # 成交筆數 < 300
+    ('kd_golden_cross', {}),               # K > D
+])
+# 環境變數或 config 的設定為以逗號分隔的規則名稱 (使用規則的預設參數)，例如 volume_above_ma,red_candle
+if isinstance(SCREEN_RULES, str):
+    SCREEN_RULES = [r.strip() for r in SCREEN_RULES.split(',') if r.strip()]
+
+# 回測的持有天數 (交易日)
+BACKTEST_HORIZONS = get_setting('BACKTEST_HORIZONS', [1, 5, 10, 20])
+if isinstance(BACKTEST_HORIZONS, str):
+    BACKTEST_HORIZONS = [int(h) for h in BACKTEST_HORIZONS.split(',') if h.strip()]
 
 # Telegram Configuration
 TELEGRAM_BOT_TOKEN = get_setting('TELEGRAM_BOT_TOKEN', "")
 TELEGRAM_CHAT_ID = get_setting('TELEGRAM_CHAT_ID', "")
+TELEGRAM_API_URL = get_setting('TELEGRAM_API_URL', "https://api.telegram.org")
+# 每個 chat 每秒最多送出的訊息數 (Telegram 對同一個 chat 約每秒 1 則)
+TELEGRAM_MESSAGES_PER_SECOND = float(get_setting('TELEGRAM_MESSAGES_PER_SECOND', 1))
+
+# 通知佇列 (見 outbox.py): 佇列資料庫、最多嘗試次數、重試的基本間隔 (秒，指數退避)、
+# worker 檢查佇列的間隔，以及每日分析結束時等待通知送出的最長秒數 (其餘留待下次送出)
+OUTBOX_PATH = get_setting('OUTBOX_PATH', os.path.join(DATA_DIR, "outbox.sqlite3"))
+OUTBOX_MAX_ATTEMPTS = int(get_setting('OUTBOX_MAX_ATTEMPTS', 8))
+OUTBOX_RETRY_DELAY = float(get_setting('OUTBOX_RETRY_DELAY', 30))
+OUTBOX_POLL_INTERVAL = float(get_setting('OUTBOX_POLL_INTERVAL', 5))
+OUTBOX_FLUSH_TIMEOUT = float(get_setting('OUTBOX_FLUSH_TIMEOUT', 60))
+
+# 常駐排程 (見 scheduler.py): 交易日 DAEMON_START (收盤後) 開始檢查當天資料是否已公布，
+# 尚未公布時由 DAEMON_POLL_INTERVAL 秒起以指數退避重新檢查 (最長間隔 DAEMON_POLL_MAX_INTERVAL 秒)，
+# 超過 DAEMON_DEADLINE 仍無資料則略過當天 (休市或延遲公布)
+DAEMON_START = get_setting('DAEMON_START', "13:45")
+DAEMON_DEADLINE = get_setting('DAEMON_DEADLINE', "20:00")
+DAEMON_POLL_INTERVAL = float(get_setting('DAEMON_POLL_INTERVAL', 30))
+DAEMON_POLL_MAX_INTERVAL = float(get_setting('DAEMON_POLL_MAX_INTERVAL', 600))
 
 # Retry settings
-MAX_RETRIES = get_setting('MAX_RETRIES', 3)
-RETRY_DELAY = get_setting('RETRY_DELAY', 5)
+MAX_RETRIES = int(get_setting('MAX_RETRIES', 3))
+RETRY_DELAY = float(get_setting('RETRY_DELAY', 5))
+
+# 執行紀錄: 每次執行的計時/計數 JSON 與 JSON 日誌 (見 metrics.py)
+METRICS_DIR = get_setting('METRICS_DIR', os.path.join(DATA_DIR, "metrics"))
+LOG_LEVEL = get_setting('LOG_LEVEL', "INFO")
+LOG_JSON = str(get_setting('LOG_JSON', True)).lower() not in ('0', 'false', 'no')
+
+# HTTP 連線: 單次請求逾時秒數與連線池大小 (見 http_client.py)
+HTTP_TIMEOUT = float(get_setting('HTTP_TIMEOUT', 30))
+HTTP_POOL_SIZE = int(get_setting('HTTP_POOL_SIZE', 10))
+
+# Stage 2 歷史資料來源: 'local' (本地證交所資料，資料不足時改用 yfinance) 或 'yfinance'
+STAGE2_SOURCE = get_setting('STAGE2_SOURCE', "local")
+STAGE2_LOOKBACK_DAYS = int(get_setting('STAGE2_LOOKBACK_DAYS', 130)) # 約 6 個月
+STAGE2_BACKFILL = str(get_setting('STAGE2_BACKFILL', True)).lower() not in ('0', 'false', 'no')
+
+# Stage 2 (yfinance) 批次下載: 每批 ticker 數、並行數、單次請求逾時秒數
+YF_BATCH_SIZE = int(get_setting('YF_BATCH_SIZE', 20))
+YF_WORKERS = int(get_setting('YF_WORKERS', 4))
+YF_TIMEOUT = float(get_setting('YF_TIMEOUT', 10))
@@ -0,0 +1,125 @@
+import os
+import atexit
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+from .settings import INDICATOR_WORKERS, INDICATOR_MIN_SHARD
+
+# 以多個 process 分段計算 2-D (天數 x 股票數) 指標
+# 指標沿時間軸逐欄 (每檔股票) 獨立計算，因此可依股票欄切成數段，由不同 process 各自計算後合併：
+#   - 輸入陣列放在共享記憶體 (multiprocessing.shared_memory)，worker 直接讀取，不需 pickle 整個陣列
+#   - 每段的結果寫入共享記憶體中輸出陣列的對應欄位，各段互不重疊
+#   - 分段方式只由股票數與分段數決定，結果與單一 process 計算完全相同
+# 陣列太小 (每段少於 INDICATOR_MIN_SHARD 檔) 時直接在目前的 process 計算。
+
+_lock = threading.Lock()
+_pool = None
+_pool_workers = 0
+
+
+def _get_pool(workers):
+    """共用的 process pool (重複使用，避免每次計算都重新啟動 process)"""
+    global _pool, _pool_workers
+    with _lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown()
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+@atexit.register
+def shutdown():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def resolve_workers(workers=None):
+    """worker 數 (預設 settings.INDICATOR_WORKERS，0 為 CPU 核心數)"""
+    workers = INDICATOR_WORKERS if workers is None else workers
+    return max(1, workers or os.cpu_count() or 1)
+
+
+def shard_bounds(n_columns, shards):
+    """將 n_columns 欄切成 shards 段，回傳 [(起, 迄), ...]"""
+    edges = np.linspace(0, n_columns, shards + 1).round().astype(int)
+    return [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:]) if b > a]
+
+
+def _attach(spec):
+    """由 (名稱, 形狀) 取得共享記憶體與對應的陣列"""
+    name, shape = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def _run_shard(func, inputs, outputs, lo, hi, params):
+    """worker: 計算 [lo, hi) 欄並寫入共享的輸出陣列"""
+    args = {}
+    for name, spec in inputs.items():
+        shm, arr = _attach(spec)
+        args[name] = arr[:, lo:hi].copy() # 複製本段欄位 (連續記憶體，計算較快)
+        del arr
+        shm.close()
+    result = func(**args, **params)
+    for name, spec in outputs.items():
+        shm, arr = _attach(spec)
+        arr[:, lo:hi] = result[name]
+        del arr
+        shm.close()
+    return lo, hi
+
+
+def run_sharded(func, inputs, outputs, workers=None, min_shard=None, **params):
+    """
+    分段計算指標
+    func: func(**inputs, **params) -> {輸出名稱: 2-D 陣列}，需為模組層級的函式 (worker 以名稱載入)
+    inputs: {參數名稱: 2-D 陣列 (天數 x 股票數)}，None 直接傳給 func
+    outputs: 輸出名稱列表
+    workers: process 數 (預設 settings.INDICATOR_WORKERS)
+    min_shard: 每段最少股票數 (預設 settings.INDICATOR_MIN_SHARD)
+    回傳 {輸出名稱: 2-D 陣列}
+    """
+    arrays = {name: arr for name, arr in inputs.items() if arr is not None}
+    params.update({name: None for name, arr in inputs.items() if arr is None})
+    shape = next(iter(arrays.values())).shape
+    workers = resolve_workers(workers)
+    min_shard = INDICATOR_MIN_SHARD if min_shard is None else min_shard
+    shards = min(workers, shape[1] // max(1, min_shard))
+    if shards <= 1:
+        return func(**arrays, **params)
+
+    blocks = []
+    try:
+        def allocate(arr=None):
+            shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+            blocks.append(shm)
+            view = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+            if arr is not None:
+                view[:] = arr
+            return (shm.name, shape), view
+
+        input_specs = {name: allocate(arr)[0] for name, arr in arrays.items()}
+        output_views = {name: allocate() for name in outputs}
+        output_specs = {name: spec for name, (spec, _) in output_views.items()}
+
+        pool = _get_pool(workers)
+        futures = [pool.submit(_run_shard, func, input_specs, output_specs, lo, hi, params)
+                   for lo, hi in shard_bounds(shape[1], shards)]
+        for future in futures:
+            future.result()
+        # 複製出共享記憶體 (釋放後仍可使用)
+        return {name: view.copy() for name, (_, view) in output_views.items()}
+    finally:
+        output_views = None
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass # 例外時仍有陣列參照此區塊，由 GC 回收
+            shm.unlink()
@@ -0,0 +1,361 @@
+import os
+import re
+import glob
+import argparse
+from collections import OrderedDict
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from .settings import STORE_DIR, STORE_FORMAT, DATA_DIR, COMPACT_MEMORY, STORE_CACHE_MONTHS
+
+# 欄式行情資料庫
+# 以 年/月 分區，每個月一個檔案 (Parquet 或 Feather)：
+#   STORE_DIR/year=YYYY/month=MM/part.parquet
+# 每個檔案包含該月所有交易日、所有市場的資料，以 'Date' 欄位 (YYYYMMDD) 與 '市場' 欄位 (TWSE/TPEX) 區分
+# 同一天各市場分別寫入、分別覆蓋；舊版檔案沒有市場欄位，視為證交所 (TWSE) 的資料
+
+DATE_COL = 'Date'
+MARKET_COL = '市場'
+DEFAULT_MARKET = 'TWSE'
+TEXT_COLS = ['證券代號', '證券名稱', MARKET_COL]
+
+_EXTENSIONS = {'parquet': 'parquet', 'feather': 'feather'}
+
+# 精簡型態 (載入時轉換，檔案內仍為 float64)
+# 價格為 float32 (小數兩位，計算時以 panel.as_float64 還原)，數量為整數 (無資料為 0)
+PRICE_COLS = ['開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '最後揭示買價', '最後揭示賣價', '本益比']
+INT_COLS = {
+    '成交股數': pa.int64(),
+    '成交筆數': pa.int32(),
+    '成交金額': pa.int64(),
+    '最後揭示買量': pa.int64(),
+    '最後揭示賣量': pa.int64(),
+    '漲跌(+/-)': pa.int8(),
+}
+
+# 快取每個月份檔案已有的日期，避免 check_data_exists 重複讀檔
+# key: 月份檔案路徑, value: set of (date_str, 市場)
+_month_dates_cache = {}
+
+# 常駐模式 (scheduler.py) 以 enable_cache() 將讀取過的月份檔案保留在記憶體中 (pyarrow Table，只含讀取過的欄位)，
+# 之後讀取同一個月份不再讀取磁碟；檔案改寫 (寫入新的一天，或由其他程式寫入) 時依修改時間重新讀取。
+# 最多保留 _cache_months 個月份 (依最近使用的順序，超過時移除最久未使用的月份)，常駐期間記憶體不會持續增加
+# key: 月份檔案路徑, value: (修改時間, Table, 是否包含所有欄位)；None 表示不快取
+_table_cache = None
+_cache_months = STORE_CACHE_MONTHS
+
+
+def _resolve(store_dir=None, fmt=None):
+    store_dir = store_dir or STORE_DIR
+    fmt = fmt or STORE_FORMAT
+    if fmt not in _EXTENSIONS:
+        raise ValueError(f"不支援的儲存格式: {fmt}")
+    return store_dir, fmt
+
+
+def month_path(date_str, store_dir=None, fmt=None):
+    """取得日期所屬月份分區的檔案路徑"""
+    store_dir, fmt = _resolve(store_dir, fmt)
+    return os.path.join(store_dir, f"year={date_str[:4]}", f"month={date_str[4:6]}",
+                        f"part.{_EXTENSIONS[fmt]}")
+
+
+def normalize_frame(df, date_str=None, market=None):
+    """
+    統一欄位型態，確保每個分區檔案的 schema 一致
+    文字欄位 (代號/名稱/市場) 為字串，其餘欄位為 float64
+    market: 設定市場欄位 (None 時沿用既有欄位，沒有市場欄位則為 DEFAULT_MARKET)
+    """
+    df = df.copy()
+    if date_str is not None:
+        df[DATE_COL] = date_str
+    if market is not None:
+        df[MARKET_COL] = market
+    df = _with_market(df)
+    for col in df.columns:
+        if col == DATE_COL or col in TEXT_COLS:
+            df[col] = df[col].astype(str).str.strip()
+        else:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    return df
+
+
+def _with_market(df):
+    """補上市場欄位 (舊版資料沒有市場欄位，視為 DEFAULT_MARKET)"""
+    if MARKET_COL not in df.columns:
+        df[MARKET_COL] = DEFAULT_MARKET
+    elif df[MARKET_COL].isna().any():
+        df[MARKET_COL] = df[MARKET_COL].fillna(DEFAULT_MARKET)
+    return df
+
+
+def _keys(df):
+    """資料中的 (日期, 市場) 組合"""
+    return set(zip(df[DATE_COL], df[MARKET_COL]))
+
+
+def _read_file(path, fmt, columns=None):
+    dataset = ds.dataset(path, format=fmt)
+    if columns is not None:
+        columns = [c for c in columns if c in dataset.schema.names]
+    return dataset.to_table(columns=columns).to_pandas()
+
+
+def _write_file(df, path, fmt):
+    # 先寫入暫存檔再替換，避免中斷時留下損毀的分區
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp_path, compression='zstd')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+
+
+def _month_dates(path, fmt):
+    if path not in _month_dates_cache:
+        if os.path.exists(path):
+            df = _with_market(_read_file(path, fmt, columns=[DATE_COL, MARKET_COL]))
+            _month_dates_cache[path] = _keys(df)
+        else:
+            _month_dates_cache[path] = set()
+    return _month_dates_cache[path]
+
+
+def enable_cache(enabled=True, max_months=None):
+    """
+    啟用 (或停用並清除) 月份檔案的記憶體快取
+    max_months: 最多保留的月份檔案數 (預設 STORE_CACHE_MONTHS)
+    """
+    global _table_cache, _cache_months
+    _table_cache = OrderedDict() if enabled else None
+    _cache_months = max(1, max_months or STORE_CACHE_MONTHS)
+
+
+def _cached_month(path, fmt, columns=None):
+    """由快取取得月份檔案的 Table (至少包含 columns，None 表示所有欄位)"""
+    mtime = os.stat(path).st_mtime_ns
+    entry = _table_cache.get(path)
+    wanted = None if columns is None else set(columns)
+    if entry is not None and entry[0] == mtime:
+        _, table, complete = entry
+        if complete or (wanted is not None and wanted <= set(table.column_names)):
+            _table_cache.move_to_end(path)
+            return table
+        if wanted is not None:
+            wanted |= set(table.column_names)
+    dataset = ds.dataset(path, format=fmt)
+    names = dataset.schema.names
+    table = dataset.to_table(columns=None if wanted is None else [c for c in names if c in wanted])
+    _table_cache[path] = (mtime, table, table.num_columns == len(names))
+    _table_cache.move_to_end(path)
+    while len(_table_cache) > _cache_months:
+        _table_cache.popitem(last=False)
+    return table
+
+
+def _write_month(path, fmt, frames, replace):
+    """
+    將多日資料合併寫入同一個月份檔案
+    replace: 要覆蓋的 (日期, 市場)，其他市場同一天的資料保留
+    """
+    if os.path.exists(path):
+        existing = _with_market(_read_file(path, fmt))
+        keys = pd.MultiIndex.from_frame(existing[[DATE_COL, MARKET_COL]])
+        existing = existing[~keys.isin(list(replace))]
+        frames = [existing] + frames
+    merged = pd.concat(frames, ignore_index=True)
+    merged = merged.sort_values([DATE_COL, '證券代號'], kind='stable').reset_index(drop=True)
+    _write_file(merged, path, fmt)
+    _month_dates_cache[path] = _keys(merged)
+    if _table_cache is not None:
+        _table_cache.pop(path, None)
+
+
+def write_day(date_str, df, store_dir=None, fmt=None, market=None):
+    """
+    寫入單日資料 (同日、同市場的資料會被覆蓋)
+    market: 市場 (預設沿用 df 的市場欄位，沒有時為 DEFAULT_MARKET)
+    """
+    store_dir, fmt = _resolve(store_dir, fmt)
+    path = month_path(date_str, store_dir, fmt)
+    df = normalize_frame(df, date_str, market)
+    _write_month(path, fmt, [df], _keys(df) or {(date_str, market or DEFAULT_MARKET)})
+    return path
+
+
+def write_range(df, store_dir=None, fmt=None):
+    """
+    寫入多日長格式資料 (含 Date 欄位，YYYYMMDD；可含市場欄位)，同一個月份的資料合併後寫入一次
+    回傳寫入的日期 (由舊到新)
+    """
+    store_dir, fmt = _resolve(store_dir, fmt)
+    df = normalize_frame(df)
+    dates = sorted(df[DATE_COL].unique())
+    for month, part in df.groupby(df[DATE_COL].str[:6], sort=True):
+        _write_month(month_path(part[DATE_COL].iloc[0], store_dir, fmt), fmt, [part], _keys(part))
+    return dates
+
+
+def has_day(date_str, store_dir=None, fmt=None, market=None):
+    """檢查指定日期是否已存在於資料庫 (market 指定時只檢查該市場)"""
+    store_dir, fmt = _resolve(store_dir, fmt)
+    keys = _month_dates(month_path(date_str, store_dir, fmt), fmt)
+    if market is not None:
+        return (date_str, market) in keys
+    return any(d == date_str for d, _ in keys)
+
+
+def read_day(date_str, columns=None, store_dir=None, fmt=None):
+    """讀取單日資料 (不含 Date 欄位)，不存在時回傳 None"""
+    df = load_range([date_str], columns=columns, store_dir=store_dir, fmt=fmt)
+    if df is None:
+        return None
+    return df.drop(columns=[DATE_COL])
+
+
+def available_dates(store_dir=None, fmt=None):
+    """列出資料庫中所有日期 (由舊到新)"""
+    store_dir, fmt = _resolve(store_dir, fmt)
+    pattern = os.path.join(store_dir, "year=*", "month=*", f"part.{_EXTENSIONS[fmt]}")
+    dates = set()
+    for path in glob.glob(pattern):
+        dates |= {d for d, _ in _month_dates(path, fmt)}
+    return sorted(dates)
+
+
+def load_table(dates, columns=None, store_dir=None, fmt=None, codes=None):
+    """
+    一次讀取多個日期的資料，回傳 pyarrow Table (未排序)
+    dates: 日期字串列表 (YYYYMMDD)
+    columns: 只讀取需要的欄位 (None 表示全部)，Date 與 證券代號 一律包含
+    codes: 只讀取指定的證券代號 (None 表示全部)
+    無資料時回傳 None
+    """
+    store_dir, fmt = _resolve(store_dir, fmt)
+    dates = sorted(set(dates))
+    paths = sorted({month_path(d, store_dir, fmt) for d in dates})
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return None
+
+    if columns is not None:
+        columns = list(dict.fromkeys([DATE_COL, '證券代號'] + list(columns)))
+    if _table_cache is not None:
+        table = _load_cached(paths, fmt, dates, columns, codes)
+    else:
+        # 合併各月份檔案的 schema (舊版檔案沒有市場欄位、新增的欄位只存在於較新的檔案)，缺少的欄位為 null
+        schema = pa.unify_schemas([ds.dataset(p, format=fmt).schema for p in paths])
+        dataset = ds.dataset(paths, format=fmt, schema=schema)
+        if columns is not None:
+            columns = [c for c in columns if c in dataset.schema.names]
+
+        row_filter = ds.field(DATE_COL).isin(dates)
+        if codes is not None:
+            row_filter = row_filter & ds.field('證券代號').isin(list(codes))
+        table = dataset.to_table(columns=columns, filter=row_filter)
+    if table.num_rows == 0:
+        return None
+    if MARKET_COL in table.column_names:
+        i = table.column_names.index(MARKET_COL)
+        table = table.set_column(i, MARKET_COL, pc.fill_null(table.column(i), DEFAULT_MARKET))
+    return table
+
+
+def _load_cached(paths, fmt, dates, columns, codes):
+    """load_table 的快取版本: 由記憶體中的月份 Table 篩選日期、股票與欄位 (結果與直接讀檔相同)"""
+    tables = [_cached_month(p, fmt, columns) for p in paths]
+    schema = pa.unify_schemas([t.schema for t in tables])
+    names = schema.names if columns is None else [c for c in columns if c in schema.names]
+    table = pa.concat_tables([t.select([c for c in names if c in t.column_names]) for t in tables],
+                             promote_options='default')
+    mask = pc.is_in(table.column(DATE_COL), value_set=pa.array(dates))
+    if codes is not None:
+        mask = pc.and_(mask, pc.is_in(table.column('證券代號'), value_set=pa.array(list(codes), pa.string())))
+    return table.filter(mask).select(names)
+
+
+def compact_table(table, dictionary=True):
+    """
+    轉為精簡型態: 價格 float32、數量整數 (缺值為 0)
+    dictionary: 代號/名稱/日期以 dictionary 編碼 (轉為 pandas 時為 category)
+    """
+    columns = []
+    for name, col in zip(table.column_names, table.columns):
+        if name in PRICE_COLS:
+            col = col.cast(pa.float32())
+        elif name in INT_COLS:
+            col = pc.fill_null(pc.if_else(pc.is_nan(col), 0.0, col), 0.0).cast(INT_COLS[name])
+        elif dictionary and (name == DATE_COL or name in TEXT_COLS):
+            col = col.dictionary_encode()
+        columns.append(col)
+    return pa.table(columns, names=table.column_names)
+
+
+def load_range(dates, columns=None, store_dir=None, fmt=None, codes=None, compact=None):
+    """
+    一次讀取多個日期的資料
+    compact: 使用精簡型態 (預設 settings.COMPACT_MEMORY)，代號/名稱/日期為已排序的 category
+    回傳依 Date, 證券代號 排序的長格式 DataFrame，無資料時回傳 None
+    """
+    table = load_table(dates, columns, store_dir, fmt, codes)
+    if table is None:
+        return None
+    table = table.sort_by([(DATE_COL, 'ascending'), ('證券代號', 'ascending')])
+    if not (COMPACT_MEMORY if compact is None else compact):
+        return table.to_pandas()
+    df = compact_table(table).to_pandas()
+    for col in [DATE_COL] + TEXT_COLS:
+        if col in df.columns:
+            df[col] = df[col].cat.reorder_categories(sorted(df[col].cat.categories), ordered=True)
+    return df
+
+
+def migrate_csv_dir(csv_dir=None, store_dir=None, fmt=None, remove=False):
+    """
+    將舊版 DATA_DIR/YYYYMMDD.csv 一次轉入欄式資料庫
+    同一個月份的 CSV 會合併後寫入一次
+    remove: 轉換成功後刪除原 CSV
+    """
+    csv_dir = csv_dir or DATA_DIR
+    store_dir, fmt = _resolve(store_dir, fmt)
+
+    by_month = {}
+    for path in sorted(glob.glob(os.path.join(csv_dir, "*.csv"))):
+        date_str = os.path.splitext(os.path.basename(path))[0]
+        if not re.fullmatch(r"\d{8}", date_str):
+            continue
+        by_month.setdefault(date_str[:6], []).append((date_str, path))
+
+    migrated = 0
+    for month, items in sorted(by_month.items()):
+        frames = []
+        for date_str, path in items:
+            # 代號需以字串讀入，否則 0050 會變成 50
+            df = pd.read_csv(path, dtype={c: str for c in TEXT_COLS})
+            frames.append(normalize_frame(df, date_str))
+        target = month_path(items[0][0], store_dir, fmt)
+        _write_month(target, fmt, frames, {(d, DEFAULT_MARKET) for d, _ in items})
+        migrated += len(items)
+        print(f"{month}: 已轉換 {len(items)} 天 -> {target}")
+
+        if remove:
+            for _, path in items:
+                os.remove(path)
+
+    print(f"轉換完成，共 {migrated} 天")
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="將每日 CSV 轉入欄式資料庫")
+    parser.add_argument("--csv-dir", default=DATA_DIR, help="CSV 所在目錄")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="資料庫目錄")
+    parser.add_argument("--format", default=STORE_FORMAT, choices=sorted(_EXTENSIONS))
+    parser.add_argument("--remove", action="store_true", help="轉換後刪除 CSV")
+    args = parser.parse_args()
+    migrate_csv_dir(args.csv_dir, args.store_dir, args.format, args.remove)
@@ -0,0 +1,81 @@
+import os
+import sys
+import glob
+import gzip
+import tempfile
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import archive
+from tw_stock_analyzer import store
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import http_client
+from tw_stock_analyzer.test_clean_data import FIELDS, ROWS, FakeResponse, FakeSession
+
+def payload(fields, rows):
+    return {'stat': 'OK', 'tables': [{'title': '每日收盤行情(全部)', 'fields': fields, 'data': rows}]}
+
+def test_archive_and_reingest():
+    print("Testing raw response archive and offline re-ingest...")
+    responses = {
+        '20250102': payload(FIELDS, ROWS),
+        # 證交所新增欄位: 目前的 schema 無法解析，但原始回應已封存
+        '20250103': payload(FIELDS + ['新欄位'], [row + ['1.5'] for row in ROWS]),
+        '20250203': payload(FIELDS, ROWS[:2]),
+    }
+    limiter = data_fetcher.TokenBucket(1000, 10)
+    original = (http_client._session, archive.ARCHIVE_DIR, store.STORE_DIR, dict(data_fetcher.QUOTE_SCHEMA))
+    with tempfile.TemporaryDirectory() as tmp:
+        archive.ARCHIVE_DIR = os.path.join(tmp, 'raw')
+        store.STORE_DIR = os.path.join(tmp, 'store')
+        http_client._session = FakeSession(lambda url: FakeResponse(responses[url.split('date=')[1][:8]]))
+        try:
+            for date_str in responses:
+                try:
+                    data_fetcher.save_daily_data(date_str, data_fetcher.fetch_daily_quotes(date_str, limiter))
+                except ValueError:
+                    assert date_str == '20250103'
+            assert archive.archived_dates() == ['20250102', '20250103', '20250203']
+            assert store.available_dates() == ['20250102', '20250203']
+
+            # 相同內容不重複寫入；內容不同時 index 指向新的一份
+            data_fetcher.fetch_daily_quotes('20250102', limiter)
+            assert len(glob.glob(os.path.join(tmp, 'raw', '2025', '20250102-*.json.gz'))) == 1
+            responses['20250102'] = payload(FIELDS, ROWS[1:])
+            data_fetcher.fetch_daily_quotes('20250102', limiter)
+            assert len(glob.glob(os.path.join(tmp, 'raw', '2025', '20250102-*.json.gz'))) == 2
+            assert len(archive.parse_archived('20250102')) == 2
+
+            expected = data_fetcher.parse_quotes(FIELDS, ROWS[:2])
+            # 由封存重建 (多個 process 並行解析)，不需重新下載；無法解析的日期略過
+            rebuilt = os.path.join(tmp, 'rebuilt')
+            assert archive.reingest(workers=2, store_dir=rebuilt) == ['20250102', '20250203']
+            # 更新 schema 後只重建格式變更的日期
+            data_fetcher.QUOTE_SCHEMA['新欄位'] = 'float'
+            assert archive.reingest('20250103', '20250103', workers=2, store_dir=rebuilt) == ['20250103']
+            df = store.load_range(['20250103'], store_dir=rebuilt, compact=False)
+            assert df['新欄位'].tolist() == [1.5, 1.5, 1.5]
+            got = store.load_range(['20250203'], store_dir=rebuilt, compact=False)
+            assert got['證券代號'].tolist() == expected['證券代號'].tolist()
+            assert got['收盤價'].tolist() == expected['收盤價'].tolist()
+
+            # 封存檔損毀時拋出 ValueError
+            entry = archive._load_index(archive.ARCHIVE_DIR)['20250203']
+            with gzip.open(archive.raw_path('20250203', entry['sha256']), 'wb') as f:
+                f.write(b'{}')
+            try:
+                archive.load('20250203')
+            except ValueError:
+                pass
+            else:
+                raise AssertionError("corrupted archive not detected")
+        finally:
+            http_client._session, archive.ARCHIVE_DIR, store.STORE_DIR, schema = original
+            data_fetcher.QUOTE_SCHEMA.clear()
+            data_fetcher.QUOTE_SCHEMA.update(schema)
+            archive._index_cache.clear()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_archive_and_reingest()
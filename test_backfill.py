@@ -0,0 +1,92 @@
+import os
+import sys
+import json
+import tempfile
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import store
+from tw_stock_analyzer import backfill
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer import markets
+
+def quotes(date_str):
+    return pd.DataFrame({'證券代號': ['2330', '2317'], '證券名稱': ['台積電', '鴻海'],
+                         '成交股數': [1000, 2000], '收盤價': [float(date_str[-2:]), 100.0]})
+
+def test_backfill_resumes_after_interruption():
+    print("Testing resumable backfill...")
+    requested = []
+    state = {'interrupt_at': '20250110', 'flaky': {'20250108': 1}}
+
+    def fake_fetch(date_str, limiter=None):
+        requested.append(date_str)
+        if date_str == state['interrupt_at']:
+            raise KeyboardInterrupt
+        if date_str == '20250101':
+            # 證交所回應無資料 -> 記錄休市日
+            trading_calendar.mark_closed(date_str, '休市')
+            return None
+        if state['flaky'].get(date_str, 0) > 0:
+            # 網路錯誤
+            state['flaky'][date_str] -= 1
+            return None
+        return quotes(date_str)
+
+    original = (store.STORE_DIR, trading_calendar.CALENDAR_PATH, data_fetcher.fetch_daily_quotes, markets.MARKETS)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = os.path.join(tmp, 'store')
+        trading_calendar.CALENDAR_PATH = os.path.join(tmp, 'calendar.json')
+        data_fetcher.fetch_daily_quotes = fake_fetch
+        markets.MARKETS = ['TWSE']
+        try:
+            # 資料庫已有的日期不會再下載
+            store.write_day('20250103', quotes('20250103'))
+
+            try:
+                backfill.run_backfill('20250101', '20250115', workers=1, directory=tmp)
+                assert False, "應在 20250110 中斷"
+            except KeyboardInterrupt:
+                pass
+            # 20250101 ~ 20250110 的交易日 (跳過週末與已有的 0103)，中斷後不再送出之後的請求
+            assert requested == ['20250101', '20250102', '20250106', '20250107', '20250108',
+                                 '20250109', '20250110']
+            path = backfill.checkpoint_path('20250101', '20250115', tmp)
+            with open(path, encoding='utf-8') as f:
+                saved = json.load(f)
+            assert saved['done'] == {'20250101': 'closed', '20250102': 'saved', '20250106': 'saved',
+                                     '20250107': 'saved', '20250109': 'saved'}
+            assert saved['failed'] == {'20250108': 1}
+
+            # 續傳: 只請求失敗與尚未完成的日期
+            requested.clear()
+            state['interrupt_at'] = None
+            checkpoint = backfill.run_backfill('20250101', '20250115', workers=1, directory=tmp)
+            assert requested == ['20250108', '20250110', '20250113', '20250114', '20250115']
+            assert not checkpoint.failed
+            assert store.available_dates() == ['20250102', '20250103', '20250106', '20250107',
+                                               '20250108', '20250109', '20250110', '20250113',
+                                               '20250114', '20250115']
+
+            # 再次執行不會送出任何請求
+            requested.clear()
+            backfill.run_backfill('20250101', '20250115', workers=1, directory=tmp)
+            assert requested == []
+
+            # 失敗達重試上限的日期會被略過
+            checkpoint = backfill.Checkpoint(backfill.checkpoint_path('20250116', '20250117', tmp),
+                                             '20250116', '20250117')
+            for _ in range(3):
+                checkpoint.record('20250116', 'failed')
+            pending, skipped = backfill.plan('20250116', '20250117', checkpoint, max_attempts=3)
+            assert pending == ['20250117'] and skipped == ['20250116']
+        finally:
+            store.STORE_DIR, trading_calendar.CALENDAR_PATH, data_fetcher.fetch_daily_quotes, markets.MARKETS = original
+    trading_calendar._cache.clear()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_backfill_resumes_after_interruption()
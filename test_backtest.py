@@ -0,0 +1,82 @@
+import os
+import sys
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import backtest
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import rules
+from tw_stock_analyzer.panel import Panel
+from tw_stock_analyzer.test_kd_batch import make_market
+
+def make_history(stocks=60, days=80, seed=11):
+    full_df = make_market(stocks=stocks, days=days, seed=seed)
+    rng = np.random.default_rng(seed)
+    full_df['開盤價'] = (full_df['收盤價'] * rng.uniform(0.9, 1.05, len(full_df))).round(2)
+    full_df['成交筆數'] = rng.integers(1, 600, len(full_df)).astype(float)
+    full_df['證券名稱'] = np.where(full_df['證券代號'] < '0010', '元大購' + full_df['證券代號'], '股票')
+    full_df.loc[full_df['證券代號'] < '0010', '證券代號'] = '03' + full_df['證券代號'] # 權證
+    return full_df
+
+def daily_screen(full_df, date_str, screen_rules):
+    """逐日執行初篩 (只使用當天以前的資料)"""
+    history = full_df[full_df['Date'] <= date_str]
+    panel = indicators.calculate_panel_indicators(Panel.from_frame(history))
+    latest = panel.latest_frame()
+    latest = latest[latest['Date'] == date_str]
+    passed, _ = rules.run_screen(latest, screen_rules, verbose=False)
+    return set(passed['證券代號'])
+
+def test_backtest_matches_daily_screen():
+    print("Testing vectorized backtest against day-by-day screening...")
+    full_df = make_history()
+    screen_rules = rules.SCREEN_RULES
+    result = backtest.run_backtest(horizons=[1, 5], panel=Panel.from_frame(full_df),
+                                   screen_rules=screen_rules)
+    panel = result.panel
+
+    assert result.signals.shape == panel.shape
+    assert result.signals.sum() > 0
+    for t in range(20, panel.shape[0], 7):
+        expected = daily_screen(full_df, panel.dates[t], screen_rules)
+        assert set(panel.codes[result.signals[t]]) == expected, panel.dates[t]
+
+    # 持有 5 日報酬 = 5 個交易日後收盤 / 當日收盤 - 1
+    trades = result.trades()
+    assert len(trades) == result.signals.sum()
+    row = trades.dropna(subset=['報酬_5日']).iloc[0]
+    t = list(panel.dates).index(row['Date'])
+    j = list(panel.codes).index(row['證券代號'])
+    assert np.isclose(row['報酬_5日'], panel['close'][t + 5, j] / panel['close'][t, j] - 1)
+
+    # 摘要與規則貢獻
+    assert list(result.summary['horizon']) == [1, 5]
+    assert (result.summary['signals'] == result.signals.sum()).all()
+    attribution = result.attribution
+    assert len(attribution) == len(screen_rules) * 2
+    assert (attribution['without_signals'] >= result.signals.sum()).all()
+    assert (attribution['solo_signals'] >= result.signals.sum()).all()
+    assert result.daily['signals'].sum() == result.signals.sum()
+    print("Test passed!")
+
+def test_backtest_with_macd_rule():
+    print("Testing backtest with the Stage-2 MACD rule...")
+    full_df = make_history(seed=12)
+    base = backtest.run_backtest(horizons=[5], panel=Panel.from_frame(full_df))
+    with_macd = backtest.run_backtest(horizons=[5], panel=Panel.from_frame(full_df),
+                                      screen_rules=list(rules.SCREEN_RULES) + ['macd_turn_positive'])
+    assert 'OSC_Prev' in with_macd.panel
+    assert not (with_macd.signals & ~base.signals).any()
+
+    # OSC_Prev 為該股前一個有資料日期的 OSC
+    panel = with_macd.panel
+    j = 5
+    rows = np.nonzero(panel.mask[:, j])[0]
+    assert np.array_equal(panel['OSC_Prev'][rows[1:], j], panel['OSC'][rows[:-1], j], equal_nan=True)
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_backtest_matches_daily_screen()
+    test_backtest_with_macd_rule()
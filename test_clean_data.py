@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import http_client
+
+FIELDS = list(data_fetcher.QUOTE_SCHEMA)
+
+ROWS = [
+    ['0050', '元大台灣50      ', '12,345,678', '8,765', '1,851,234,567', '150.05', '151.00', '149.50',
+     '150.85', '<p style= color:red>+</p>', '1.20', '150.80', '35', '150.85', '12', '0.00'],
+    ['2330', '台積電', '30,123,456', '45,678', '31,234,567,890', '1,035.00', '1,040.00', '1,025.00',
+     '1,030.00', '<p style= color:green>-</p>', '5.00', '1,030.00', '1,234', '1,035.00', '567', '25.31'],
+    ['030001', '元大購01', '0', '0', '0', '--', '--', '--', '--', '<p> </p>', '0.00', '--', '', '0.55', '10', '--'],
+]
+
+class FakeResponse:
+    status_code = 200
+    ok = True
+    headers = {}
+
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+    @property
+    def content(self):
+        return json.dumps(self.data, ensure_ascii=False).encode('utf-8')
+
+class FakeSession:
+    """取代 http_client 的共用 Session，handler(url) 回傳 FakeResponse"""
+    def __init__(self, handler):
+        self.handler = handler
+
+    def request(self, method, url, **kwargs):
+        return self.handler(url)
+
+def test_schema_parse_matches_generic():
+    print("Testing schema-driven quote parsing...")
+    df = data_fetcher.parse_quotes(FIELDS, ROWS)
+    generic = data_fetcher.clean_data_generic(pd.DataFrame(ROWS, columns=FIELDS))
+
+    assert list(df.columns) == FIELDS
+    assert df['證券名稱'].tolist() == ['元大台灣50', '台積電', '元大購01']
+    assert df['成交股數'].dtype == np.int64 and df['成交金額'].iloc[1] == 31234567890
+    assert df['收盤價'].dtype == np.float64 and df['收盤價'].iloc[1] == 1030.0
+    assert df['漲跌(+/-)'].tolist() == [1, -1, 0] and df['漲跌(+/-)'].dtype == np.int8
+    assert df['最後揭示買量'].tolist() == [35, 1234, 0] # 無資料視為 0
+    for col in ['成交股數', '開盤價', '最高價', '最低價', '收盤價', '漲跌價差', '最後揭示賣價', '本益比']:
+        assert np.array_equal(df[col].to_numpy(dtype=float), generic[col].to_numpy(), equal_nan=True), col
+
+    # clean_data 接受原始字串 DataFrame，結果相同
+    assert data_fetcher.clean_data(pd.DataFrame(ROWS, columns=FIELDS)).equals(df)
+    assert len(data_fetcher.parse_quotes(FIELDS, [])) == 0
+    print("Test passed!")
+
+def test_schema_drift_fails_loudly():
+    print("Testing schema drift detection...")
+    cases = [
+        (FIELDS + ['新欄位'], [row + ['1'] for row in ROWS]), # 新增欄位
+        (FIELDS[:-1], [row[:-1] for row in ROWS]),            # 缺少欄位
+        (FIELDS, ROWS[:1] + [ROWS[1][:-1]]),                  # 資料列欄位數不符
+        (FIELDS, [ROWS[0][:5] + ['abc'] + ROWS[0][6:]]),      # 無法解析的價格
+        (FIELDS, [ROWS[0][:2] + ['1.5'] + ROWS[0][3:]]),      # 成交股數不是整數
+    ]
+    for fields, rows in cases:
+        try:
+            data_fetcher.parse_quotes(fields, rows)
+        except ValueError as e:
+            print(f"  {e}")
+        else:
+            raise AssertionError(f"schema drift not detected: {fields[-1]}")
+
+    # fetch_daily_quotes 不吞掉格式錯誤 (網路錯誤仍回傳 None)
+    payload = {'stat': 'OK', 'tables': [{'title': '每日收盤行情(全部)', 'fields': FIELDS + ['新欄位'],
+                                         'data': [row + ['1'] for row in ROWS]}]}
+    original = http_client._session, data_fetcher.ARCHIVE_RAW
+    http_client._session = FakeSession(lambda url: FakeResponse(payload))
+    data_fetcher.ARCHIVE_RAW = False
+    try:
+        try:
+            data_fetcher.fetch_daily_quotes('20250102', limiter=data_fetcher.TokenBucket(1000, 10))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("fetch_daily_quotes swallowed schema drift")
+        payload['tables'][0].update(fields=FIELDS, data=ROWS)
+        df = data_fetcher.fetch_daily_quotes('20250102', limiter=data_fetcher.TokenBucket(1000, 10))
+        assert df['證券代號'].tolist() == ['0050', '2330', '030001']
+    finally:
+        http_client._session, data_fetcher.ARCHIVE_RAW = original
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_schema_parse_matches_generic()
+    test_schema_drift_fails_loudly()
@@ -0,0 +1,133 @@
+import io
+import os
+import sys
+import tempfile
+import subprocess
+from contextlib import redirect_stdout, redirect_stderr
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import cli
+from tw_stock_analyzer import settings
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import store
+from tw_stock_analyzer import history
+from tw_stock_analyzer import metrics
+from tw_stock_analyzer import indicator_state
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer.test_pipeline import write_market
+from tw_stock_analyzer.test_outbox import FakeTelegram, with_outbox
+
+HEAVY = ('numpy', 'pandas', 'pyarrow', 'yfinance')
+
+def loaded_modules(code):
+    """在新的 process 中執行 code，回傳已載入的大型套件"""
+    check = f"{code}; import sys; print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', check], cwd=cwd, capture_output=True, text=True, check=True)
+    return output.stdout.strip().split('\n')[-1]
+
+def test_heavy_imports_are_lazy():
+    print("Testing CLI startup imports...")
+    # --help 與通知不載入 pandas / yfinance
+    assert loaded_modules("from tw_stock_analyzer import cli; cli.build_parser().format_help()") == ""
+    assert loaded_modules("import tw_stock_analyzer.cli, tw_stock_analyzer.notifier, tw_stock_analyzer.outbox") == ""
+    # 分析流程只在實際向 yfinance 下載時才載入 yfinance
+    assert 'yfinance' not in loaded_modules("import tw_stock_analyzer.pipeline")
+    print("Test passed!")
+
+def test_report_format_is_checked_up_front():
+    print("Testing report format arguments...")
+    from tw_stock_analyzer import report
+    assert cli.REPORT_FORMATS == sorted(report.FORMATS)
+    # 不支援的格式在解析參數時即拒絕，不會先執行下載與分析
+    for argv in [['report', '--format', 'pdf'], ['run', '--report-format', 'pdf'], ['daemon', '--report-format', 'pdf']]:
+        stderr = io.StringIO()
+        try:
+            with redirect_stderr(stderr):
+                cli.main(argv)
+        except SystemExit as e:
+            assert e.code == 2
+        else:
+            raise AssertionError(argv)
+        assert "invalid choice: 'pdf'" in stderr.getvalue()
+    print("Test passed!")
+
+def test_fetch_command():
+    print("Testing fetch command...")
+    calls = []
+
+    def fake_download(dates, workers=None, markets=None, **kwargs):
+        calls.append((dates, workers, markets))
+        return {d: d != '20250107' for d in dates}
+
+    original = downloader.download_missing
+    downloader.download_missing = fake_download
+    try:
+        assert cli.main(['fetch', '--date', '20250106', '20250107', '--markets', 'twse, tpex']) == 0
+        assert calls == [(['20250106', '20250107'], None, ['TWSE', 'TPEX'])]
+        # 預設為最近的交易日
+        assert cli.main(['fetch']) == 0 and len(calls[1][0]) == 1 and calls[1][2] is None
+    finally:
+        downloader.download_missing = original
+    print("Test passed!")
+
+@with_outbox
+def test_notify_command(tmp):
+    print("Testing notify command...")
+    for name in ['stock_analysis_20250106.xlsx', 'stock_analysis_20250107.csv', 'stock_analysis_20250107_history.csv']:
+        with open(os.path.join(tmp, name), 'w') as f:
+            f.write(name)
+    assert cli.find_report('20250106', directory=tmp).endswith('stock_analysis_20250106.xlsx')
+    assert cli.find_report('20250105', directory=tmp) is None
+
+    server = FakeTelegram()
+    original = settings.REPORT_DIR
+    settings.REPORT_DIR, settings.TELEGRAM_API_URL = tmp, server.url
+    try:
+        # 預設送出最新的主要報表，並等待送出
+        assert cli.main(['notify', '--timeout', '5']) == 0
+        assert len(server.requests) == 1
+        method, request = server.requests[0]
+        assert method == 'sendDocument' and request['files'] == ['stock_analysis_20250107.csv']
+        assert '20250107' in request['caption']
+    finally:
+        settings.REPORT_DIR = original
+        server.close()
+
+def test_screen_command_logs_rule_counts():
+    print("Testing screen command output...")
+    end_date = '20250630'
+    original = (store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH, metrics.METRICS_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        downloader.download_missing = lambda dates, **kwargs: {}
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        metrics.METRICS_DIR = os.path.join(tmp, 'metrics')
+        history.STAGE2_BACKFILL = False
+        try:
+            write_market(trading_calendar.get_trading_days(45, end_date=end_date))
+            output = io.StringIO()
+            with redirect_stdout(output):
+                assert cli.main(['screen', '--date', end_date]) == 0
+            # 過去的日期不使用也不改寫指標狀態檔
+            assert not os.path.exists(indicator_state.STATE_PATH)
+        finally:
+            store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH, metrics.METRICS_DIR = original
+            history.STAGE2_BACKFILL = True
+            metrics.setup_logging(settings.LOG_LEVEL)
+    # 各模組以 logging 輸出的訊息 (例如各篩選條件的通過數) 顯示在主控台
+    text = output.getvalue()
+    assert "篩選 200 檔:" in text and "計算技術指標" in text
+    for name in settings.SCREEN_RULES:
+        name = name if isinstance(name, str) else name[0]
+        assert f"  {name}: 通過 " in text
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_heavy_imports_are_lazy()
+    test_report_format_is_checked_up_front()
+    test_fetch_command()
+    test_notify_command()
+    test_screen_command_logs_rule_counts()
@@ -0,0 +1,83 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import store
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import history
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import verify
+from tw_stock_analyzer import panel
+from tw_stock_analyzer.test_verify import FakeDownloader
+
+def test_stage2_uses_local_store_with_yfinance_fallback():
+    print("Testing local Stage-2 history provider...")
+    dates = history.lookback_dates('20250630', 60)
+    rng = np.random.default_rng(7)
+    close = (50 + np.cumsum(rng.normal(0, 1, (len(dates), 2)), axis=0)).round(2)
+
+    original_dir, original_download = store.STORE_DIR, verify.yf.download
+    fake = FakeDownloader()
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        verify.yf.download = fake
+        history.STAGE2_BACKFILL = False
+        try:
+            for i, d in enumerate(dates):
+                day = pd.DataFrame({'證券代號': ['2330', '1101'], '證券名稱': ['台積電', '台泥'],
+                                    '最高價': close[i] + 1, '最低價': close[i] - 1, '收盤價': close[i]})
+                if i == 10:
+                    day.loc[0, ['最高價', '最低價', '收盤價']] = np.nan # 停牌
+                if i < len(dates) - 20:
+                    day = day[day['證券代號'] == '2330'] # 1101 只有 20 天資料
+                store.write_day(d, day)
+
+            local = history.local_histories(['2330', '1101'], dates[-1], lookback_days=60, backfill=False)
+            assert local.groupby('證券代號').size().to_dict() == {'2330': 59, '1101': 20}
+            assert local['收盤價'].notna().all()
+
+            hist = verify.load_histories(['2330', '1101'], dates[-1], source='local')
+        finally:
+            store.STORE_DIR, verify.yf.download = original_dir, original_download
+            history.STAGE2_BACKFILL = True
+            history.STAGE2_BACKFILL = True
+
+    # 只有本地資料不足的 1101 向 yfinance 下載
+    assert fake.calls == [['1101.TW']]
+    assert set(hist['證券代號']) == {'2330', '1101'}
+
+    macd = verify.latest_macd(hist).set_index('證券代號')
+    # 本地資料以精簡型態 (float32 價格) 載入，還原後與逐檔計算結果相同
+    reference = local[local['證券代號'] == '2330'].copy()
+    for col in history.HISTORY_COLUMNS:
+        reference[col] = panel.as_float64(reference[col])
+    expected = indicators.calculate_macd(reference)
+    assert macd.loc['2330', 'OSC'] == expected['OSC'].iloc[-1]
+    print("Test passed!")
+
+def test_stage2_backfill_uses_pipeline_markets():
+    print("Testing Stage-2 backfill markets...")
+    calls = []
+    original_dir, original_download = store.STORE_DIR, downloader.download_missing
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        downloader.download_missing = lambda dates, **kwargs: calls.append(kwargs) or {}
+        try:
+            local = history.local_histories(['2330'], '20250630', lookback_days=5, backfill=True, markets=['TWSE'])
+            verify.load_histories([], '20250630', source='local', markets=['TWSE'])
+        finally:
+            store.STORE_DIR, downloader.download_missing = original_dir, original_download
+
+    # 只補足分析的市場 (例如 --markets TWSE 時不下載上櫃資料)
+    assert local.empty
+    assert [c['markets'] for c in calls] == [['TWSE'], ['TWSE']]
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_stage2_uses_local_store_with_yfinance_fallback()
+    test_stage2_backfill_uses_pipeline_markets()
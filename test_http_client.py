@@ -0,0 +1,110 @@
+import os
+import sys
+import gzip
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import http_client
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import trading_calendar
+
+class Handler(BaseHTTPRequestHandler):
+    """依路徑回傳預先排好的回應序列 (status, body)，並記錄每個請求使用的連線"""
+    protocol_version = 'HTTP/1.1' # keep-alive
+    script = {}
+    connections = []
+    gzipped = []
+
+    def do_GET(self):
+        Handler.connections.append(self.client_address)
+        queue = Handler.script.get(self.path.split('?')[0], [])
+        status, body, headers = queue.pop(0) if len(queue) > 1 else queue[0]
+        data = body.encode('utf-8')
+        self.send_response(status)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(data)
+            self.send_header('Content-Encoding', 'gzip')
+            Handler.gzipped.append(self.path)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+def test_retry_and_connection_reuse():
+    print("Testing pooled HTTP client with retry/backoff...")
+    ok = json.dumps({'stat': 'OK', 'tables': []})
+    no_data = json.dumps({'stat': '很抱歉，沒有符合條件的資料!'})
+    Handler.script = {
+        '/flaky': [(503, 'busy', {}), (200, ok, {})],
+        '/throttled': [(429, 'slow down', {'Retry-After': '0'}), (200, '<html>請求過於頻繁</html>', {}), (200, ok, {})],
+        '/nodata': [(200, no_data, {})],
+        '/down': [(503, 'busy', {})],
+        '/missing': [(404, 'not found', {})],
+    }
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    original = (http_client._session, http_client.RETRY_DELAY, data_fetcher.TWSE_URL, trading_calendar.mark_closed)
+    http_client._session = None
+    http_client.RETRY_DELAY = 0.01
+    closed = []
+    trading_calendar.mark_closed = lambda date_str, reason='', path=None: closed.append(date_str)
+    try:
+        # 5xx 與限流 (429、非 JSON 的阻擋頁面) 重試後成功
+        data, _ = http_client.get_json(base + '/flaky')
+        assert data['stat'] == 'OK'
+        data, _ = http_client.get_json(base + '/throttled')
+        assert data['stat'] == 'OK'
+        assert len(Handler.connections) == 5
+
+        # 重試用盡時拋出例外；4xx 不重試
+        count = len(Handler.connections)
+        try:
+            http_client.get_json(base + '/down', retries=2)
+        except http_client.requests.HTTPError:
+            pass
+        else:
+            raise AssertionError("exhausted retries should raise")
+        assert len(Handler.connections) == count + 3
+        response = http_client.request('GET', base + '/missing')
+        assert response.status_code == 404 and len(Handler.connections) == count + 4
+
+        # 「無資料」不重試，記錄休市；限流不會被誤判為休市
+        data_fetcher.TWSE_URL = base + '/nodata'
+        limiter = data_fetcher.TokenBucket(1000, 10)
+        assert data_fetcher.fetch_daily_quotes('20250101', limiter) is None
+        assert closed == ['20250101']
+        data_fetcher.TWSE_URL = base + '/down'
+        assert data_fetcher.fetch_daily_quotes('20250102', limiter) is None
+        assert closed == ['20250101']
+
+        # 所有請求共用同一條 keep-alive 連線，且以 gzip 傳輸
+        assert len(set(Handler.connections)) == 1
+        assert len(Handler.gzipped) == len(Handler.connections)
+    finally:
+        http_client._session, http_client.RETRY_DELAY, data_fetcher.TWSE_URL, trading_calendar.mark_closed = original
+        server.shutdown()
+        server.server_close()
+    print("Test passed!")
+
+def test_backoff_delay_has_jitter():
+    print("Testing exponential backoff with jitter...")
+    delays = [http_client.backoff_delay(attempt, base=1.0) for attempt in (1, 2, 3) for _ in range(50)]
+    for attempt, chunk in enumerate([delays[:50], delays[50:100], delays[100:]], start=1):
+        low, high = 0.5 * 2 ** (attempt - 1), 1.5 * 2 ** (attempt - 1)
+        assert all(low <= d <= high for d in chunk)
+        assert len(set(chunk)) > 1
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_retry_and_connection_reuse()
+    test_backoff_delay_has_jitter()
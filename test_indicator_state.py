@@ -0,0 +1,147 @@
+import os
+import sys
+import tempfile
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import indicator_state
+from tw_stock_analyzer import store
+from tw_stock_analyzer.panel import Panel
+from tw_stock_analyzer.indicator_state import IndicatorState
+from tw_stock_analyzer.test_kd_batch import make_market
+
+def test_incremental_state_matches_full_recompute():
+    print("Testing incremental indicator state...")
+    full_df = make_market(stocks=40, days=80, seed=4)
+    dates = sorted(full_df['Date'].unique())
+    history = full_df[full_df['Date'] < dates[-1]]
+    today = full_df[full_df['Date'] == dates[-1]]
+
+    # 以前 79 天建立狀態，存檔後讀回，再推進最後一天
+    state = IndicatorState.from_panel(Panel.from_frame(history))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'state.npz')
+        state.save(path)
+        state = IndicatorState.load(path)
+        assert IndicatorState.load(path, ma_days=20) is None
+    state.advance_frame(dates[-1], today)
+    result = state.latest_frame().sort_values('證券代號').reset_index(drop=True)
+
+    expected = indicators.calculate_screen_indicators(full_df.copy())
+    expected = indicators.calculate_macd_batch(expected)
+    expected['OSC_Prev'] = expected.sort_values('Date').groupby('證券代號')['OSC'].shift(1)
+    expected = expected[expected['Date'] == dates[-1]].sort_values('證券代號').reset_index(drop=True)
+
+    assert (result['證券代號'].to_numpy() == expected['證券代號'].to_numpy()).all()
+    for col in ['MA15_Vol', 'Max15_High', 'K', 'D', 'DIF', 'MACD', 'OSC', 'OSC_Prev']:
+        np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy(),
+                                   rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col)
+    assert result['OSC'].notna().any()
+    print("Test passed!")
+
+def test_state_kept_in_memory():
+    print("Testing in-memory indicator state...")
+    full_df = make_market(stocks=5, days=30, seed=1)
+    state = IndicatorState.from_panel(Panel.from_frame(full_df))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'state.npz')
+        assert indicator_state.get_state(path) is None
+        indicator_state._save_state(state, path)
+        # 狀態檔未改變: 使用記憶體中的狀態，不重新讀檔
+        assert indicator_state.get_state(path) is state
+        # 狀態檔被其他程式改寫: 重新讀取
+        other = IndicatorState.from_panel(Panel.from_frame(full_df[full_df['Date'] < full_df['Date'].max()]))
+        other.save(path)
+        os.utime(path, ns=(0, 0))
+        reloaded = indicator_state.get_state(path)
+        assert reloaded is not state and reloaded.last_date == other.last_date
+    indicator_state._cache.clear()
+    print("Test passed!")
+
+def test_late_market_is_not_skipped():
+    print("Testing indicator state with a market published late...")
+    full_df = make_market(stocks=20, days=60, seed=7)
+    # 後半段每個市場每天都有上市中的股票
+    dates = sorted(full_df['Date'].unique())[30:]
+    full_df = full_df[full_df['Date'].isin(dates)]
+    tpex = full_df['證券代號'] >= '0010'
+    original = (store.STORE_DIR, indicator_state.STATE_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        try:
+            for d in dates:
+                store.write_day(d, full_df[(full_df['Date'] == d) & ~tpex].drop(columns='Date'), market='TWSE')
+                if d != dates[-1]:
+                    store.write_day(d, full_df[(full_df['Date'] == d) & tpex].drop(columns='Date'), market='TPEX')
+
+            # 最後一天只有上市資料: 仍以上市資料分析，但狀態只保存到前一天
+            partial = indicator_state.update_daily(dates, markets=['TWSE', 'TPEX'])
+            assert set(partial['證券代號']) == set(full_df[(full_df['Date'] == dates[-1]) & ~tpex]['證券代號'])
+            assert IndicatorState.load().last_date == dates[-2]
+
+            # 上櫃資料稍後寫入: 推進最後一天時讀取兩個市場
+            store.write_day(dates[-1], full_df[(full_df['Date'] == dates[-1]) & tpex].drop(columns='Date'),
+                            market='TPEX')
+            result = indicator_state.update_daily(dates, markets=['TWSE', 'TPEX'])
+            assert IndicatorState.load().last_date == dates[-1]
+        finally:
+            store.STORE_DIR, indicator_state.STATE_PATH = original
+            store._month_dates_cache.clear()
+            indicator_state._cache.clear()
+
+    expected = IndicatorState.from_panel(Panel.from_frame(full_df)).latest_frame()
+    result = result.sort_values('證券代號').reset_index(drop=True)
+    expected = expected.sort_values('證券代號').reset_index(drop=True)
+    assert (result['證券代號'].to_numpy() == expected['證券代號'].to_numpy()).all()
+    assert tpex[full_df['證券代號'].isin(result['證券代號'])].any()
+    for col in ['MA15_Vol', 'Max15_High', 'K', 'D', 'OSC']:
+        np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy(),
+                                   rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=col)
+    # 部分市場的日期在記憶體中推進，不影響已保存的狀態
+    np.testing.assert_allclose(partial.sort_values('證券代號')['K'].to_numpy(),
+                               expected[~(expected['證券代號'] >= '0010')]['K'].to_numpy(), rtol=1e-9)
+    print("Test passed!")
+
+def test_market_missing_for_good_is_treated_as_closed():
+    print("Testing indicator state with a market that never publishes a day...")
+    full_df = make_market(stocks=20, days=60, seed=7)
+    dates = sorted(full_df['Date'].unique())[30:]
+    full_df = full_df[full_df['Date'].isin(dates)]
+    tpex = full_df['證券代號'] >= '0010'
+    gap = dates[-5] # 上櫃這一天一直沒有資料
+    original = (store.STORE_DIR, indicator_state.STATE_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        try:
+            for d in dates:
+                store.write_day(d, full_df[(full_df['Date'] == d) & ~tpex].drop(columns='Date'), market='TWSE')
+                if d != gap:
+                    store.write_day(d, full_df[(full_df['Date'] == d) & tpex].drop(columns='Date'), market='TPEX')
+            # 之後的日期都有完整資料: 狀態推進並保存到最後一天，不會每次執行都完整重算
+            indicator_state.update_daily(dates[:-1], markets=['TWSE', 'TPEX'])
+            assert IndicatorState.load().last_date == dates[-2]
+            result = indicator_state.update_daily(dates, markets=['TWSE', 'TPEX'])
+            assert IndicatorState.load().last_date == dates[-1]
+        finally:
+            store.STORE_DIR, indicator_state.STATE_PATH = original
+            store._month_dates_cache.clear()
+            indicator_state._cache.clear()
+
+    available = full_df[~((full_df['Date'] == gap) & tpex)]
+    expected = IndicatorState.from_panel(Panel.from_frame(available)).latest_frame()
+    result = result.sort_values('證券代號').reset_index(drop=True)
+    expected = expected.sort_values('證券代號').reset_index(drop=True)
+    assert (result['證券代號'].to_numpy() == expected['證券代號'].to_numpy()).all()
+    np.testing.assert_allclose(result['K'].to_numpy(), expected['K'].to_numpy(), rtol=1e-9)
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_incremental_state_matches_full_recompute()
+    test_state_kept_in_memory()
+    test_late_market_is_not_skipped()
+    test_market_missing_for_good_is_treated_as_closed()
@@ -0,0 +1,65 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+
+def make_market(stocks=40, days=60, seed=0):
+    """模擬長格式全市場資料：上市日不同、部分日期停牌、部分價格缺值 ('--')"""
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-01', periods=days).strftime('%Y%m%d')
+    frames = []
+    for i in range(stocks):
+        start = rng.integers(0, days // 2)
+        d = dates[start:]
+        d = d[rng.random(len(d)) > 0.1] # 停牌日沒有資料列
+        close = rng.uniform(10, 200, len(d)).round(2)
+        df = pd.DataFrame({
+            '證券代號': f"{i:04d}",
+            'Date': d,
+            '收盤價': close,
+            '最高價': (close + rng.uniform(0, 5, len(d))).round(2),
+            '最低價': (close - rng.uniform(0, 5, len(d))).round(2),
+            '成交股數': rng.integers(1000, 100000, len(d)).astype(float),
+        })
+        df.loc[rng.random(len(d)) < 0.05, '最高價'] = np.nan
+        frames.append(df)
+    full_df = pd.concat(frames, ignore_index=True)
+    # 打亂順序，確認批次計算不依賴輸入排序
+    return full_df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+def legacy_process_group(group):
+    group = group.sort_values('Date')
+    group['MA15_Vol'] = indicators.calculate_ma_volume(group, days=15).shift(1)
+    group['Max15_High'] = group['最高價'].rolling(window=15).max().shift(1)
+    group = indicators.calculate_kd(group)
+    return group
+
+def test_kd_batch_matches_legacy():
+    print("Testing batch KD against per-stock recursion...")
+    full_df = make_market()
+
+    expected = pd.concat([legacy_process_group(g) for _, g in full_df.groupby('證券代號')])
+    expected = expected.sort_values(['證券代號', 'Date']).reset_index(drop=True)
+
+    result = indicators.calculate_screen_indicators(full_df.copy())
+    result = result.sort_values(['證券代號', 'Date']).reset_index(drop=True)
+
+    for col in ['MA15_Vol', 'Max15_High', 'K', 'D']:
+        assert np.array_equal(expected[col].to_numpy(), result[col].to_numpy(), equal_nan=True), col
+
+    kd_only = indicators.calculate_kd_batch(full_df.copy())
+    kd_only = kd_only.sort_values(['證券代號', 'Date']).reset_index(drop=True)
+    assert np.array_equal(expected['K'].to_numpy(), kd_only['K'].to_numpy())
+
+    latest = indicators.latest_rows(result)
+    assert len(latest) == full_df['證券代號'].nunique()
+    assert (latest['Date'].to_numpy() == expected.groupby('證券代號')['Date'].max().to_numpy()).all()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_kd_batch_matches_legacy()
@@ -0,0 +1,46 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer.test_kd_batch import make_market
+
+def test_macd_batch_matches_legacy():
+    print("Testing batch MACD against per-stock calculate_macd...")
+    # 120 天: 部分股票資料不足 26 天 (全為 NaN)，其餘在不同日期開始有效
+    full_df = make_market(stocks=60, days=120, seed=1)
+    short = full_df['證券代號'] == '0000'
+    full_df = pd.concat([full_df[~short], full_df[short].head(20)], ignore_index=True)
+
+    expected = pd.concat([indicators.calculate_macd(g.sort_values('Date'))
+                          for _, g in full_df.groupby('證券代號')])
+    expected = expected.sort_values(['證券代號', 'Date']).reset_index(drop=True)
+
+    result = indicators.calculate_macd_batch(full_df.copy())
+    result = result.sort_values(['證券代號', 'Date']).reset_index(drop=True)
+
+    for col in ['DIF', 'MACD', 'OSC']:
+        assert np.array_equal(expected[col].to_numpy(), result[col].to_numpy(), equal_nan=True), col
+    assert result.loc[result['證券代號'] == '0000', 'OSC'].isna().all()
+    assert result['OSC'].notna().any()
+    print("Test passed!")
+
+def test_ema_2d_matches_custom_ema():
+    print("Testing ema_2d against calculate_custom_ema...")
+    rng = np.random.default_rng(2)
+    values = rng.uniform(10, 20, (80, 5))
+    values[:30, 1] = np.nan # 較晚開始有效
+    values[50, 2] = np.nan  # 中途缺值後重新起算
+    result = indicators.ema_2d(values, 12)
+    for j in range(values.shape[1]):
+        expected = indicators.calculate_custom_ema(pd.Series(values[:, j]), 12).to_numpy()
+        assert np.array_equal(expected, result[:, j], equal_nan=True), j
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_macd_batch_matches_legacy()
+    test_ema_2d_matches_custom_ema()
@@ -0,0 +1,143 @@
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import markets
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import store
+from tw_stock_analyzer import archive
+from tw_stock_analyzer import http_client
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer.rate_limiter import TokenBucket
+from tw_stock_analyzer.test_clean_data import FIELDS, ROWS, FakeResponse, FakeSession
+
+# 櫃買中心回應的欄位 (名稱含多餘空白，另有不使用的欄位)
+TPEX_FIELDS = ['代號', '名稱', '收盤 ', '漲跌', '開盤 ', '最高 ', '最低', '均價 ', '成交股數  ', '成交金額(元)',
+               '成交筆數 ', '最後買價', '最後買量(千股)', '最後賣價', '最後賣量(千股)', '發行股數 ',
+               '次日參考價 ', '次日漲停價', '次日跌停價']
+
+TPEX_ROWS = [
+    ['6488', '環球晶', '450.50', '+5.50', '446.00', '452.00', '445.00', '449.12', '1,234,567', '554,321,000',
+     '2,345', '450.00', '12', '450.50', '8', '478,000,000', '450.50', '495.50', '405.50'],
+    ['8069', '元太', '250.00', '-3.00', '253.00', '254.00', '249.50', '251.00', '5,678,901', '1,425,000,000',
+     '4,567', '250.00', '30', '250.50', '15', '1,140,000,000', '250.00', '275.00', '225.00'],
+    ['3105', '穩懋', '----', '---', '----', '----', '----', '----', '0', '0',
+     '0', '----', '0', '----', '0', '424,000,000', '180.00', '198.00', '162.00'],
+]
+
+def tpex_payload(rows):
+    return {'tables': [{'title': '上櫃股票行情', 'fields': TPEX_FIELDS, 'data': rows}], 'stat': 'ok'}
+
+def twse_payload(rows):
+    return {'stat': 'OK', 'tables': [{'title': '每日收盤行情(全部)', 'fields': FIELDS, 'data': rows}]}
+
+def test_tpex_quotes_normalized_to_schema():
+    print("Testing TPEx quote parsing...")
+    df = markets.parse_tpex_quotes(TPEX_FIELDS, TPEX_ROWS)
+    twse = data_fetcher.parse_quotes(FIELDS, ROWS)
+
+    # 欄位與型態和證交所相同，可寫入同一個資料庫
+    assert list(df.columns) == list(twse.columns)
+    assert (df.dtypes == twse.dtypes).all()
+    assert df['證券代號'].tolist() == ['6488', '8069', '3105']
+    assert df['成交股數'].tolist() == [1234567, 5678901, 0]
+    assert df['收盤價'].iloc[0] == 450.5 and np.isnan(df['收盤價'].iloc[2])
+    assert df['漲跌(+/-)'].tolist() == [1, -1, 0]
+    assert df['漲跌價差'].iloc[:2].tolist() == [5.5, 3.0] and np.isnan(df['漲跌價差'].iloc[2])
+    assert df['最後揭示買量'].tolist() == [12, 30, 0]
+    assert df['本益比'].isna().all()
+
+    # 缺少必要欄位時拋出 ValueError
+    try:
+        markets.parse_tpex_quotes([f for f in TPEX_FIELDS if f != '成交筆數 '], [])
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("missing TPEx field not detected")
+    print("Test passed!")
+
+def test_markets_download_concurrently_into_one_store():
+    print("Testing concurrent multi-market download...")
+    days = ['20250106', '20250107', '20250108', '20250109']
+    calls = []
+
+    def handler(url):
+        calls.append((time.monotonic(), 'TPEX' if 'tpex' in url else 'TWSE'))
+        if 'tpex' in url:
+            date_str = url.split('date=')[1][:10].replace('/', '')
+            return FakeResponse(tpex_payload([] if date_str == '20250108' else TPEX_ROWS))
+        return FakeResponse(twse_payload(ROWS))
+
+    sources = markets.SOURCES.values()
+    original = (http_client._session, store.STORE_DIR, archive.ARCHIVE_DIR, trading_calendar.CALENDAR_PATH,
+                [s.limiter for s in sources])
+    with tempfile.TemporaryDirectory() as tmp:
+        http_client._session = FakeSession(handler)
+        store.STORE_DIR = os.path.join(tmp, 'store')
+        archive.ARCHIVE_DIR = os.path.join(tmp, 'raw')
+        trading_calendar.CALENDAR_PATH = os.path.join(tmp, 'calendar.json')
+        # 每個市場各自的限速器: 每秒 5 次
+        for source in sources:
+            source.limiter = TokenBucket(5, 1)
+        try:
+            # 舊版資料 (沒有市場欄位) 視為證交所，只補下載上櫃
+            legacy = store.normalize_frame(data_fetcher.parse_quotes(FIELDS, ROWS), days[0])
+            legacy = legacy.drop(columns=[store.MARKET_COL])
+            store._write_file(legacy, store.month_path(days[0]), store.STORE_FORMAT)
+            store._month_dates_cache.clear()
+            assert store.has_day(days[0], market='TWSE') and not store.has_day(days[0], market='TPEX')
+
+            start = time.monotonic()
+            results = downloader.download_missing(days, workers=2, markets=['TWSE', 'TPEX'])
+            elapsed = time.monotonic() - start
+            assert results == {'20250106': True, '20250107': True, '20250108': False, '20250109': True}
+            assert sorted(m for _, m in calls) == ['TPEX'] * 4 + ['TWSE'] * 3
+
+            # 兩個市場同時下載: 總時間約等於單一市場 (3 次間隔)，而非依序下載的 6 次
+            assert elapsed < 1.0, elapsed
+
+            df = store.load_range(days, compact=False)
+            assert set(df[store.MARKET_COL]) == {'TWSE', 'TPEX'}
+            counts = df.groupby(['Date', store.MARKET_COL]).size()
+            assert counts[('20250106', 'TWSE')] == 3 and counts[('20250106', 'TPEX')] == 3
+            assert ('20250108', 'TPEX') not in counts.index
+            assert store.has_day('20250108', market='TWSE') and not store.has_day('20250108', market='TPEX')
+
+            # 覆寫單一市場不影響同一天另一個市場的資料
+            store.write_day('20250107', markets.parse_tpex_quotes(TPEX_FIELDS, TPEX_ROWS[:1]), market='TPEX')
+            day = store.read_day('20250107')
+            assert (day[store.MARKET_COL] == 'TPEX').sum() == 1 and (day[store.MARKET_COL] == 'TWSE').sum() == 3
+
+            # Panel 只包含數值欄位，上市與上櫃股票一起分析
+            panel = data_fetcher.load_panel(days, columns=data_fetcher.ANALYSIS_COLUMNS)
+            assert {'2330', '6488'} <= set(panel.codes)
+
+            # 上櫃原始回應封存於市場目錄，可與證交所一起重建
+            assert archive.archived_dates(market='TPEX') == ['20250106', '20250107', '20250109']
+            rebuilt = os.path.join(tmp, 'rebuilt')
+            assert archive.reingest(workers=1, store_dir=rebuilt) == days
+            got = store.load_range(days, store_dir=rebuilt, compact=False)
+            assert len(got[got[store.MARKET_COL] == 'TPEX']) == 9
+
+            # 已有資料的市場不再下載
+            calls.clear()
+            downloader.download_missing(days, workers=2, markets=['TWSE', 'TPEX'])
+            assert [m for _, m in calls] == ['TPEX']
+        finally:
+            http_client._session, store.STORE_DIR, archive.ARCHIVE_DIR, trading_calendar.CALENDAR_PATH, limiters = original
+            for source, limiter in zip(sources, limiters):
+                source.limiter = limiter
+            archive._index_cache.clear()
+            store._month_dates_cache.clear()
+    trading_calendar._cache.clear()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_tpex_quotes_normalized_to_schema()
+    test_markets_download_concurrently_into_one_store()
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import logging
+import time
+import tempfile
+import threading
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import metrics
+
+def test_run_metrics_and_json_logging():
+    print("Testing run metrics and structured logging...")
+    run = metrics.start_run("test")
+    assert metrics.current() is run
+
+    # 各模組以 metrics.incr 累計 (多執行緒)
+    threads = [threading.Thread(target=lambda: [metrics.incr('http_retries') for _ in range(1000)])
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert run.counters['http_retries'] == 4000
+
+    # 階段內配置的記憶體反映在峰值 (釋放後仍記錄峰值)
+    with run.stage('allocate') as stage:
+        data = np.ones(64 * 2**20 // 8)
+        time.sleep(4 * metrics.MEMORY_SAMPLE_INTERVAL)
+        del data
+    assert stage['wall'] >= 0 and stage['cpu'] >= 0
+    if metrics.rss() is not None:
+        assert stage['peak_rss_mb'] - metrics.rss() / 2**20 > 40
+
+    try:
+        with run.stage('fails'):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert 'fails' in run.stages
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = run.write(run.path(tmp))
+        with open(path, encoding='utf-8') as f:
+            saved = json.load(f)
+        assert saved['counters'] == {'http_retries': 4000}
+        assert list(saved['stages']) == ['allocate', 'fails']
+
+        # JSON 日誌: extra 欄位成為獨立欄位
+        log_path = os.path.join(tmp, 'run.log.jsonl')
+        metrics.setup_logging("INFO", log_path)
+        log = logging.getLogger('tw_stock_analyzer.data_fetcher')
+        log.info("正在抓取 20250102 的資料...", extra={'event': 'fetch', 'date': '20250102'})
+        log.debug("不輸出")
+        metrics.setup_logging("WARNING") # 關閉檔案
+        with open(log_path, encoding='utf-8') as f:
+            entries = [json.loads(line) for line in f]
+        assert len(entries) == 1
+        assert entries[0]['event'] == 'fetch' and entries[0]['date'] == '20250102'
+        assert entries[0]['logger'] == 'tw_stock_analyzer.data_fetcher'
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_run_metrics_and_json_logging()
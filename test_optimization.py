@@ -1,35 +1,11 @@
 import time
-import pandas as pd
-import numpy as np
 import sys
 import os
 # Add parent directory to path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from tw_stock_analyzer import indicators
-
-def generate_mock_data(stocks=100, days=100):
-    print(f"Generating mock data ({stocks} stocks, {days} days)...")
-    data_list = []
-    codes = [f"{i:04d}" for i in range(stocks)]
-    dates = pd.date_range(end=pd.Timestamp.now(), periods=days)
-    
-    for code in codes:
-        df = pd.DataFrame({
-            '證券代號': code,
-            'Date': dates,
-            '收盤價': np.random.uniform(10, 200, days),
-            '最高價': np.random.uniform(10, 200, days),
-            '最低價': np.random.uniform(10, 200, days),
-            '成交股數': np.random.randint(1000, 100000, days)
-        })
-        # Fix High/Low
-        df['最高價'] = np.maximum(df['收盤價'], df['最高價'])
-        df['最低價'] = np.minimum(df['收盤價'], df['最低價'])
-        data_list.append(df)
-        
-    full_df = pd.concat(data_list, ignore_index=True)
-    return full_df
+from tw_stock_analyzer.benchmark import generate_mock_data
 
 def test_legacy_speed(full_df):
     print("Benchmarking Legacy (Groupby Apply)...")
@@ -80,6 +56,29 @@ def test_vectorized_speed(full_df):
     print(f"Vectorized Logic Time: {duration:.4f} seconds")
     return duration
 
+# 單元測試只比對在同一個 process 內執行的資料處理階段 (讀取、指標、篩選)；
+# startup (啟動新的 python process) 與 sharded (process pool) 由 benchmark 命令列執行
+PARITY_STAGES = ['json_parse', 'clean_data', 'store_load', 'kd', 'macd', 'ma_high', 'screen']
+
+def test_benchmark_suite_parity():
+    print("Testing benchmark suite (tiny scale)...")
+    import json
+    import tempfile
+    from tw_stock_analyzer import benchmark
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, 'results.json')
+        data = benchmark.run_suite({'tiny': (120, 60, 40)}, stages=PARITY_STAGES, sample=30, output=output)
+        with open(output, encoding='utf-8') as f:
+            saved = json.load(f)
+
+    assert [row['stage'] for row in saved['results']] == PARITY_STAGES
+    assert all(row['parity'] for row in data['results'])
+    assert all(row['seconds'] >= 0 for row in saved['results'])
+    ratios = benchmark.compare(saved, data)
+    assert len(ratios) == len(PARITY_STAGES)
+    print("Test passed!")
+
 if __name__ == "__main__":
     # Simulate 2000 stocks (typical TWSE) over 60 days
     full_df = generate_mock_data(stocks=2000, days=60)
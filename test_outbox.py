@@ -0,0 +1,207 @@
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import threading
+from urllib.parse import parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import settings
+from tw_stock_analyzer import notifier
+from tw_stock_analyzer import outbox
+
+TOKEN = "123:test-token"
+CHAT_ID = "42"
+
+class FakeTelegram:
+    """
+    本機的 Telegram Bot API 替代伺服器
+    statuses: 依序回應的狀態碼 (用完後回應 200)；429 時回傳 retry_after
+    requests: 收到的請求 [(method, {'text'/'caption': ..., 'files': [...], 'size': n})]
+    """
+    def __init__(self, statuses=(), delay=0, retry_after=1):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.retry_after = retry_after
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                token, method = self.path.strip('/').split('/')
+                assert token == f"bot{TOKEN}"
+                time.sleep(fake.delay)
+                status = fake.statuses.pop(0) if fake.statuses else 200
+                if status == 200:
+                    fake.requests.append((method, fake._parse(body, self.headers['Content-Type'])))
+                payload = {'ok': status == 200}
+                if status == 429:
+                    payload['parameters'] = {'retry_after': fake.retry_after}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @staticmethod
+    def _parse(body, content_type):
+        if content_type.startswith('application/x-www-form-urlencoded'):
+            return {k: v[0] for k, v in parse_qs(body.decode('utf-8')).items()}
+        # multipart (sendDocument): 只取出 caption 與檔名
+        text = body.decode('utf-8', errors='replace')
+        caption = re.search(r'name="caption"\r\n\r\n(.*?)\r\n--', text, re.S)
+        return {'caption': caption.group(1) if caption else '', 'files': re.findall(r'filename="([^"]+)"', text),
+                'size': len(body)}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def with_outbox(test):
+    """以暫存的佇列資料庫與測試用設定執行 test(path)"""
+    def run():
+        original = (settings.TELEGRAM_BOT_TOKEN, settings.TELEGRAM_CHAT_ID, settings.TELEGRAM_API_URL,
+                    outbox.OUTBOX_PATH, outbox.OUTBOX_RETRY_DELAY, outbox.TELEGRAM_MESSAGES_PER_SECOND)
+        with tempfile.TemporaryDirectory() as tmp:
+            settings.TELEGRAM_BOT_TOKEN, settings.TELEGRAM_CHAT_ID = TOKEN, CHAT_ID
+            outbox.OUTBOX_PATH = os.path.join(tmp, 'outbox.sqlite3')
+            outbox.OUTBOX_RETRY_DELAY = 0.01
+            outbox.TELEGRAM_MESSAGES_PER_SECOND = 1000
+            outbox._limiters.clear()
+            try:
+                test(tmp)
+            finally:
+                (settings.TELEGRAM_BOT_TOKEN, settings.TELEGRAM_CHAT_ID, settings.TELEGRAM_API_URL,
+                 outbox.OUTBOX_PATH, outbox.OUTBOX_RETRY_DELAY, outbox.TELEGRAM_MESSAGES_PER_SECOND) = original
+                outbox._limiters.clear()
+        print("Test passed!")
+    run.__name__ = test.__name__
+    return run
+
+@with_outbox
+def test_retries_with_backoff_and_retry_after(tmp):
+    print("Testing outbox retries...")
+    server = FakeTelegram(statuses=[503, 429], retry_after=1)
+    settings.TELEGRAM_API_URL = server.url
+    try:
+        assert notifier.send_message("hello")
+        assert server.requests == [] # 只加入佇列，尚未送出
+
+        # 503: 指數退避後重試
+        assert outbox.drain() == 0
+        assert outbox.status()['pending'] == 1
+        # 429: 依伺服器要求等待 retry_after 秒
+        assert outbox.drain(now=time.time() + 1) == 0
+        assert outbox.drain() == 0 and not server.requests
+        assert outbox.next_due() >= time.time() + 0.5
+
+        assert outbox.drain(now=time.time() + 2) == 1
+        assert server.requests == [('sendMessage', {'chat_id': CHAT_ID, 'text': 'hello'})]
+        assert outbox.status() == {'pending': 0, 'sent': 1, 'failed': 0}
+    finally:
+        server.close()
+
+@with_outbox
+def test_batching_and_splitting(tmp):
+    print("Testing outbox batching and splitting...")
+    server = FakeTelegram()
+    settings.TELEGRAM_API_URL = server.url
+    original = outbox.MAX_DOCUMENT_BYTES
+    outbox.MAX_DOCUMENT_BYTES = 10
+    try:
+        # 同一個 chat 連續的文字訊息合併為一則
+        for text in ["第一則", "第二則", "第三則"]:
+            notifier.send_message(text)
+        assert outbox.drain() == 3
+        assert server.requests == [('sendMessage', {'chat_id': CHAT_ID, 'text': "第一則\n\n第二則\n\n第三則"})]
+
+        # 超過長度限制的文字拆成多則 (不會再合併超過限制)
+        server.requests.clear()
+        assert outbox.enqueue_message("a" * 5000, CHAT_ID) == 2
+        assert outbox.drain() == 2
+        assert [len(r['text']) for _, r in server.requests] == [4096, 904]
+
+        # 超過大小限制的檔案拆成多個，caption 超過限制的部分接在檔案後以文字送出
+        server.requests.clear()
+        path = os.path.join(tmp, 'report.csv')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 25)
+        caption = "\n".join(["報告"] * 400) # 1199 字
+        assert notifier.send_telegram_report(path, caption)
+        os.remove(path) # 檔案內容已存入佇列
+        assert outbox.drain() == 4
+        methods = [m for m, _ in server.requests]
+        assert methods == ['sendDocument'] * 3 + ['sendMessage']
+        assert [r['files'] for _, r in server.requests[:3]] == [['report.csv.001'], ['report.csv.002'],
+                                                                  ['report.csv.003']]
+        first = server.requests[0][1]['caption']
+        assert len(first) <= outbox.MAX_CAPTION_CHARS and server.requests[1][1]['caption'] == ''
+        assert first + "\n" + server.requests[3][1]['text'] == caption
+    finally:
+        outbox.MAX_DOCUMENT_BYTES = original
+        server.close()
+
+@with_outbox
+def test_outage_keeps_queue_and_order(tmp):
+    print("Testing outbox persistence across outage...")
+    server = FakeTelegram()
+    server.close() # 伺服器無法連線
+    settings.TELEGRAM_API_URL = server.url
+    notifier.send_message("1")
+    notifier.send_message("2")
+    assert outbox.drain() == 0
+    assert outbox.status()['pending'] == 2
+
+    # 通知保存在磁碟上: 恢復連線後 (例如下次執行) 依序送出
+    server = FakeTelegram()
+    settings.TELEGRAM_API_URL = server.url
+    try:
+        assert outbox.drain(now=time.time() + 60) == 2
+        assert server.requests == [('sendMessage', {'chat_id': CHAT_ID, 'text': "1\n\n2"})]
+
+        # 4xx 重試也不會成功: 直接標記為失敗，可手動重新加入佇列
+        server.statuses = [400]
+        notifier.send_message("3")
+        assert outbox.drain() == 0
+        assert outbox.status() == {'pending': 0, 'sent': 2, 'failed': 1}
+        assert outbox.retry_failed() == 1 and outbox.drain() == 1
+        assert server.requests[-1][1]['text'] == "3"
+    finally:
+        server.close()
+
+@with_outbox
+def test_worker_sends_in_background(tmp):
+    print("Testing outbox worker...")
+    server = FakeTelegram(delay=0.3)
+    settings.TELEGRAM_API_URL = server.url
+    try:
+        worker = outbox.start_worker()
+        # 加入佇列不等待伺服器回應
+        start = time.monotonic()
+        assert notifier.send_message("背景送出")
+        assert time.monotonic() - start < 0.2
+        # 結束時等待送完
+        assert worker.stop(5) == 0
+        assert server.requests == [('sendMessage', {'chat_id': CHAT_ID, 'text': "背景送出"})]
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    test_retries_with_backoff_and_retry_after()
+    test_batching_and_splitting()
+    test_outage_keeps_queue_and_order()
+    test_worker_sends_in_background()
@@ -0,0 +1,60 @@
+import os
+import sys
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer.panel import Panel
+from tw_stock_analyzer.test_kd_batch import make_market
+
+def test_panel_indicators_match_long_format():
+    print("Testing Panel indicators against long-format batch...")
+    full_df = make_market(stocks=50, days=60, seed=3)
+    full_df['證券名稱'] = '名稱' + full_df['證券代號']
+
+    panel = Panel.from_frame(full_df)
+    assert panel.shape == (full_df['Date'].nunique(), full_df['證券代號'].nunique())
+    assert panel.mask.sum() == len(full_df)
+    assert np.array_equal(panel['close'], panel['收盤價'], equal_nan=True)
+
+    # compact / expand 可互相還原
+    close = panel['close']
+    assert np.array_equal(panel.expand(panel.compact(close)), close, equal_nan=True)
+
+    indicators.calculate_panel_indicators(panel)
+    expected = indicators.calculate_screen_indicators(full_df.copy())
+    expected = expected.sort_values(['Date', '證券代號']).reset_index(drop=True)
+    result = panel.to_frame()
+
+    assert (result['證券代號'].to_numpy() == expected['證券代號'].to_numpy()).all()
+    for col in ['MA15_Vol', 'Max15_High', 'K', 'D']:
+        assert np.array_equal(expected[col].to_numpy(), result[col].to_numpy(), equal_nan=True), col
+
+    latest = panel.latest_frame()
+    expected_latest = indicators.latest_rows(expected)
+    assert (latest['Date'].to_numpy() == expected_latest['Date'].to_numpy()).all()
+    assert np.array_equal(latest['K'].to_numpy(), expected_latest['K'].to_numpy())
+    assert (latest['證券名稱'] == '名稱' + latest['證券代號']).all()
+    print("Test passed!")
+
+def test_compact_panel_matches_float64():
+    print("Testing compact (float32) Panel...")
+    full_df = make_market(stocks=50, days=60, seed=4) # 價格為小數兩位
+    compact_df = full_df.astype({c: np.float32 for c in ['收盤價', '最高價', '最低價']})
+    compact_df['證券代號'] = compact_df['證券代號'].astype('category')
+
+    panel = indicators.calculate_panel_indicators(Panel.from_frame(full_df))
+    compact = indicators.calculate_panel_indicators(Panel.from_frame(compact_df))
+    assert compact.fields['收盤價'].dtype == np.float32
+    assert compact['close'].dtype == np.float64
+    assert np.array_equal(compact['close'], panel['close'], equal_nan=True)
+    for field in ['MA15_Vol', 'Max15_High', 'K', 'D']:
+        assert np.array_equal(compact[field], panel[field], equal_nan=True), field
+    assert compact.nbytes < panel.nbytes
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_panel_indicators_match_long_format()
+    test_compact_panel_matches_float64()
@@ -0,0 +1,137 @@
+import os
+import sys
+import json
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import store
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import history
+from tw_stock_analyzer import indicator_state
+from tw_stock_analyzer import pipeline
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer import metrics
+
+def write_market(dates, n=200, seed=3):
+    rng = np.random.default_rng(seed)
+    codes = [f"{i:04d}" for i in range(n)]
+    price = rng.uniform(10, 100, n)
+    for d in dates:
+        price = price * rng.uniform(0.95, 1.06, n)
+        o = price * rng.uniform(0.97, 1.0, n)
+        store.write_day(d, pd.DataFrame({
+            '證券代號': codes, '證券名稱': ['名稱' + c for c in codes],
+            '成交股數': rng.integers(1000, 100000, n), '成交筆數': rng.integers(10, 600, n),
+            '成交金額': 1.0, '開盤價': o.round(2), '最高價': (price * 1.01).round(2),
+            '最低價': (o * 0.99).round(2), '收盤價': price.round(2), '漲跌價差': 0.1, '本益比': 10.0}))
+
+def test_pipeline_stages_and_modes():
+    print("Testing shared analysis pipeline...")
+    end_date = '20250630'
+    dates = trading_calendar.get_trading_days(45, end_date=end_date)
+    events = []
+    downloads = []
+
+    def fake_download(dates, progress=None, markets=None, **kwargs):
+        downloads.append(markets)
+        for i in range(len(dates)):
+            progress(i + 1, len(dates))
+        return {}
+
+    original = (store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        downloader.download_missing = fake_download
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        history.STAGE2_BACKFILL = False
+        try:
+            write_market(dates)
+            log_path = os.path.join(tmp, 'run.log.jsonl')
+            metrics.setup_logging("INFO", log_path)
+            # 資料庫只有上市資料: 只分析上市市場時每天都有完整資料，指標狀態保存至最後一天
+            incremental = pipeline.AnalysisPipeline(
+                incremental=True, write_report=False, markets=['TWSE'],
+                on_progress=lambda *args: events.append(args)).run(end_date)
+            assert indicator_state.IndicatorState.load().last_date == end_date
+            full = pipeline.AnalysisPipeline(
+                incremental=False, write_report=False, keep_intermediate=True).run(end_date)
+            metrics.setup_logging() # 關閉檔案
+            with open(log_path, encoding='utf-8') as f:
+                logged = [json.loads(line)['event'] for line in f]
+        finally:
+            store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH = original
+            history.STAGE2_BACKFILL = True
+
+    assert downloads == [['TWSE'], None]
+    # 每個階段依序 start -> end，下載進度在 load 階段內回報，整體進度遞增至 1
+    starts = [stage for stage, event, _ in events if event == 'start']
+    assert starts == pipeline.STAGES
+    assert sum(event == 'progress' for _, event, _ in events) == len(dates)
+    fractions = [info['fraction'] for _, _, info in events]
+    assert fractions == sorted(fractions) and abs(fractions[-1] - 1) < 1e-9
+    assert set(incremental.timings) == set(pipeline.STAGES)
+    # 各階段的訊息 (指標狀態、篩選、複篩) 以 logging 輸出
+    for event in ['check_days', 'state_rebuild', 'screen', 'rule', 'stage1_passed', 'macd_verify', 'stage2_passed']:
+        assert event in logged, event
+
+    # 執行紀錄: 各階段 wall/CPU 時間與記憶體峰值，以及篩選各階段的檔數
+    summary = full.metrics.to_dict()
+    assert set(summary['stages']) == set(pipeline.STAGES)
+    assert all(stage['wall'] >= 0 and stage['cpu'] >= 0 for stage in summary['stages'].values())
+    counters = summary['counters']
+    # 載入筆數 = 初篩的 Panel + 複篩候選股的歷史資料
+    assert counters['screened'] == 200
+    assert counters['rows_loaded'] == 200 * len(dates) + counters['history_rows']
+    assert counters['stage1_passed'] == len(full.stage1_df)
+    assert counters['stage2_passed'] == len(full.final_df)
+
+    # 增量狀態與 Panel 完整計算的篩選結果相同
+    assert incremental.today_date == full.today_date == end_date
+    assert len(incremental.stage1_df) > 0
+    assert set(incremental.stage1_df['證券代號']) == set(full.stage1_df['證券代號'])
+    assert set(incremental.final_df['證券代號']) == set(full.final_df['證券代號'])
+    assert incremental.rule_counts.equals(full.rule_counts)
+    assert incremental.report_path is None
+
+    # 中間資料只在 keep_intermediate=True 時保留
+    assert incremental.frames == {}
+    assert set(full.frames) == {'panel', 'histories'}
+    assert full.frames['panel'].dates[-1] == end_date
+    print("Test passed!")
+
+def test_stock_missing_on_last_day():
+    print("Testing incremental and panel paths with a stock missing on the last day...")
+    end_date = '20250630'
+    dates = trading_calendar.get_trading_days(45, end_date=end_date)
+    original = (store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR = tmp
+        downloader.download_missing = lambda dates, **kwargs: {}
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        try:
+            write_market(dates)
+            # 0000 最後一天不在行情表中 (例如下市)
+            last = store.read_day(end_date)
+            store.write_day(end_date, last[last['證券代號'] != '0000'], market='TWSE')
+            results = [pipeline.AnalysisPipeline(incremental=incremental, write_report=False, markets=['TWSE'])
+                       .run(end_date) for incremental in (True, False)]
+        finally:
+            store.STORE_DIR, downloader.download_missing, indicator_state.STATE_PATH = original
+            store._month_dates_cache.clear()
+            indicator_state._cache.clear()
+
+    # 兩種計算方式篩選相同的股票 (只有最後一天有資料的股票)
+    incremental, full = [set(r.latest_df['證券代號'].astype(str)) for r in results]
+    assert incremental == full and len(full) == 199 and '0000' not in full
+    assert (results[1].latest_df['Date'] == end_date).all()
+    # 市場欄位傳到初篩結果 (Stage 2 以市場決定 yfinance 代號)
+    assert all((r.latest_df['市場'] == 'TWSE').all() for r in results)
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_pipeline_stages_and_modes()
+    test_stock_missing_on_last_day()
@@ -0,0 +1,39 @@
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer.rate_limiter import TokenBucket
+
+def test_token_bucket_never_exceeds_rate():
+    print("Testing token bucket rate limiter...")
+    rate = 20.0
+    bucket = TokenBucket(rate, capacity=1)
+    stamps = []
+
+    def worker(_):
+        bucket.acquire()
+        stamps.append(time.monotonic())
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(worker, range(11)))
+    elapsed = time.monotonic() - start
+
+    # 第一個請求立即通過，其後每個請求間隔 1/rate 秒
+    print(f"11 requests took {elapsed:.3f}s")
+    assert elapsed >= 10 / rate * 0.95
+    assert elapsed < 10 / rate + 0.5
+
+    stamps.sort()
+    gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+    assert min(gaps) >= 1 / rate * 0.8
+
+    assert not bucket.try_acquire()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_token_bucket_never_exceeds_rate()
@@ -0,0 +1,123 @@
+import os
+import sys
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import report
+from tw_stock_analyzer import store
+from tw_stock_analyzer import indicator_state
+
+def make_candidates():
+    return pd.DataFrame({
+        'K': [80.5, 75.0, 66.1],
+        '證券名稱': ['台積電', '鴻海', '元太'],
+        '收盤價': np.array([1030.0, np.nan, 250.0], dtype=np.float32),
+        '證券代號': pd.Categorical(['2330', '2317', '8069']),
+        '成交股數': np.array([30123456, 0, 5678901], dtype=np.int64),
+    })
+
+def make_histories(codes, days=40):
+    rng = np.random.default_rng(0)
+    dates = pd.bdate_range('2025-01-01', periods=days).strftime('%Y%m%d')
+    frames = []
+    for code in codes:
+        close = 100 + rng.normal(0, 1, days).cumsum()
+        frames.append(pd.DataFrame({'證券代號': code, 'Date': dates, '最高價': close + 1,
+                                    '最低價': close - 1, '收盤價': close}))
+    return pd.concat(frames, ignore_index=True)
+
+def test_report_formats_and_sheets():
+    print("Testing streaming report writer...")
+    df = make_candidates()
+    counts = pd.DataFrame({'rule': ['red_candle', 'kd_golden_cross'], 'passed': [10, 5], 'remaining': [10, 3]})
+    histories = make_histories(['2330', '8069', '9999'])
+
+    original = (report.REPORT_DIR, report.REPORT_CHUNK_ROWS)
+    with tempfile.TemporaryDirectory() as tmp:
+        report.REPORT_DIR = tmp
+        report.REPORT_CHUNK_ROWS = 2 # 逐段寫入 (每段 2 列)
+        try:
+            # xlsx: 多個工作表，重要欄位在前，缺值為空白儲存格
+            from openpyxl import load_workbook
+            path = report.generate_report(df, '20250630', rule_counts=counts, histories=histories, fmt='xlsx')
+            assert path == os.path.join(tmp, 'stock_analysis_20250630.xlsx')
+            workbook = load_workbook(path)
+            assert workbook.sheetnames == ['候選股', '篩選統計', '指標歷史']
+            rows = list(workbook['候選股'].values)
+            assert rows[0] == ('證券代號', '證券名稱', '成交股數', '收盤價', 'K')
+            assert rows[1] == ('2330', '台積電', 30123456, 1030.0, 80.5)
+            assert rows[2][3] is None and len(rows) == 4
+            assert [r[0] for r in list(workbook['篩選統計'].values)[1:]] == ['red_candle', 'kd_golden_cross']
+            history = list(workbook['指標歷史'].values)
+            assert history[0] == ('證券代號', 'Date', '最高價', '最低價', '收盤價', 'K', 'D', 'DIF', 'MACD', 'OSC')
+            # 只有候選股，每檔最近 REPORT_HISTORY_DAYS 天
+            assert [r[0] for r in history[1:]] == ['2330'] * 30 + ['8069'] * 30
+            assert history[-1][1] == histories['Date'].iloc[-1]
+
+            # csv / parquet: 每個工作表一個檔案，內容與 xlsx 相同
+            path = report.generate_report(df, '20250630', rule_counts=counts, histories=histories, fmt='csv')
+            got = pd.read_csv(path, dtype={'證券代號': str})
+            assert got['證券代號'].tolist() == ['2330', '2317', '8069'] and np.isnan(got['收盤價'].iloc[1])
+            hist = pd.read_csv(os.path.join(tmp, 'stock_analysis_20250630_history.csv'), dtype={'證券代號': str})
+            assert len(hist) == 60 and set(hist['證券代號']) == {'2330', '8069'}
+
+            path = report.generate_report(df, '20250630', rule_counts=counts, histories=histories, fmt='parquet')
+            assert pd.read_parquet(path)['成交股數'].tolist() == [30123456, 0, 5678901]
+            rules = pd.read_parquet(os.path.join(tmp, 'stock_analysis_20250630_rules.parquet'))
+            assert rules['單獨通過'].tolist() == [10, 5]
+            hist = pd.read_parquet(os.path.join(tmp, 'stock_analysis_20250630_history.parquet'))
+            assert np.allclose(hist['OSC'].to_numpy(), history_values(history, 'OSC'), equal_nan=True)
+
+            # html: 單一檔案，每個工作表一個表格
+            path = report.generate_report(df, '20250630', rule_counts=counts, fmt='html')
+            with open(path, encoding='utf-8') as f:
+                text = f.read()
+            assert text.count('<table') == 2 and '<h2>篩選統計</h2>' in text and '<td>台積電</td>' in text
+
+            # 不支援的格式不產生報表
+            assert report.generate_report(df, '20250630', fmt='docx') is None
+        finally:
+            report.REPORT_DIR, report.REPORT_CHUNK_ROWS = original
+    print("Test passed!")
+
+def test_compact_prices_round_trip():
+    print("Testing report prices from compact (float32) loads...")
+    prices = {'開盤價': [25.05, 13.35, 101.5], '最高價': [25.15, 13.45, 102.0], '最低價': [24.95, 13.3, 100.5],
+              '收盤價': [25.1, 13.4, 101.5], '本益比': [12.34, 8.76, 45.67]}
+    original = (store.STORE_DIR, store.COMPACT_MEMORY, indicator_state.STATE_PATH, report.REPORT_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        store.STORE_DIR, store.COMPACT_MEMORY = tmp, True
+        indicator_state.STATE_PATH = os.path.join(tmp, 'state.npz')
+        report.REPORT_DIR = tmp
+        try:
+            dates = ['20250627', '20250630']
+            for d in dates:
+                store.write_day(d, pd.DataFrame({'證券代號': ['2330', '2317', '8069'], '證券名稱': ['台積電', '鴻海', '元太'],
+                                                 '成交股數': [1000, 2000, 3000], '成交筆數': [10, 20, 30], **prices}),
+                                market='TWSE')
+            # 增量指標的初篩輸入 (由精簡型態載入當天資料) 直接寫入報表
+            latest = indicator_state.update_daily(dates, markets=['TWSE'])
+            assert (latest[list(prices)].dtypes == np.float64).all()
+            from openpyxl import load_workbook
+            rows = list(load_workbook(report.generate_report(latest, dates[-1], fmt='xlsx'))['候選股'].values)
+            by_code = {r[0]: r for r in rows[1:]}
+            for column, values in prices.items():
+                index = rows[0].index(column)
+                assert [by_code[c][index] for c in ['2330', '2317', '8069']] == values, column
+        finally:
+            store.STORE_DIR, store.COMPACT_MEMORY, indicator_state.STATE_PATH, report.REPORT_DIR = original
+            store._month_dates_cache.clear()
+            indicator_state._cache.clear()
+    print("Test passed!")
+
+def history_values(rows, column):
+    index = rows[0].index(column)
+    return np.array([r[index] for r in rows[1:]], dtype=float)
+
+if __name__ == "__main__":
+    test_report_formats_and_sheets()
+    test_compact_prices_round_trip()
@@ -0,0 +1,97 @@
+import os
+import sys
+import subprocess
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import rules
+from tw_stock_analyzer import filters
+from tw_stock_analyzer.benchmark import legacy_screen
+
+def make_result_df(n=2000, seed=5):
+    rng = np.random.default_rng(seed)
+    codes = np.where(rng.random(n) < 0.3, [f"03{i:04d}" for i in range(n)], [f"{i:04d}" for i in range(n)])
+    names = np.where(rng.random(n) < 0.5, '元大購01', '台積電')
+    close = rng.uniform(10, 100, n).round(2)
+    df = pd.DataFrame({
+        '證券代號': codes,
+        '證券名稱': names,
+        '成交股數': rng.integers(1000, 100000, n).astype(float),
+        '成交筆數': rng.integers(10, 600, n).astype(float),
+        '開盤價': (close * rng.uniform(0.95, 1.05, n)).round(2),
+        '收盤價': close,
+        'MA15_Vol': rng.uniform(1000, 100000, n),
+        'Max15_High': close * rng.uniform(0.9, 1.1, n),
+        'K': rng.uniform(0, 100, n),
+        'D': rng.uniform(0, 100, n),
+    })
+    df.loc[rng.random(n) < 0.05, 'MA15_Vol'] = np.nan
+    df.loc[rng.random(n) < 0.05, 'Max15_High'] = np.nan
+    return df
+
+def test_screen_matches_legacy_loop():
+    print("Testing vectorized screen against legacy iterrows loop...")
+    df = make_result_df()
+    passed, counts = rules.run_screen(df, verbose=False)
+    assert list(passed.index) == legacy_screen(df)
+    assert len(passed) > 0
+
+    assert list(counts['rule']) == [name for name, _ in rules.SCREEN_RULES]
+    assert counts['remaining'].iloc[-1] == len(passed)
+    assert (counts['remaining'].diff().dropna() <= 0).all()
+
+    # 參數可由設定調整
+    loose, _ = rules.run_screen(df, [('max_trades', {'limit': 1000})], verbose=False)
+    assert len(loose) == len(df)
+    print("Test passed!")
+
+def test_rules_on_2d_arrays():
+    print("Testing rules on date x stock arrays...")
+    rng = np.random.default_rng(6)
+    data = {
+        '開盤價': rng.uniform(10, 20, (5, 4)),
+        '收盤價': rng.uniform(10, 20, (5, 4)),
+        '證券代號': np.array([['2330', '030001', '0050', '031234']]),
+        '證券名稱': np.array([['台積電', '元大購01', '元大台灣50', '凱基售02']]),
+    }
+    masks = rules.evaluate(data, ['red_candle', 'exclude_warrants'])
+    assert masks['red_candle'].shape == (5, 4)
+    assert masks['exclude_warrants'].tolist() == [[True, False, True, False]]
+    assert rules.combine(masks).shape == (5, 4)
+    print("Test passed!")
+
+def test_filter_stocks():
+    print("Testing filters.filter_stocks...")
+    df = make_result_df(200)
+    ma = df.set_index('證券代號')['MA15_Vol'].fillna(0)
+    result = filters.filter_stocks(df.drop(columns=['MA15_Vol']), ma)
+    expected = df[(df['成交股數'] > df['MA15_Vol']) & (df['開盤價'] < df['收盤價']) & (df['K'] > df['D'])]
+    assert list(result.index) == list(expected.index)
+    print("Test passed!")
+
+def test_screen_rules_from_env():
+    print("Testing SCREEN_RULES setting...")
+    cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = "from tw_stock_analyzer import rules; print(rules.rule_names())"
+
+    def run(value):
+        return subprocess.run([sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True,
+                              env={**os.environ, 'SCREEN_RULES': value})
+
+    # 以逗號分隔的規則名稱
+    output = run("volume_above_ma, red_candle,kd_golden_cross")
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.strip() == "['volume_above_ma', 'red_candle', 'kd_golden_cross']"
+    # 未知的規則在載入時報錯
+    output = run("volume_above_ma,no_such_rule")
+    assert output.returncode != 0 and "no_such_rule" in output.stderr
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_screen_matches_legacy_loop()
+    test_rules_on_2d_arrays()
+    test_filter_stocks()
+    test_screen_rules_from_env()
@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import scheduler
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import data_fetcher
+from tw_stock_analyzer import store
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer.test_clean_data import FIELDS, ROWS
+
+def test_next_session():
+    print("Testing daemon schedule...")
+    original = trading_calendar.CALENDAR_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        trading_calendar.CALENDAR_PATH = os.path.join(tmp, 'calendar.json')
+        trading_calendar.add_holidays(['20250114'])
+        try:
+            daemon = scheduler.Scheduler()
+            # 週五截止後 -> 下週一收盤後開始檢查
+            date_str, start, deadline = daemon.next_session(datetime(2025, 1, 10, 21, 0))
+            assert date_str == '20250113' and start == scheduler._at('20250113', scheduler.DAEMON_START)
+            assert deadline == scheduler._at('20250113', scheduler.DAEMON_DEADLINE)
+            # 開始檢查後才啟動 -> 立即開始
+            now = datetime(2025, 1, 13, 15, 0)
+            assert daemon.next_session(now)[:2] == ('20250113', now)
+            # 已處理的日期與休市日略過
+            daemon.last_date = '20250113'
+            assert daemon.next_session(now)[0] == '20250115'
+        finally:
+            trading_calendar.CALENDAR_PATH = original
+            trading_calendar._cache.clear()
+    print("Test passed!")
+
+def test_wait_for_data_polls_until_published():
+    print("Testing daemon publication polling...")
+    # 今天以後的平日 (尚未公布時證交所回應無資料，不會被記錄為休市)
+    day = datetime.now()
+    while day.weekday() >= 5:
+        day += timedelta(days=1)
+    date_str = day.strftime("%Y%m%d")
+    published = {}
+    calls = []
+
+    def fake_download(dates, markets=None, **kwargs):
+        calls.append(time.monotonic())
+        # 第 3 次檢查時證交所公布，第 4 次時櫃買中心公布
+        for market, after in [('TWSE', 3), ('TPEX', 4)]:
+            if len(calls) >= after and published.get(market, True):
+                data_fetcher.save_daily_data(date_str, data_fetcher.parse_quotes(FIELDS, ROWS), market=market)
+        return {}
+
+    original = (downloader.download_missing, store.STORE_DIR, scheduler.DAEMON_POLL_INTERVAL)
+    with tempfile.TemporaryDirectory() as tmp:
+        downloader.download_missing = fake_download
+        scheduler.DAEMON_POLL_INTERVAL = 0.02
+        daemon = scheduler.Scheduler(markets=['TWSE', 'TPEX'])
+        try:
+            store.STORE_DIR = os.path.join(tmp, 'store')
+            deadline = datetime.now() + timedelta(seconds=30)
+            assert daemon.wait_for_data(date_str, deadline)
+            assert len(calls) == 4
+            # 指數退避: 間隔逐次增加
+            gaps = [b - a for a, b in zip(calls, calls[1:])]
+            assert gaps[-1] > gaps[0]
+
+            # 截止時只有證交所公布: 以已公布的市場分析；都沒有公布: 略過
+            store.STORE_DIR = os.path.join(tmp, 'partial')
+            calls.clear()
+            published['TPEX'] = False
+            assert daemon.wait_for_data(date_str, datetime.now() + timedelta(seconds=0.5))
+            store.STORE_DIR = os.path.join(tmp, 'empty')
+            calls.clear()
+            published['TWSE'] = False
+            assert not daemon.wait_for_data(date_str, datetime.now() + timedelta(seconds=0.3))
+
+            # stop() 中斷等待
+            calls.clear()
+            threading.Timer(0.2, daemon.stop).start()
+            start = time.monotonic()
+            assert not daemon.wait_for_data(date_str, datetime.now() + timedelta(hours=1))
+            assert time.monotonic() - start < 5
+        finally:
+            downloader.download_missing, store.STORE_DIR, scheduler.DAEMON_POLL_INTERVAL = original
+            store._month_dates_cache.clear()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_next_session()
+    test_wait_for_data_polls_until_published()
@@ -0,0 +1,39 @@
+import os
+import sys
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import sharding
+from tw_stock_analyzer.panel import Panel
+from tw_stock_analyzer.test_kd_batch import make_market
+
+def test_sharded_indicators_match_single_process():
+    print("Testing process-sharded Panel indicators...")
+    assert sharding.shard_bounds(10, 3) == [(0, 3), (3, 7), (7, 10)]
+    assert sharding.shard_bounds(2, 4) == [(0, 1), (1, 2)]
+
+    full_df = make_market(stocks=37, days=80, seed=5)
+    names = ['MA15_Vol', 'Max15_High', 'K', 'D', 'DIF', 'MACD', 'OSC', 'OSC_Prev']
+    single = Panel.from_frame(full_df)
+    indicators.calculate_panel_macd(indicators.calculate_panel_indicators(single, workers=1), workers=1)
+
+    original = sharding.INDICATOR_MIN_SHARD
+    sharding.INDICATOR_MIN_SHARD = 1
+    try:
+        for workers in (2, 3):
+            sharded = Panel.from_frame(full_df)
+            indicators.calculate_panel_indicators(sharded, workers=workers)
+            indicators.calculate_panel_macd(sharded, workers=workers)
+            # 各段結果合併後與單一 process 完全相同
+            for name in names:
+                assert np.array_equal(single.fields[name], sharded.fields[name], equal_nan=True), name
+    finally:
+        sharding.INDICATOR_MIN_SHARD = original
+        sharding.shutdown()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_sharded_indicators_match_single_process()
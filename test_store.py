@@ -0,0 +1,138 @@
+import os
+import sys
+import tempfile
+import pandas as pd
+import numpy as np
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import store
+from tw_stock_analyzer import panel
+
+def make_day(codes, seed):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '證券代號': codes,
+        '證券名稱': [f"名稱{c}" for c in codes],
+        '成交股數': rng.integers(1000, 100000, len(codes)),
+        '收盤價': rng.uniform(10, 200, len(codes)).round(2),
+    })
+
+def test_store_roundtrip_and_migration():
+    print("Testing columnar store...")
+    codes = ['0050', '2330', '030001']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_dir = os.path.join(tmp, 'csv')
+        store_dir = os.path.join(tmp, 'store')
+        os.makedirs(csv_dir)
+
+        # 建立跨月份的舊版 CSV
+        days = ['20241230', '20241231', '20250102']
+        for i, d in enumerate(days):
+            make_day(codes, i).to_csv(os.path.join(csv_dir, f"{d}.csv"), index=False, encoding='utf-8-sig')
+
+        assert store.migrate_csv_dir(csv_dir, store_dir, 'parquet') == 3
+        assert store.available_dates(store_dir, 'parquet') == days
+        assert os.path.exists(store.month_path('20241230', store_dir, 'parquet'))
+        assert os.path.exists(store.month_path('20250102', store_dir, 'parquet'))
+
+        # 代號保留前導零
+        day = store.read_day('20241231', store_dir=store_dir, fmt='parquet')
+        assert sorted(day['證券代號']) == sorted(codes)
+        assert 'Date' not in day.columns
+
+        # 投影讀取只回傳指定欄位
+        hist = store.load_range(days, columns=['收盤價'], store_dir=store_dir, fmt='parquet', compact=False)
+        assert list(hist.columns) == ['Date', '證券代號', '收盤價']
+        assert len(hist) == 9
+        assert hist['收盤價'].dtype == np.float64
+
+        # 精簡型態: category 代號/日期、float32 價格、整數成交量，數值可還原
+        compact = store.load_range(days, store_dir=store_dir, fmt='parquet', compact=True)
+        assert compact['證券代號'].dtype == 'category' and compact['Date'].dtype == 'category'
+        assert compact['收盤價'].dtype == np.float32 and compact['成交股數'].dtype == np.int64
+        full = store.load_range(days, store_dir=store_dir, fmt='parquet', compact=False)
+        assert (compact['證券代號'].astype(str) == full['證券代號']).all()
+        assert np.array_equal(panel.as_float64(compact['收盤價']), full['收盤價'].to_numpy())
+        assert compact.memory_usage(deep=True).sum() < full.memory_usage(deep=True).sum()
+
+        # 覆寫同一天不會產生重複資料
+        store.write_day('20241231', make_day(codes[:2], 9), store_dir, 'parquet')
+        hist = store.load_range(days, store_dir=store_dir, fmt='parquet')
+        assert len(hist) == 8
+        assert store.has_day('20241231', store_dir, 'parquet')
+        assert not store.has_day('20241227', store_dir, 'parquet')
+
+    print("Test passed!")
+
+def test_month_cache_matches_disk():
+    print("Testing in-memory month cache...")
+    codes = ['0050', '2330', '030001']
+    days = ['20241230', '20241231', '20250102']
+
+    def loads(store_dir):
+        return [store.load_range(days, store_dir=store_dir, fmt='parquet', compact=False),
+                store.load_range(days[1:], columns=['收盤價'], codes=['2330'], store_dir=store_dir, fmt='parquet'),
+                store.read_day('20250102', store_dir=store_dir, fmt='parquet')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = os.path.join(tmp, 'store')
+        # 舊版檔案 (沒有市場欄位) 與新版檔案混合
+        legacy = store.normalize_frame(make_day(codes, 0), days[0]).drop(columns=[store.MARKET_COL])
+        store._write_file(legacy, store.month_path(days[0], store_dir, 'parquet'), 'parquet')
+        for i, d in enumerate(days[1:], 1):
+            store.write_day(d, make_day(codes, i), store_dir, 'parquet')
+
+        store.enable_cache()
+        try:
+            for _ in range(2): # 第二次由快取讀取
+                for cached, direct in zip(loads(store_dir), without_cache(loads, store_dir)):
+                    pd.testing.assert_frame_equal(cached, direct)
+            path = store.month_path(days[2], store_dir, 'parquet')
+            assert path in store._table_cache
+
+            # 寫入新的一天後重新讀取該月份
+            store.write_day('20250103', make_day(codes[:1], 5), store_dir, 'parquet')
+            assert path not in store._table_cache
+            got = store.load_range(['20250102', '20250103'], store_dir=store_dir, fmt='parquet')
+            assert got['Date'].astype(str).tolist().count('20250103') == 1
+        finally:
+            store.enable_cache(False)
+    print("Test passed!")
+
+def test_month_cache_is_bounded():
+    print("Testing month cache eviction...")
+    codes = ['0050', '2330']
+    days = ['20250102', '20250203', '20250303']
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, d in enumerate(days):
+            store.write_day(d, make_day(codes, i), tmp, 'parquet')
+        paths = [store.month_path(d, tmp, 'parquet') for d in days]
+        store.enable_cache(max_months=2)
+        try:
+            store.load_range(days[:2], store_dir=tmp, fmt='parquet')
+            store.load_range(days[:1], store_dir=tmp, fmt='parquet') # 1 月為最近使用
+            # 超過上限時移除最久未使用的月份 (2 月)
+            store.load_range(days[2:], store_dir=tmp, fmt='parquet')
+            assert list(store._table_cache) == [paths[0], paths[2]]
+            got = store.load_range(days, store_dir=tmp, fmt='parquet')
+            assert sorted(got['Date'].astype(str).unique()) == days
+            assert len(store._table_cache) == 2
+        finally:
+            store.enable_cache(False)
+    print("Test passed!")
+
+def without_cache(func, *args):
+    cache = store._table_cache
+    store._table_cache = None
+    try:
+        return func(*args)
+    finally:
+        store._table_cache = cache
+
+if __name__ == "__main__":
+    test_store_roundtrip_and_migration()
+    test_month_cache_matches_disk()
+    test_month_cache_is_bounded()
@@ -5,9 +5,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from tw_stock_analyzer import notifier
+from tw_stock_analyzer import outbox
 
 print("Testing Telegram Notification...")
-success = notifier.send_message("🔔 股市分析工具設定完成！這是測試訊息。")
+# 加入佇列後立即送出
+success = notifier.send_message("🔔 股市分析工具設定完成！這是測試訊息。") and outbox.drain() > 0
 
 if success:
     print("Test successful!")
@@ -0,0 +1,57 @@
+import os
+import sys
+import json
+import tempfile
+from datetime import datetime
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import trading_calendar
+from tw_stock_analyzer import downloader
+from tw_stock_analyzer import data_fetcher
+
+def test_closed_dates_are_persisted_and_skipped():
+    print("Testing trading calendar negative cache...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'calendar.json')
+
+        # 2025-01-01 (三) 元旦，2025-01-02 (四) 正常交易
+        assert trading_calendar.mark_closed('20250101', '很抱歉，沒有符合條件的資料!', path=path)
+        # 今天的資料可能只是尚未公布，不記錄
+        assert not trading_calendar.mark_closed(datetime.now().strftime("%Y%m%d"), path=path)
+
+        # 清除記憶體快取，確認已寫入檔案
+        trading_calendar._cache.clear()
+        with open(path, encoding='utf-8') as f:
+            assert list(json.load(f)['closed']) == ['20250101']
+        assert trading_calendar.is_closed('20250101', path=path)
+        assert trading_calendar.is_closed('20250104', path=path) # 週六
+        assert not trading_calendar.is_closed('20250102', path=path)
+
+        holidays = os.path.join(tmp, 'holidays.txt')
+        with open(holidays, 'w', encoding='utf-8') as f:
+            f.write("# 2025 農曆春節\n2025-01-27\n20250128,除夕\n\n")
+        assert trading_calendar.load_holiday_file(holidays, path=path) == 2
+
+        days = trading_calendar.get_trading_days(5, end_date='20250131', path=path)
+        assert days == ['20250123', '20250124', '20250129', '20250130', '20250131']
+        assert trading_calendar.sessions_between('20241231', '20250103', path=path) == \
+            ['20241231', '20250102', '20250103']
+
+        # 下載時跳過已知休市日
+        original = (trading_calendar.CALENDAR_PATH, data_fetcher.check_data_exists, data_fetcher.fetch_daily_quotes)
+        requested = []
+        trading_calendar.CALENDAR_PATH = path
+        data_fetcher.check_data_exists = lambda d, market=None: False
+        data_fetcher.fetch_daily_quotes = lambda d, limiter=None: requested.append(d)
+        try:
+            downloader.download_missing(['20250101', '20250102', '20250127'], markets=['TWSE'])
+        finally:
+            trading_calendar.CALENDAR_PATH, data_fetcher.check_data_exists, data_fetcher.fetch_daily_quotes = original
+        assert requested == ['20250102']
+    trading_calendar._cache.clear()
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_closed_dates_are_persisted_and_skipped()
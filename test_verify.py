@@ -0,0 +1,115 @@
+import os
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+
+# Add parent directory to path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tw_stock_analyzer import indicators
+from tw_stock_analyzer import verify
+
+def fake_history(ticker, days=120):
+    rng = np.random.default_rng(sum(map(ord, ticker)))
+    idx = pd.bdate_range(end='2025-06-30', periods=days, name='Date')
+    close = 50 + np.cumsum(rng.normal(0, 1, days))
+    return pd.DataFrame({'Open': close, 'High': close + 1, 'Low': close - 1, 'Close': close,
+                         'Volume': 1000.0}, index=idx)
+
+class FakeDownloader:
+    """模擬 yf.download 多檔下載 (欄位: Price x Ticker)，第一次請求指定 ticker 時失敗"""
+    def __init__(self, flaky=(), missing=()):
+        self.calls = []
+        self.flaky = set(flaky)
+        self.missing = set(missing)
+
+    def __call__(self, tickers, **kwargs):
+        self.calls.append(list(tickers))
+        frames = {}
+        for t in tickers:
+            if t in self.missing:
+                continue
+            if t in self.flaky:
+                self.flaky.discard(t)
+                continue
+            hist = fake_history(t)
+            if t == '0002.TW':
+                hist = hist.iloc[::2] # 交易日較少，多檔合併後會出現整列 NaN
+            frames[t] = hist
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1).swaplevel(0, 1, axis=1).sort_index(axis=1)
+
+def test_batched_stage2_matches_per_ticker():
+    print("Testing batched Stage-2 verification...")
+    codes = [f"{i:04d}" for i in range(12)]
+    fake = FakeDownloader(flaky={'0003.TW'}, missing={'0011.TW'})
+    original, original_delay = verify.yf.download, verify.RETRY_DELAY
+    verify.yf.download, verify.RETRY_DELAY = fake, 0
+    try:
+        histories = verify.fetch_histories(codes, batch_size=5, workers=2, retries=2)
+    finally:
+        verify.yf.download, verify.RETRY_DELAY = original, original_delay
+
+    # 12 檔分 3 批，另有一次重試 (0003 第一次失敗) 與兩次重試 (0011 一直沒有資料)
+    assert sorted(len(c) for c in fake.calls)[-3:] == [2, 5, 5]
+    assert len(fake.calls) == 6
+    assert set(histories['證券代號']) == set(codes) - {'0011'}
+    assert (histories.groupby('證券代號').size()['0002'] == 60)
+
+    macd = verify.latest_macd(histories).set_index('證券代號')
+    for code in ['0000', '0002', '0003']:
+        hist = fake_history(f"{code}.TW")
+        if code == '0002':
+            hist = hist.iloc[::2]
+        hist = indicators.calculate_macd(hist)
+        assert macd.loc[code, 'OSC'] == hist['OSC'].iloc[-1]
+        assert macd.loc[code, 'OSC_Prev'] == hist['OSC'].iloc[-2]
+
+    stage1 = pd.DataFrame({'證券代號': codes, '證券名稱': codes})
+    final = verify.verify_macd(stage1, histories)
+    expected = macd[(macd['OSC_Prev'] <= 0) & (macd['OSC'] > 0)].index
+    assert sorted(final['證券代號']) == sorted(expected)
+    print("Test passed!")
+
+def test_latest_macd_with_categorical_codes():
+    print("Testing latest_macd on compact (categorical) histories...")
+    frames = [fake_history(f"{code}.TW").reset_index().assign(證券代號=code) for code in ['0001', '0002']]
+    histories = pd.concat(frames, ignore_index=True)
+    expected = verify.latest_macd(histories).set_index('證券代號')
+    # 精簡載入的代號為 category，含許多沒有資料的代號；不應產生空分組或 pandas 警告
+    histories['證券代號'] = histories['證券代號'].astype(pd.CategoricalDtype(['0001', '0002', '0003', '0004']))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        macd = verify.latest_macd(histories)
+    assert list(macd['證券代號'].astype(str)) == ['0001', '0002']
+    macd = macd.set_index(macd['證券代號'].astype(str))
+    assert np.allclose(macd['OSC'], expected['OSC']) and np.allclose(macd['OSC_Prev'], expected['OSC_Prev'])
+    print("Test passed!")
+
+def test_tpex_codes_use_two_suffix():
+    print("Testing yfinance tickers of TPEx stocks...")
+    # 上櫃股票在 yfinance 只有 .TWO 代號
+    fake = FakeDownloader(missing={'6488.TW'})
+    stage1 = pd.DataFrame({'證券代號': ['0050', '6488'], '證券名稱': ['上市', '上櫃'], '市場': ['TWSE', 'TPEX']})
+    original, original_delay = verify.yf.download, verify.RETRY_DELAY
+    verify.yf.download, verify.RETRY_DELAY = fake, 0
+    try:
+        result = verify.verify_macd(stage1)
+        histories = verify.load_histories(['0050', '6488'], code_markets=verify.code_markets(stage1))
+    finally:
+        verify.yf.download, verify.RETRY_DELAY = original, original_delay
+
+    assert sorted(fake.calls[0]) == ['0050.TW', '6488.TWO']
+    assert sorted(set(histories['證券代號'])) == ['0050', '6488']
+    macd = verify.latest_macd(histories).set_index('證券代號')
+    expected = indicators.calculate_macd(fake_history('6488.TWO'))
+    assert macd.loc['6488', 'OSC'] == expected['OSC'].iloc[-1]
+    assert set(result['證券代號']) <= {'0050', '6488'}
+    print("Test passed!")
+
+if __name__ == "__main__":
+    test_batched_stage2_matches_per_ticker()
+    test_latest_macd_with_categorical_codes()
+    test_tpex_codes_use_two_suffix()
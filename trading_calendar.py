@@ -0,0 +1,143 @@
+import os
+import re
+import json
+import argparse
+import threading
+from datetime import datetime, timedelta
+from .settings import CALENDAR_PATH, TRADING_HOLIDAYS
+
+# 交易日曆
+# 記錄已確認休市 (證交所回應無資料) 的日期，並可預先載入假日清單，
+# 推算交易日時排除這些日期，避免每次執行都重新向證交所查詢已知的休市日。
+# 檔案格式 (JSON): {"closed": {"YYYYMMDD": "原因", ...}}
+
+_lock = threading.Lock()
+_cache = {} # path -> {date_str: reason}
+
+
+def _today():
+    return datetime.now().strftime("%Y%m%d")
+
+
+def _load(path):
+    if path not in _cache:
+        closed = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                closed = json.load(f).get('closed', {})
+        for date_str in TRADING_HOLIDAYS:
+            closed.setdefault(_normalize_date(date_str), "預設假日")
+        _cache[path] = closed
+    return _cache[path]
+
+
+def _save(path, closed):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'closed': dict(sorted(closed.items()))}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+
+
+def _normalize_date(value):
+    digits = re.sub(r"\D", "", str(value))
+    if len(digits) != 8:
+        raise ValueError(f"日期格式錯誤: {value}")
+    return digits
+
+
+def is_closed(date_str, path=None):
+    """是否為已知休市日 (週末一律視為休市)"""
+    if datetime.strptime(date_str, "%Y%m%d").weekday() >= 5:
+        return True
+    with _lock:
+        return date_str in _load(path or CALENDAR_PATH)
+
+
+def mark_closed(date_str, reason="", path=None):
+    """
+    記錄休市日 (持久化)
+    今天以後的日期不記錄: 盤後資料尚未公布時證交所同樣回應無資料
+    回傳是否有記錄
+    """
+    if date_str >= _today():
+        return False
+    path = path or CALENDAR_PATH
+    with _lock:
+        closed = _load(path)
+        if date_str in closed:
+            return True
+        closed[date_str] = reason
+        _save(path, closed)
+    return True
+
+
+def add_holidays(dates, reason="假日", path=None):
+    """預先載入假日清單 (例如年度休市日)，回傳新增的天數"""
+    path = path or CALENDAR_PATH
+    with _lock:
+        closed = _load(path)
+        added = 0
+        for value in dates:
+            date_str = _normalize_date(value)
+            if date_str not in closed:
+                closed[date_str] = reason
+                added += 1
+        _save(path, closed)
+    return added
+
+
+def load_holiday_file(file_path, path=None):
+    """由文字檔載入假日 (每行一個日期，YYYYMMDD 或 YYYY-MM-DD，# 開頭為註解)"""
+    dates = []
+    with open(file_path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if line:
+                dates.append(line.split(',')[0])
+    return add_holidays(dates, reason=os.path.basename(file_path), path=path)
+
+
+def closed_dates(path=None):
+    with _lock:
+        return dict(_load(path or CALENDAR_PATH))
+
+
+def sessions_between(start, end, path=None):
+    """start 至 end (含) 之間可能的交易日 (排除週末與已知休市日)"""
+    dates = []
+    current = datetime.strptime(start, "%Y%m%d")
+    last = datetime.strptime(end, "%Y%m%d")
+    while current <= last:
+        date_str = current.strftime("%Y%m%d")
+        if not is_closed(date_str, path):
+            dates.append(date_str)
+        current += timedelta(days=1)
+    return dates
+
+
+def get_trading_days(days=30, end_date=None, path=None):
+    """
+    取得 end_date (含，預設今天) 以前最近 N 個交易日 (由舊到新)
+    排除週末與已知休市日；尚未確認的日期 (例如今天) 仍列入，實際以抓到資料為準
+    """
+    trading_days = []
+    current = datetime.strptime(end_date, "%Y%m%d") if end_date else datetime.now()
+    while len(trading_days) < days:
+        date_str = current.strftime("%Y%m%d")
+        if not is_closed(date_str, path):
+            trading_days.append(date_str)
+        current -= timedelta(days=1)
+    return sorted(trading_days)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="交易日曆 (休市日快取)")
+    parser.add_argument("--load", help="由文字檔載入假日清單")
+    parser.add_argument("--list", action="store_true", help="列出已知休市日")
+    args = parser.parse_args()
+    if args.load:
+        print(f"新增 {load_holiday_file(args.load)} 個休市日")
+    if args.list:
+        for date_str, reason in sorted(closed_dates().items()):
+            print(date_str, reason)
@@ -0,0 +1,179 @@
+import time
+import logging
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from .settings import YF_BATCH_SIZE, YF_WORKERS, YF_TIMEOUT, MAX_RETRIES, RETRY_DELAY, STAGE2_SOURCE
+from . import indicators
+from . import rules
+from . import history
+from . import http_client
+from . import metrics
+from . import store
+from .panel import as_float64
+
+# Stage 2 複篩: 以長天期歷史資料驗證 MACD OSC 翻紅
+# 預設使用本地儲存的證交所資料 (history.local_histories)，資料不足的股票才以 yfinance 補足；
+# yfinance 以多檔一批並行下載，最後一次計算全部 MACD
+# yfinance (與其依賴) 載入需要數百毫秒，只在實際下載時才 import
+
+log = logging.getLogger(__name__)
+
+def __getattr__(name):
+    # verify.yf: 第一次取用時才載入 yfinance (測試以 verify.yf.download 替換下載函式)
+    if name == 'yf':
+        import yfinance
+        return yfinance
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+MIN_HISTORY_DAYS = 30 # 歷史資料少於此天數則無法驗證
+YF_SUFFIXES = {'TWSE': '.TW', 'TPEX': '.TWO'} # 市場 -> yfinance 代號後綴 (上櫃股票為 .TWO)
+
+def yf_ticker(code, market=None):
+    """證券代號對應的 yfinance 代號 (市場未知時視為上市)"""
+    return code + YF_SUFFIXES.get(market or store.DEFAULT_MARKET, '.TW')
+
+def code_markets(df):
+    """DataFrame 中每檔股票的市場 {證券代號: 市場}，沒有市場欄位時回傳 None"""
+    if store.MARKET_COL not in df.columns:
+        return None
+    return dict(zip(df['證券代號'].astype(str).str.strip(), df[store.MARKET_COL].astype(str)))
+
+def _to_long(hist, ticker_to_code):
+    """將 yfinance 下載結果 (欄位: Price x Ticker) 轉為長格式: 證券代號, Date, High, Low, Close"""
+    if hist is None or hist.empty:
+        return pd.DataFrame(columns=['證券代號', 'Date', 'High', 'Low', 'Close'])
+
+    if not isinstance(hist.columns, pd.MultiIndex):
+        # 單一 ticker 且未使用多層欄位
+        ticker = next(iter(ticker_to_code))
+        hist = pd.concat({ticker: hist}, axis=1).swaplevel(0, 1, axis=1)
+
+    # 找出代表 ticker 的欄位層級
+    level = next(i for i in range(hist.columns.nlevels)
+                 if set(hist.columns.get_level_values(i)) & set(ticker_to_code))
+    long_df = hist.stack(level=level, future_stack=True)
+    long_df.index.names = ['Date', 'Ticker']
+    long_df = long_df.reset_index()
+    # 多檔一起下載時日期會對齊，某檔沒有交易的日期整列為 NaN，需移除 (與單檔下載相同)
+    long_df = long_df.dropna(subset=['High', 'Low', 'Close'], how='all')
+    long_df['證券代號'] = long_df['Ticker'].map(ticker_to_code)
+    long_df['Date'] = pd.to_datetime(long_df['Date']).dt.strftime('%Y%m%d')
+    return long_df[['證券代號', 'Date', 'High', 'Low', 'Close']]
+
+def _download_batch(codes, period, timeout, retries, code_markets=None):
+    """下載一批股票 (一次請求多個 ticker)，失敗或缺資料的 ticker 以指數退避重試"""
+    import yfinance as yf
+    code_markets = code_markets or {}
+    ticker_to_code = {yf_ticker(code, code_markets.get(code)): code for code in codes}
+    pending = list(ticker_to_code)
+    frames = []
+    for attempt in range(retries + 1):
+        if attempt:
+            # yfinance 使用自己的連線 (curl_cffi)，重試間隔與其他請求相同 (指數退避 + 抖動)
+            time.sleep(http_client.backoff_delay(attempt, RETRY_DELAY))
+            metrics.incr('yf_retries')
+        metrics.incr('yf_requests')
+        try:
+            hist = yf.download(pending, period=period, progress=False, threads=False, timeout=timeout)
+            long_df = _to_long(hist, {t: ticker_to_code[t] for t in pending})
+        except Exception as e:
+            log.warning(f"  下載失敗 ({len(pending)} 檔，第 {attempt + 1} 次): {e}",
+                        extra={'event': 'yf_failed', 'tickers': len(pending), 'attempt': attempt + 1})
+            continue
+        frames.append(long_df)
+        got = set(long_df['證券代號'])
+        pending = [t for t in pending if ticker_to_code[t] not in got]
+        if not pending:
+            break
+    if pending:
+        log.warning(f"  無法取得資料: {', '.join(pending)}", extra={'event': 'yf_missing', 'tickers': pending})
+        metrics.incr('yf_missing', len(pending))
+    return pd.concat(frames, ignore_index=True) if frames else _to_long(None, {})
+
+def fetch_histories(codes, period="6mo", batch_size=None, workers=None, timeout=None, retries=None,
+                    code_markets=None):
+    """
+    批次並行下載多檔股票的歷史資料 (yfinance)
+    codes: 證券代號列表
+    code_markets: {證券代號: 市場}，上櫃 (TPEX) 股票以 .TWO 代號下載 (未列出的視為上市)
+    回傳長格式 DataFrame: 證券代號, Date, High, Low, Close
+    """
+    codes = list(dict.fromkeys(codes))
+    if not codes:
+        return _to_long(None, {})
+    batch_size = batch_size or YF_BATCH_SIZE
+    workers = workers or YF_WORKERS
+    timeout = timeout or YF_TIMEOUT
+    retries = MAX_RETRIES if retries is None else retries
+
+    batches = [codes[i:i + batch_size] for i in range(0, len(codes), batch_size)]
+    log.info(f"下載 {len(codes)} 檔歷史資料 ({len(batches)} 批)...",
+             extra={'event': 'yf_download', 'tickers': len(codes), 'batches': len(batches)})
+    with ThreadPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        frames = list(pool.map(lambda b: _download_batch(b, period, timeout, retries, code_markets), batches))
+    return pd.concat(frames, ignore_index=True)
+
+def latest_macd(histories):
+    """
+    計算所有股票的 MACD，回傳每檔最後一天的 OSC 與前一天的 OSC_Prev
+    歷史資料不足 MIN_HISTORY_DAYS 天的股票不列入
+    """
+    if histories.empty:
+        return pd.DataFrame(columns=['證券代號', 'OSC', 'OSC_Prev'])
+    hist = indicators.calculate_macd_batch(histories.copy())
+    hist = hist.sort_values(['證券代號', 'Date'], kind='stable')
+    # 證券代號可能為 category (精簡載入): observed=True 只對有資料的代號分組
+    counts = hist.groupby('證券代號', observed=True)['Date'].transform('size')
+    hist = hist[counts >= MIN_HISTORY_DAYS].copy()
+    hist['OSC_Prev'] = hist.groupby('證券代號', observed=True)['OSC'].shift(1)
+    return hist.groupby('證券代號', observed=True).tail(1)[['證券代號', 'OSC', 'OSC_Prev']]
+
+def load_histories(codes, end_date=None, source=None, code_markets=None, markets=None):
+    """
+    取得 Stage 2 所需的歷史資料
+    source: 'local' (預設) 使用本地資料，歷史不足 MIN_HISTORY_DAYS 天的股票改用 yfinance；
+            'yfinance' 全部由 yfinance 下載
+    code_markets: {證券代號: 市場}，決定 yfinance 的代號後綴 (見 fetch_histories)
+    markets: 本地資料缺少日期時下載的市場 (預設 settings.MARKETS)
+    回傳長格式 DataFrame: 證券代號, Date, 最高/最低/收盤價 (或 High/Low/Close)
+    """
+    source = source or STAGE2_SOURCE
+    if source != 'local' or end_date is None:
+        return fetch_histories(codes, code_markets=code_markets)
+
+    local = history.local_histories(codes, end_date, markets=markets)
+    counts = local.groupby('證券代號', observed=True).size()
+    missing = [c for c in codes if counts.get(c, 0) < MIN_HISTORY_DAYS]
+    if not missing:
+        return local
+    log.info(f"本地歷史資料不足: {len(missing)} 檔改用 yfinance", extra={'event': 'yf_fallback', 'tickers': missing})
+    remote = fetch_histories(missing, code_markets=code_markets).rename(columns={'High': '最高價', 'Low': '最低價', 'Close': '收盤價'})
+    local = local[~local['證券代號'].isin(missing)].copy()
+    # 本地價格可能為精簡載入的 float32，先還原再與 yfinance 的 float64 合併
+    for col in history.HISTORY_COLUMNS:
+        local[col] = as_float64(local[col])
+    return pd.concat([local, remote], ignore_index=True)
+
+def verify_macd(stage1_df, histories=None, end_date=None):
+    """
+    Stage 2: 驗證 MACD OSC 由負轉正
+    stage1_df: 初篩通過的 DataFrame
+    histories: 長格式歷史資料 (預設以 load_histories 取得)
+    end_date: 最後一個交易日 (使用本地資料時必須提供)
+    回傳通過的 DataFrame (含 OSC, OSC_Prev)
+    """
+    if stage1_df.empty:
+        return stage1_df
+    codes = stage1_df['證券代號'].astype(str).str.strip()
+    if histories is None:
+        histories = load_histories(codes.tolist(), end_date, code_markets=code_markets(stage1_df))
+
+    macd = latest_macd(histories).set_index('證券代號')
+    result = stage1_df.drop(columns=['OSC', 'OSC_Prev'], errors='ignore').copy()
+    result['OSC'] = codes.map(macd['OSC']).to_numpy()
+    result['OSC_Prev'] = codes.map(macd['OSC_Prev']).to_numpy()
+
+    passed = rules.evaluate(result, ['macd_turn_positive'])['macd_turn_positive']
+    log.info(f"MACD 驗證: {len(result)} 檔中 {int(passed.sum())} 檔通過",
+             extra={'event': 'macd_verify', 'rows': len(result), 'passed': int(passed.sum())})
+    return result[passed]